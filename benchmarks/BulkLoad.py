@@ -0,0 +1,58 @@
+"""
+Compares loading rows one Add at a time against Table.Load, checked and trusted, in rows per second.
+
+Run from the repository root:  python benchmarks/BulkLoad.py [rows]
+"""
+import configparser
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from Tables import Table
+
+ini = """
+[Reading]
+id = integer, key
+sensor = integer, index
+value = real
+note = text
+"""
+
+
+def rows(count: int):
+    return ({'id': i, 'sensor': i % 100, 'value': i / 10, 'note': 'ok'} for i in range(1, count + 1))
+
+
+def measure(label: str, count: int, load):
+    with tempfile.TemporaryDirectory() as tmp:
+        con = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        config = configparser.ConfigParser()
+        config.read_string(ini)
+        t = Table(config['Reading'], con)
+        t.Create()
+
+        start = time.perf_counter()
+        load(t, count)
+        elapsed = time.perf_counter() - start
+        con.close()
+
+    print(f'{label:>10}: {count / elapsed:12,.0f} rows/s')
+
+
+def adds(t: Table, count: int):
+    for r in rows(count):
+        t.Add(r)
+
+
+def main(count: int):
+    measure('add', min(count, 10000), adds)
+    measure('load', count, lambda t, n: t.Load(rows(n)))
+    measure('trusted', count, lambda t, n: t.Load(rows(n), trusted=True))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
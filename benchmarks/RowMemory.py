@@ -0,0 +1,63 @@
+"""
+Compares the memory held by the named tuple rows Table.GetAll returns against the dict-per-row wrapping callers used
+to do by hand.
+
+Run from the repository root:  python benchmarks/RowMemory.py [rows]
+"""
+import configparser
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from Tables import Table
+
+ini = """
+[Person]
+id = integer, key
+fname = text, required
+lname = text, required
+nickname = text
+birthday = text
+"""
+
+
+def measure(label: str, rows: int, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{label:>12}: {current / rows:8.1f} bytes/row held, {peak / rows:8.1f} bytes/row peak, {elapsed:6.2f}s')
+    return data
+
+
+def main(rows: int):
+    config = configparser.ConfigParser()
+    config.read_string(ini)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        con = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        con.execute('Create Table Person (id integer primary key, fname text not null, lname text not null, '
+                    'nickname text, birthday text)')
+        con.executemany('Insert into Person (fname, lname, nickname, birthday) values (?, ?, ?, ?)',
+                        (('Joe', 'Smith', None, '1911-11-11') for _ in range(rows)))
+        con.commit()
+
+        t = Table(config['Person'], con)
+        names = list(t._columns.keys())
+
+        measure('tuple rows', rows, lambda: con.execute('Select * From Person').fetchall())
+        measure('dict rows', rows, lambda: [dict(zip(names, r)) for r in con.execute('Select * From Person')])
+        measure('named rows', rows, t.GetAll)
+        con.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
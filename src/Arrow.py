@@ -0,0 +1,86 @@
+import typing
+
+from Columns import Column, StorageTypes
+
+# Helpers for the Apache Arrow interchange in Table (ToArrow, FromArrow and ExportParquet).  pyarrow is optional, the
+# rest of the library works without it and only these calls need it installed.
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+def Require():
+    """
+    Raises an ImportError if pyarrow isn't installed.
+    """
+    if pa is None:
+        raise ImportError('The arrow and parquet support needs pyarrow installed (pip install pyarrow).')
+
+
+def FieldType(col: Column) -> 'pa.DataType':
+    """
+    Maps a column to the arrow type its values are held in.  The date types get the arrow date and timestamp types,
+    the rest follow the storage type.
+    """
+    match col.Temporal:
+        case 'date':
+            return pa.date32()
+        case 'datetime':
+            return pa.timestamp('s')
+        case 'timestamp':
+            return pa.timestamp('us', tz='UTC')
+
+    return {StorageTypes.INTEGER: pa.int64(),
+            StorageTypes.REAL: pa.float64(),
+            StorageTypes.TEXT: pa.string(),
+            StorageTypes.BLOB: pa.binary()}[col.StorageType]
+
+
+def Schema(columns: list, cols: list) -> 'pa.Schema':
+    """
+    Builds the schema for a set of columns.
+    :param columns: The names of the columns, as they were selected.
+    :param cols: The Column for each name.
+    """
+    return pa.schema([pa.field(name, FieldType(c)) for name, c in zip(columns, cols)])
+
+
+def Values(col: Column, values: typing.Sequence) -> 'pa.Array':
+    """
+    Builds the arrow array for one column of a chunk of rows, straight from the values as stored.  The dates are
+    converted from their epoch numbers by arrow rather than one python object at a time.
+    """
+    match col.Temporal:
+        case 'date':
+            # always a whole number of days
+            days = pc.divide(pa.array(values, pa.int64()), 86400)
+            return days.cast(pa.int32()).cast(pa.date32())
+        case 'datetime':
+            return pa.array(values, pa.int64()).cast(pa.timestamp('s'))
+        case 'timestamp':
+            micros = pc.round(pc.multiply(pa.array(values, pa.float64()), 1000000))
+            return micros.cast(pa.int64()).cast(pa.timestamp('us', tz='UTC'))
+    return pa.array(values, FieldType(col))
+
+
+def Batch(schema: 'pa.Schema', cols: list, rows: list) -> 'pa.RecordBatch':
+    """
+    Turns a chunk of rows from the cursor into a record batch.
+    """
+    return pa.RecordBatch.from_arrays([Values(c, v) for c, v in zip(cols, zip(*rows))], schema=schema)
+
+
+def Rows(data: typing.Any) -> typing.Iterator[dict]:
+    """
+    Reads the rows out of a table or record batch (or anything else with record batches), one batch at a time.
+    """
+    batches = data.to_batches() if hasattr(data, 'to_batches') else [data]
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def ParquetWriter(dest: typing.Any, schema: 'pa.Schema', compression: str) -> 'pq.ParquetWriter':
+    return pq.ParquetWriter(dest, schema, compression=compression)
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+import urllib.parse
+
+
+class BackupJob:
+    """
+    Copies a database file to another file on a background thread while the database stays in use, started from
+    Database.Backup.  The copy is made with its own read-only connection, so the database's connection (and any writer)
+    carries on as normal.
+
+    Either the sqlite backup api is used, copying a number of pages per step, or VACUUM INTO, which writes a compacted
+    copy in one go.  Once finished Pages, Seconds and PagesPerSecond report how it went, for tuning the step size.
+    """
+
+    def __init__(self, source: str, dest: str, pages_per_step: int = 256, sleep: float = 0.05,
+                 progress: typing.Callable = None, vacuum: bool = False):
+        """
+        Constructor
+        :param source: The database file to copy.
+        :param dest: The file to copy to, anything already there is replaced.
+        :param pages_per_step: The number of pages copied at a time, -1 for everything in one step.
+        :param sleep: The seconds to wait before retrying a step when the database is busy.
+        :param progress: Called after each step with (pages copied, total pages, pages per second).  Anything it raises
+                         stops the copy.
+        :param vacuum: Write a compacted copy with VACUUM INTO instead of copying page by page.
+        """
+        self._source = source
+        self._dest = dest
+        self._pages_per_step = pages_per_step
+        self._sleep = sleep
+        self._progress = progress
+        self._vacuum = vacuum
+
+        self.Pages = 0  # pages copied so far
+        self.TotalPages = 0  # pages in the database at the last step
+        self.Seconds = 0.0  # how long the copy has taken
+        self.Error = None  # what stopped the copy, if it failed
+
+        self._thread = threading.Thread(target=self._run, name='IniLiteBackup', daemon=True)
+        self._thread.start()
+
+    @property
+    def PagesPerSecond(self) -> float:
+        return self.Pages / self.Seconds if self.Seconds > 0 else 0.0
+
+    @property
+    def Done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def Wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until the copy finishes, raising whatever made it fail.
+        :param timeout: The longest, in seconds, to wait.  None to wait as long as it takes.
+        :return: True if the copy finished, False if the timeout ran out first.
+        """
+        self._thread.join(timeout)
+        if self.Error is not None:
+            raise self.Error
+        return self.Done
+
+    def _step(self, status: int, remaining: int, total: int):
+        self.TotalPages = total
+        self.Pages = total - remaining
+        self.Seconds = time.monotonic() - self._start
+        if self._progress is not None:
+            self._progress(self.Pages, total, self.PagesPerSecond)
+
+    def _run(self):
+        self._start = time.monotonic()
+        source = sqlite3.connect(f'file:{urllib.parse.quote(os.path.abspath(self._source))}?mode=ro', uri=True)
+        try:
+            if self._vacuum:
+                # VACUUM INTO won't replace a file
+                if os.path.isfile(self._dest):
+                    os.remove(self._dest)
+                source.execute('VACUUM INTO ?', [self._dest])
+
+                dest = sqlite3.connect(self._dest)
+                try:
+                    self._step(0, 0, dest.execute('PRAGMA page_count').fetchone()[0])
+                finally:
+                    dest.close()
+            else:
+                dest = sqlite3.connect(self._dest)
+                try:
+                    source.backup(dest, pages=self._pages_per_step, progress=self._step, sleep=self._sleep)
+                finally:
+                    dest.close()
+        except Exception as e:
+            # anything that stops the copy (ie - the disk filled up) is raised from Wait
+            self.Error = e
+        finally:
+            source.close()
+            self.Seconds = time.monotonic() - self._start
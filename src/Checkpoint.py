@@ -0,0 +1,112 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+from Definitions import CheckpointModes, CheckpointResult
+
+
+def Run(conn: sqlite3.Connection, mode: CheckpointModes, lock: threading.Lock = None) -> CheckpointResult:
+    """
+    Checkpoints the WAL.
+    :param conn: The connection to run it on.
+    :param mode: How hard to try, see CheckpointModes.
+    :param lock: Held while it runs, the writer's lock so it runs between batches.
+    :return: How it went.
+    """
+    start = time.monotonic()
+    with lock if lock is not None else contextlib.nullcontext():
+        busy, frames, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode.AsStr()})').fetchone()
+    return CheckpointResult(mode, busy == 1, frames, checkpointed, time.monotonic() - start)
+
+
+class WalPolicy:
+    """
+    Keeps the WAL from growing without end under a steady stream of writes, on a background thread started by the
+    Database when wal_checkpoint_mb is set in the global section of the ini file.
+
+    sqlite's own automatic checkpoints can't finish while readers are still using the older frames, and never shrink
+    the file, so under load the log keeps growing and every read has more of it to search.  Once the log is past the
+    checkpoint size this copies what it can without getting in anyone's way (PASSIVE).  If that got everything, no
+    reader is holding the log, so it's truncated straight away.  If readers are still behind it's left for them unless
+    the log is past the limit, then the truncate waits for them (and holds up the writers) until it can finish.
+
+    Checkpoints run on the thread's own connection, between the writer's batches when the database has one.
+    """
+
+    def __init__(self, path: str, size: int, limit: int, interval: float = 1.0, lock: threading.Lock = None):
+        """
+        Constructor
+        :param path: The database file.
+        :param size: The bytes the log can grow to before it's checkpointed.
+        :param limit: The bytes past which the log is truncated even if it means waiting on the readers.
+        :param interval: The seconds between checks of the log's size.
+        :param lock: Held while each checkpoint runs, the writer's lock so they run between its batches.
+        """
+        self._path = path
+        self._wal = path + '-wal'
+        self._size = size
+        self._limit = limit
+        self._interval = interval
+        self._lock = lock
+
+        self.WalBytes = 0  # size of the log at the last check
+        self.Checkpoints = 0  # checkpoints run
+        self.Frames = 0  # frames copied into the database by them
+        self.Seconds = 0.0  # time spent in them
+        self.Last = None  # the CheckpointResult of the last one
+
+        # the counts sqlite gives back cover the whole log, so remember them to work out what each checkpoint copied
+        self._logFrames = 0
+        self._copied = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='IniLiteWalPolicy', daemon=True)
+        self._thread.start()
+
+    def Close(self):
+        """
+        Stops the thread, letting any checkpoint already running finish.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        # the connection has to be made on the thread which uses it
+        conn = sqlite3.connect(self._path, isolation_level=None)
+        try:
+            while not self._stop.wait(self._interval):
+                self.WalBytes = os.path.getsize(self._wal) if os.path.isfile(self._wal) else 0
+                if self.WalBytes < self._size:
+                    continue
+
+                result = self._checkpoint(conn, CheckpointModes.PASSIVE)
+                if result.checkpointed == result.frames or self.WalBytes >= self._limit:
+                    self._checkpoint(conn, CheckpointModes.TRUNCATE)
+                    self.WalBytes = os.path.getsize(self._wal) if os.path.isfile(self._wal) else 0
+        finally:
+            conn.close()
+
+    def _checkpoint(self, conn: sqlite3.Connection, mode: CheckpointModes) -> CheckpointResult:
+        try:
+            result = Run(conn, mode, self._lock)
+        except sqlite3.OperationalError:
+            # locked out past the busy timeout, try again next time round
+            return CheckpointResult(mode, True, -1, -1, 0.0)
+
+        if mode == CheckpointModes.TRUNCATE and not result.busy:
+            # the log is gone, so whatever was left in it was copied
+            self.Frames += self._logFrames - self._copied
+            self._logFrames = self._copied = 0
+        else:
+            if result.frames < self._logFrames:
+                # the log started over since the last one
+                self._copied = 0
+            self.Frames += max(result.checkpointed - self._copied, 0)
+            self._logFrames, self._copied = result.frames, result.checkpointed
+
+        self.Checkpoints += 1
+        self.Seconds += result.seconds
+        self.Last = result
+        return result
@@ -1,6 +1,7 @@
 import re
 import typing
 import fnmatch
+import datetime
 from enum import IntEnum
 from sqlparse import tokens as Token
 
@@ -21,7 +22,7 @@ class StorageTypes(IntEnum):
     # SQLite recognizes the keywords "TRUE" and "FALSE", as of version 3.23.0 (2018-04-02) but those keywords
     # are really just alternative spellings for the integer literals 1 and 0 respectively.
     #
-    #       TODO support for dates as special cases of the storage types - text-date, real-data, int-date?
+    # The date types (date, datetime and timestamp) are stored as Unix Time, see Column.ToStorage.
     # SQLite does not have a storage class set aside for storing dates and/or times. Instead, the built-in Date
     # And Time Functions of SQLite are capable of storing dates and times as TEXT, REAL, or INTEGER values:
     #   * TEXT as ISO8601 strings ("YYYY-MM-DD HH:MM:SS.SSS").
@@ -86,8 +87,18 @@ class Column:
     Representation of a column in the table.  Allows for consolidation of the validation functions and meta-data.
     The validation is performed through a single function which takes only the prospective value as an argument, and
     returns True if the value is good.  This defaults to a simple type check.
+
+    The date types are kept as numbers so they're compact and compare (and index) as numbers, and are converted to and
+    from python objects on the way in and out:
+        date      - datetime.date, integer seconds since the epoch at midnight UTC
+        datetime  - naive datetime.datetime taken as UTC, integer seconds since the epoch
+        timestamp - datetime.datetime in UTC, real seconds since the epoch (to the microsecond)
     """
 
+    # the date types, and the storage type each is kept as
+    __TEMPORAL = {'date': StorageTypes.INTEGER, 'datetime': StorageTypes.INTEGER, 'timestamp': StorageTypes.REAL}
+    __EPOCH = datetime.datetime(1970, 1, 1)
+
     # region Properties
     @property
     def Name(self):
@@ -97,6 +108,10 @@ class Column:
     def ColumnType(self):
         return self._rawType
 
+    @property
+    def StorageType(self) -> StorageTypes:
+        return self._storageT
+
     @property
     def Default(self):
         return self._default
@@ -125,17 +140,47 @@ class Column:
     def Unique(self) -> bool:
         return self._solo
 
+    @property
+    def FullText(self) -> bool:
+        return self._fulltext
+
+    @property
+    def SqlType(self) -> str:
+        # strict tables only take the storage types (and any), everything else is declared as its storage type
+        if self._strict and self._rawType.lower() not in ['int', 'integer', 'real', 'text', 'blob', 'any']:
+            return {StorageTypes.INTEGER: 'integer', StorageTypes.REAL: 'real', StorageTypes.TEXT: 'text',
+                    StorageTypes.BLOB: 'blob'}[self._storageT]
+        return self._rawType if self._temporal is None else self._temporal
+
+    @property
+    def Temporal(self) -> typing.Union[str, None]:
+        return self._temporal
+
+    @property
+    def Indexed(self) -> bool:
+        return self._indexed
+
+    @property
+    def DatabaseType(self) -> typing.Union[str, None]:
+        # the type the column has in the database file, None for a new column
+        return self._dbType
+
     @property
     def IsValid(self) -> bool:
         return self._valid
 
     # endregion
 
-    def __init__(self, name: str, props: str, toks: list = []):
+    def __init__(self, name: str, props: str, toks: list = [], strict: bool = False):
         """
         Convert a string from the ini file with the column description into a column object.
+        :param name: The name of the column.
+        :param props: The column description from the ini file.
+        :param toks: The column's tokens from the create statement in the database, empty for a new column.
+        :param strict: The column is in a strict table, so sqlite checks the types itself.
         """
         self._name = name
+        self._strict = strict
         vdator = ''
 
         # find the parans enclosing the validator
@@ -158,9 +203,18 @@ class Column:
         self._ispk = False
         self._fk = None
         self._default = None
+        self._fulltext = False
+        self._indexed = False
+        self._temporal = self._rawType.lower() if self._rawType.lower() in Column.__TEMPORAL else None
+        self._dbType = toks[0] if len(toks) > 0 else None
 
         # match the column type to storage type
-        if self._rawType.lower().find('int') >= 0:
+        if self._temporal is not None:
+            self._storageT = Column.__TEMPORAL[self._temporal]
+
+            # a date column which is something else in the database needs converting (see Table.Sync)
+            self._valid &= self._dbType is None or self._dbType.lower() == self.SqlType
+        elif self._rawType.lower().find('int') >= 0:
             # SQLITE Rule1: If the declared type contains the string "INT" then it is assigned INTEGER affinity.
             self._storageT = StorageTypes.INTEGER
         elif self._rawType.lower().find('char') >= 0 \
@@ -196,6 +250,18 @@ class Column:
             elif tech.strip(' ').lower() == 'math':
                 func[0] = 'x'
                 self._validator = lambda x: func.strip(' ')
+        elif self._temporal is not None:
+            # the python objects, or the numbers they're stored as - checked on strict tables as well, they have to be
+            # converted before sqlite ever sees them
+            pytype = {'date': datetime.date, 'datetime': datetime.datetime, 'timestamp': datetime.datetime}[
+                self._temporal]
+            numtypes = (int, float) if self._storageT == StorageTypes.REAL else int
+            exact = self._temporal == 'date'  # a datetime is a date too, but would lose its time
+            self._validator = lambda val: val is None or isinstance(val, numtypes) or \
+                (isinstance(val, pytype) and not (exact and isinstance(val, datetime.datetime)))
+        elif self._strict:
+            # sqlite refuses the wrong types itself, no need to check them here as well
+            self._validator = lambda val: True
         else:
             # default validators for the storage types
             match self._storageT:
@@ -227,6 +293,14 @@ class Column:
                     self._null = False  # equivalent of not null
                 case 'unique':
                     self._solo = True
+                case 'fulltext':
+                    # kept in the table's full text index rather than the create statement, so there's no token
+                    self._fulltext = True
+                    continue
+                case 'index':
+                    # same, the index is its own statement
+                    self._indexed = True
+                    continue
                 case 'key':
                     if self._fk is not None:
                         raise ValueError(f"{name}: Cannot be both foreign and primary key")
@@ -252,16 +326,20 @@ class Column:
                     pp = p.strip().split(' ')
                     if len(pp) == 2:
                         # need to change the type based on the column type
-                        match self._storageT:
-                            case StorageTypes.INTEGER:
-                                self._default = int(pp[1])
-                            case StorageTypes.REAL:
-                                self._default = float(pp[1])
-                            case StorageTypes.TEXT:
-                                self._default = str(pp[1])
-                            case StorageTypes.BLOB:
-                                self._default = bytes(pp[1])
-                        # end match
+                        if self._temporal is not None:
+                            # written in the ini file as an iso date
+                            self._default = self.ToStorage(self.FromString(pp[1]))
+                        else:
+                            match self._storageT:
+                                case StorageTypes.INTEGER:
+                                    self._default = int(pp[1])
+                                case StorageTypes.REAL:
+                                    self._default = float(pp[1])
+                                case StorageTypes.TEXT:
+                                    self._default = str(pp[1])
+                                case StorageTypes.BLOB:
+                                    self._default = bytes(pp[1])
+                            # end match
                     else:
                         # error! expect 'default <value>' - found extra spaces
                         pass
@@ -279,13 +357,17 @@ class Column:
 
             # check if we
             if len(toks) > 0:
-                self._valid &= propmap[p1] in toks
-                toks.remove(propmap[p1])
+                # reference and default carry a value after the keyword, only match on the keyword
+                found = [t for t in toks if t.lower().startswith(propmap[p1.split(' ')[0]])]
+                self._valid &= len(found) > 0
+                if len(found) > 0:
+                    toks.remove(found[0])
         # for p in parts
 
         if self._default is None:
             self._sql_default = False
-            match self._storageT:
+            # a missing date is left null rather than becoming the epoch
+            match self._storageT if self._temporal is None else None:
                 case StorageTypes.INTEGER:
                     self._default = 0
                 case StorageTypes.REAL:
@@ -311,6 +393,60 @@ class Column:
         """
         return self._validator(value)
 
+    def ToStorage(self, value: typing.Any) -> typing.Any:
+        """
+        Converts a value for this column into what's written to the database.  Only the date types change anything,
+        numbers already in the storage type are left alone.
+        """
+        if self._temporal is None or not isinstance(value, datetime.date):
+            return value
+
+        if self._temporal == 'date':
+            return (value - Column.__EPOCH.date()).days * 86400
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if self._temporal == 'datetime':
+            return (value - Column.__EPOCH) // datetime.timedelta(seconds=1)
+        return (value - Column.__EPOCH) / datetime.timedelta(seconds=1)
+
+    def FromStorage(self, value: typing.Any) -> typing.Any:
+        """
+        Converts a value read from the database back into the python object for the column (see ToStorage).
+        """
+        if self._temporal is None or not isinstance(value, (int, float)):
+            return value
+
+        match self._temporal:
+            case 'date':
+                return Column.__EPOCH.date() + datetime.timedelta(days=value // 86400)
+            case 'datetime':
+                return Column.__EPOCH + datetime.timedelta(seconds=value)
+            case _:
+                return (Column.__EPOCH + datetime.timedelta(seconds=value)).replace(tzinfo=datetime.timezone.utc)
+
+    def FromString(self, text: str) -> typing.Any:
+        """
+        Reads an iso 8601 date (or date and time) into the python object for the column.
+        """
+        if self._temporal == 'date':
+            return datetime.date.fromisoformat(text)
+        return datetime.datetime.fromisoformat(text)
+
+    def Build_CopySQL(self) -> str:
+        """
+        Creates the expression which reads the column's current value when the table is rebuilt, converting any dates
+        stored as text into numbers.
+        :return: The SQL expression.
+        """
+        if self._temporal is None:
+            return self.Name
+        if self._temporal == 'timestamp':
+            # whole seconds plus the fraction, julianday would lose the milliseconds to rounding
+            convert = f"strftime('%s', {self.Name}) + (strftime('%f', {self.Name}) - strftime('%S', {self.Name}))"
+        else:
+            convert = f"cast(strftime('%s', {self.Name}) as integer)"
+        return f"case when typeof({self.Name}) = 'text' then {convert} else {self.Name} end"
+
     def Set_Validator(self, vdator: type(len)):
         """
         Changes the validation function for a column.
@@ -339,13 +475,14 @@ class Column:
         """
         return self.pragma[self.headers.index(attr)]
 
-    def Build_SQL(self) -> str:
+    def Build_SQL(self, composite: bool = False) -> str:
         """
         Creates the SQL statement which creates this column.
+        :param composite: The column is part of a composite primary key, which the table declares on its own.
         :return: The SQL statement for the column represented by this object.
         """
         # build the base string from the values in the system
-        clause = f'{self.Name} {self.ColumnType}'
+        clause = f'{self.Name} {self.SqlType}'
 
         # now check the optional fields
         if not self._isDefaultDefault():
@@ -353,10 +490,15 @@ class Column:
                 clause = f'{clause} Default "{self.Default}"'
             else:
                 clause = f'{clause} Default {self.Default}'
-        if self.PrimaryKey > 0:
+        if self.PrimaryKey > 0 and not composite:
             clause = f'{clause} Primary Key'
-        if not self.Nullable and not self.PrimaryKey:  # pk's are inherently not null
+        if not self.Nullable and (composite or not self.PrimaryKey):  # single pk's are inherently not null
             clause = f'{clause} Not Null'
+        if self.Unique:
+            clause = f'{clause} Unique'
+        if self.IsForeignKey:
+            tnc = self.ForeignKey.split('.')
+            clause = f'{clause} References {tnc[0]}({tnc[1]})'
 
         # return the SQL
         return clause
@@ -369,13 +511,13 @@ class Column:
         """
         # TODO figure out how to set this up as a CLASS variable
         defaults = {
-            'integer': 0,
-            'real': 0.0,
-            'text': '',
-            'null': None,
-            'blob': b''
+            StorageTypes.INTEGER: 0,
+            StorageTypes.REAL: 0.0,
+            StorageTypes.TEXT: '',
+            StorageTypes.NULL: None,
+            StorageTypes.BLOB: b''
         }
-        return self.Default == defaults[self.ColumnType]
+        return self.Default == (defaults[self._storageT] if self._temporal is None else None)
 
     def make_sql(self, wname: bool = False) -> str:
         """
@@ -412,6 +554,8 @@ class Column:
 
     def ValidateOP(self, op: ComparisonOps) -> bool:
         # TODO look at SQL operators and sqlite support thereof and verify the operation is correct for this datatype
+        if op == ComparisonOps.MATCH:
+            return self._fulltext
         return True
 
 # end Class Column
\ No newline at end of file
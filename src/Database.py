@@ -1,6 +1,16 @@
 import configparser
 import os
+import urllib.parse
 from Tables import *
+from MapTable import MapTable
+from JoinedTable import JoinedTable
+from Writer import WriteServer, WriteClient, LockSet
+from Backup import BackupJob
+from Maintenance import Maintenance
+import Checkpoint
+from Checkpoint import WalPolicy
+from Trace import SlowLog, TracedConnection
+from Columns import StorageTypes
 from sqlparse import engine, tokens as Token
 
 
@@ -11,10 +21,20 @@ class Database:
     needed.
     """
 
-    def __init__(self, file: str):
+    ChangeLog = '_changes'  # the table the change log is kept in, when turned on
+
+    def __init__(self, file: str, readonly: bool = False, memory: bool = False):
+        """
+        Constructor
+        :param file: The ini file describing the database.
+        :param readonly: Open the database file as an unchanging snapshot, same as mode = readonly in [global].
+        :param memory: Build the database in memory, starting from a copy of the database file if there is one.  Same
+                       as setting File to :memory: except for the copy.
+        """
         # load the configuration
         config = configparser.ConfigParser()
         config.read(file)
+        self._ini = file
 
         self._tables = {}
         tokens = {}
@@ -23,13 +43,85 @@ class Database:
         self.DatabasePath = config['global']['File']
         file_existed = os.path.isfile(self.DatabasePath)
 
-        # creates the file if it isn't present
-        self._client = sqlite3.connect(self.DatabasePath)
+        self.ReadOnly = readonly or config['global'].get('mode', '').lower() == 'readonly'
+        self.InMemory = memory or self.DatabasePath == ':memory:'
+        if self.InMemory and (self.ReadOnly or 'writer' in config['global'].keys()):
+            raise ValueError("An in memory database can't be read-only or share a writer.")
+
+        # time every statement and keep the ones over the threshold, see Trace.py
+        self.SlowLog = None
+        if 'slow_query_ms' in config['global'].keys():
+            self.SlowLog = SlowLog(config['global'].getfloat('slow_query_ms') / 1000,
+                                   config['global'].getint('slow_query_keep', 1000),
+                                   config['global'].get('slow_query_log', None))
+
+        self.Maintenance = None  # see Maintenance.py, never run on a read-only snapshot
+        self.WalPolicy = None  # see Checkpoint.py, likewise
+
+        if self.ReadOnly:
+            self._openSnapshot(config)
+            return
+
+        if self.InMemory:
+            # everything stays in ram until SnapshotTo, the file (if any) is only read from
+            self._client = self._connect(':memory:')
+            file_existed = file_existed and self.DatabasePath != ':memory:'
+            if file_existed:
+                self.LoadFrom(self.DatabasePath)
+        else:
+            # creates the file if it isn't present
+            self._client = self._connect(self.DatabasePath)
+
+        # sqlite only enforces the reference columns when asked to
+        if config['global'].getboolean('foreign_keys', False):
+            self._client.execute('PRAGMA foreign_keys = ON')
+
+        # the pages the WAL can grow to before a commit checkpoints it, set on every connection which commits
+        autocheckpoint = config['global'].getint('wal_autocheckpoint', None)
+
+        # when several processes share the file, one of them (writer = server) owns all the writes and the rest
+        # (writer = client) send theirs to it, reads stay on each process's own connection through the WAL
+        self._writer = None
+        if 'writer' in config['global'].keys():
+            self._client.execute('PRAGMA journal_mode = WAL')
+
+            address = config['global']['writer_address']
+            if ':' in address:
+                host, port = address.rsplit(':', 1)
+                address = (host, int(port))
+            # the writes travel pickled, only processes holding the key may send them
+            if config['global'].get('writer_key', '') == '':
+                raise ValueError("writer needs a writer_key shared by the server and its clients.")
+            authkey = config['global']['writer_key'].encode()
+
+            match config['global']['writer'].lower():
+                case 'server':
+                    self._writer = WriteServer(self.DatabasePath, address, authkey,
+                                               config['global'].getint('writer_batch', 500),
+                                               config['global'].getfloat('writer_latency_ms', 5.0) / 1000,
+                                               autocheckpoint)
+                case 'client':
+                    self._writer = WriteClient(address, authkey)
+                case _:
+                    raise ValueError(f"writer must be server or client, not {config['global']['writer']}.")
+        # end if writer
+
+        # setting up the checkpoints only makes sense in WAL mode, so that turns it on
+        if autocheckpoint is not None or 'wal_checkpoint_mb' in config['global'].keys():
+            self._client.execute('PRAGMA journal_mode = WAL')
+            if autocheckpoint is not None:
+                self._client.execute(f'PRAGMA wal_autocheckpoint = {autocheckpoint}')
 
         # prep for the comparison
         if file_existed:
             # read all the sql creates from the metadata
-            sqlstmts = self._client.execute("select sql from sqlite_master where type = 'table'").fetchall()
+            # sqlite's own tables, the change log and the full text indexes (plus the shadow tables holding them)
+            # aren't part of the ini file
+            sqlstmts = self._client.execute(
+                "select sql from sqlite_master as m where type = 'table' and name not like 'sqlite_%' and name <> ? "
+                "and sql not like 'create virtual%' and not exists (select 1 from sqlite_master as v where "
+                "v.sql like 'create virtual%' and m.name like v.name || '\\_%' escape '\\')",
+                [self.ChangeLog]).fetchall()
 
             for sql in sqlstmts:
                 tname, tdata = self._parse_create(sql[0])
@@ -42,28 +134,186 @@ class Database:
         else:
             self._updating = False
 
-        # load the sections into table entries
+        # load the sections into table entries, map sections need both their tables so hold them until the end
+        maps = []
         for table in config.sections():
             # the globals section is not an actual table
             if table.lower() == 'global':
                 continue
 
+            if 'map' in config[table].keys():
+                maps.append(table)
+                continue
+
             # create new table - pass in empty dict instead of the tokens dict for the table if not found in db
-            ntable = Table(table, self._client, tokens[table] if table in tokens.keys() else {})
+            ntable = Table(config[table], self._client, tokens[table] if table in tokens.keys() else {})
+            ntable._writer = self._writer
+            ntable._autocheckpoint = autocheckpoint
             self._tables[ntable.TableName] = ntable
+            if self._writer is not None and ntable._shards is not None:
+                raise ValueError(f"{table}: the writer's connection doesn't have the shards attached, a sharded table "
+                                 f"can't share a writer.")
 
-            if file_existed:
+            if table in tokens.keys():
                 #update the table if needed
                 if not ntable.IsValid:
                     ntable.Sync()
             else:
-                # empty db, need to create the table
-                Table.Create()
+                # new table (or empty db), need to create the table
+                ntable.Create()
         # end for table in config.sections
 
+        self._relate(maps, config)
+
+        for table in maps:
+            if table not in tokens.keys():
+                self._tables[table].Create()
+
+        # record every write in the change log, for anything downstream which needs to keep up with the tables
+        if config['global'].getboolean('changes', False):
+            with self._client:
+                self._client.execute(f'Create Table If Not Exists {self.ChangeLog} (seq integer primary key '
+                                     f'autoincrement, tbl text not null, op text not null, rowkey)')
+                for table in self._tables.values():
+                    table._changeLog = self.ChangeLog
+                    for trigger in table.Build_ChangeSQL(self.ChangeLog):
+                        self._client.execute(trigger)
+
+        # keep the statistics up to date as the tables grow, the writer's clients leave it to the server
+        if config['global'].getboolean('maintenance', False) and not isinstance(self._writer, WriteClient):
+            if self.InMemory:
+                raise ValueError("An in memory database is only visible to its own connection, it can't be "
+                                 "maintained in the background.")
+            self.Maintenance = Maintenance(self.DatabasePath, self._tables, self._writeLock(),
+                                           config['global'].getfloat('maintenance_idle_ms', 1000.0) / 1000,
+                                           config['global'].getint('maintenance_writes', 10000),
+                                           config['global'].getint('maintenance_vacuum_pages', 0))
+
+        # keep the WAL from growing without end under load, again left to the server
+        if 'wal_checkpoint_mb' in config['global'].keys() and not isinstance(self._writer, WriteClient):
+            if self.InMemory:
+                raise ValueError("An in memory database has no WAL to checkpoint.")
+            size = config['global'].getfloat('wal_checkpoint_mb')
+            self.WalPolicy = WalPolicy(self.DatabasePath, int(size * 1024 * 1024),
+                                       int(config['global'].getfloat('wal_limit_mb', size * 4) * 1024 * 1024),
+                                       config['global'].getfloat('wal_check_ms', 1000.0) / 1000, self._writeLock())
+
+        self._bindTables()
+
         # are there any tables in the db which aren't in the file?  backup before delete?
     # end __init__()
 
+    def _connect(self, database: str, **kwargs) -> sqlite3.Connection:
+        """
+        Opens the database's own connection, traced when the slow query log is on.
+        """
+        if self.SlowLog is None:
+            return sqlite3.connect(database, **kwargs)
+
+        conn = sqlite3.connect(database, factory=TracedConnection, **kwargs)
+        conn.SlowLog = self.SlowLog
+        return conn
+
+    def _writeLock(self) -> LockSet:
+        """
+        The locks held for each batch written from this process, by the buffered tables and the writer if this process
+        owns it.
+        """
+        def locks() -> list:
+            held = [b.Lock for b in [t._buffer for t in list(self._tables.values())] if b is not None]
+            if isinstance(self._writer, WriteServer):
+                held.append(self._writer.Writer.Lock)
+            return held
+        return LockSet(locks)
+
+    def Checkpoint(self, mode: CheckpointModes = CheckpointModes.PASSIVE) -> CheckpointResult:
+        """
+        Copies the changes in the WAL into the database file.  When the database owns a writer, or has buffered
+        tables, the checkpoint waits for the batches being written to finish, and holds the next ones up until it's
+        done.
+        :param mode: How hard to try, PASSIVE never waits on anyone, TRUNCATE waits for everyone and leaves the log
+                     empty (see CheckpointModes).
+        :return: How it went.
+        """
+        return Checkpoint.Run(self._client, mode, self._writeLock())
+
+    @property
+    def SlowQueries(self) -> list:
+        """
+        The most recent statements which took longer than slow_query_ms in the global section of the ini file, oldest
+        first.  Empty if the slow query log isn't turned on.
+        """
+        return [] if self.SlowLog is None else list(self.SlowLog.Entries)
+
+    def _bindTables(self):
+        """
+        Puts the tables on the database itself so db.table is an ordinary attribute lookup.  Tables named the same as
+        something on the database are still reached through __getattr__ (or the _tables dict).
+        """
+        for name, table in self._tables.items():
+            if name not in self.__dict__ and not hasattr(type(self), name):
+                self.__dict__[name] = table
+
+    def _relate(self, maps: list, config: configparser.ConfigParser):
+        """
+        Wires up the reference columns so related rows can be loaded from either side, then builds the map tables.
+        :param maps: The names of the map sections.
+        :param config: The loaded ini file.
+        """
+        for table in list(self._tables.values()):
+            for col in table._columns.values():
+                if col.IsForeignKey:
+                    tname, cname = col.ForeignKey.split('.')
+                    if tname not in self._tables.keys():
+                        raise ValueError(f"{table.TableName}.{col.Name} references unknown table {tname}.")
+                    table.Relate(self._tables[tname], col.Name, cname)
+                    self._tables[tname].Relate(table, cname, col.Name)
+        # end for table
+
+        # now the relationships between the tables
+        for table in maps:
+            # map = <table>[.<column>], <table>[.<column>] - the columns default to the primary keys
+            ends = [e.strip().split('.') for e in config[table]['map'].split(',')]
+            if len(ends) != 2 or ends[0][0] not in self._tables.keys() or ends[1][0] not in self._tables.keys():
+                raise ValueError(f"{table}: map must name two tables from this database.")
+
+            ntable = MapTable(self._tables[ends[0][0]], self._tables[ends[1][0]],
+                              ends[0][1] if len(ends[0]) > 1 else "PrimaryKey",
+                              ends[1][1] if len(ends[1]) > 1 else "PrimaryKey", table)
+            self._tables[ntable.TableName] = ntable
+        # end for table in maps
+    # end _relate()
+
+    def _openSnapshot(self, config: configparser.ConfigParser):
+        """
+        Opens the file as an immutable snapshot (ie - a copy on a read replica).  sqlite skips all locking and change
+        detection on an immutable file, and the whole file is memory mapped so reads come straight from the page cache.
+        None of the schema checks or updates are run and the tables refuse all writes.  The connection can be shared
+        by any number of threads.
+        """
+        if not os.path.isfile(self.DatabasePath):
+            raise FileNotFoundError(f"No database at {self.DatabasePath} to open read-only.")
+
+        uri = f'file:{urllib.parse.quote(os.path.abspath(self.DatabasePath))}?mode=ro&immutable=1'
+        self._client = self._connect(uri, uri=True, check_same_thread=False)
+        self._client.execute(f'PRAGMA mmap_size = {os.path.getsize(self.DatabasePath)}')
+        self._writer = None
+
+        maps = []
+        for table in config.sections():
+            if table.lower() == 'global':
+                continue
+            if 'map' in config[table].keys():
+                maps.append(table)
+                continue
+
+            ntable = Table(config[table], self._client, readonly=True)
+            self._tables[ntable.TableName] = ntable
+
+        self._relate(maps, config)
+        self._bindTables()
+    # end _openSnapshot()
+
     def _parse_create(self, sql: str):
         """
         Converts a create statement into a data structure (format still TBD)
@@ -84,13 +334,34 @@ class Database:
         if toks[0].match(Token.Keyword.DDL, 'create') and toks[1].match(Token.Keyword, 'table') and toks[3].match(
                 Token.Punctuation, '('):
             # save the table name
-            tname = toks[2].value.strip('[').strip(']')
+            tname = toks[2].value.strip('[').strip(']').strip('"')  # sqlite quotes the name after a rename
 
             # first column name is index 4
             i = 4
+            composite = []
 
             # collect the columns
             while not toks[i].match(Token.Punctuation, ')'):
+                # table constraints (ie - a composite primary key) aren't columns, skip past their column list
+                if toks[i].is_keyword and toks[i].value.lower() in ['primary key', 'foreign key', 'unique', 'check',
+                                                                      'constraint']:
+                    # a composite primary key is still a key on each of its columns
+                    keyed = toks[i].value.lower() == 'primary key'
+                    depth = 0
+                    while depth > 0 or not (toks[i].match(Token.Punctuation, ',') or
+                                            toks[i].match(Token.Punctuation, ')')):
+                        if toks[i].match(Token.Punctuation, '('):
+                            depth += 1
+                        elif toks[i].match(Token.Punctuation, ')'):
+                            depth -= 1
+                        elif keyed and depth == 1 and not toks[i].match(Token.Punctuation, ','):
+                            composite.append(toks[i].value.strip('[').strip(']').strip('"'))
+                        i += 1
+                    if toks[i].match(Token.Punctuation, ','):
+                        i += 1
+                    continue
+                # end table constraint
+
                 # get the column name
                 cname = toks[i].value.strip('[').strip(']')
                 i += 1
@@ -102,7 +373,10 @@ class Database:
 
                     # handle the special cases
                     if toks[i].is_keyword:
-                        if tok_text.lower() == 'primary':
+                        if tok_text.lower() == 'primary key':
+                            # sqlparse usually hands this back as a single keyword
+                            tok_text = "primarykey"
+                        elif tok_text.lower() == 'primary':
                             if toks[i + 1].value.lower() == 'key':
                                 tok_text = "primarykey"
                                 i += 1
@@ -146,11 +420,199 @@ class Database:
                 if toks[i].match(Token.Punctuation, ','):
                     i += 1
             # end while not close-paran
+
+            for cname in composite:
+                tdata[cname].append('primarykey')
+
+            # anything after the columns is a table option (ie - strict, without rowid)
+            options = ' '.join([t.value.lower() for t in toks[i + 1:] if not t.match(Token.Punctuation, ';')])
+            options = [o.strip() for o in options.split(',') if len(o.strip()) > 0]
+            if len(options) > 0:
+                tdata[Table.OptionTokens] = options
         # end if tok chain
 
         return tname, tdata
     # end parse_create()
 
+    def Changes(self, since: int = 0, batch: int = 500) -> typing.Generator[Change, None, None]:
+        """
+        Walks through the change log, which is turned on with changes = true in the global section of the ini file.  The
+        log is read a batch at a time, so it's fine to run through a long one.  Changes made while walking are picked
+        up as long as they're in the log before the last batch is read.
+        :param since: The seq of the last change already seen, 0 for the start of the log.
+        :param batch: The number of changes to read at a time.
+        :return: A generator of the changes in the order they were made.
+        """
+        while True:
+            rows = self._client.execute(f'Select seq, tbl, op, rowkey From {self.ChangeLog} Where seq > ? '
+                                        f'Order By seq Limit ?', [since, batch]).fetchall()
+            for row in rows:
+                yield Change(*row)
+            if len(rows) < batch:
+                return
+            since = rows[-1][0]
+
+    def PruneChanges(self, upto: int):
+        """
+        Drops the entries from the change log which everything downstream has seen.
+        :param upto: The last seq to remove.
+        """
+        sql = f'Delete From {self.ChangeLog} Where seq <= ?'
+        if self._writer is not None:
+            self._writer.Write(sql, [upto])
+        else:
+            with self._client:
+                self._client.execute(sql, [upto])
+
+    # region Snapshots
+
+    def LoadFrom(self, path: str, pages_per_step: int = -1, sleep: float = 0.0):
+        """
+        Replaces the contents of the database with a copy of a database file, meant for an in memory database starting
+        from a file saved with SnapshotTo.  Any tables from the ini file which aren't in the file are created.
+        :param path: The database file to load.
+        :param pages_per_step: The number of pages copied at a time, -1 for the whole file in one step.
+        :param sleep: The seconds to wait before retrying a step when the file is busy.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No database at {path} to load from.")
+
+        source = sqlite3.connect(f'file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro', uri=True)
+        try:
+            self._copy(source, self._client, pages_per_step, sleep)
+        finally:
+            source.close()
+
+        # once the database is built, make sure everything in the ini file is there
+        if len(self._tables) > 0:
+            present = [r[0] for r in self._client.execute("Select name From sqlite_master Where type = 'table'")]
+            for name, table in self._tables.items():
+                if name not in present:
+                    table.Create()
+
+    def SnapshotTo(self, path: str, pages_per_step: int = 1024, sleep: float = 0.0,
+                   progress: typing.Callable = None):
+        """
+        Saves a copy of the database to a file, overwriting anything already there.  The copy is made a step at a time
+        so the database isn't held up for the whole copy.
+        :param path: The file to save to.
+        :param pages_per_step: The number of pages copied at a time, -1 for everything in one step.
+        :param sleep: The seconds to wait between steps when the database is busy.
+        :param progress: Called after each step with (status, remaining pages, total pages).
+        """
+        for table in self._tables.values():
+            table.Flush()
+
+        dest = sqlite3.connect(path)
+        try:
+            self._copy(self._client, dest, pages_per_step, sleep, progress)
+        finally:
+            dest.close()
+
+    def Backup(self, dest: str, pages_per_step: int = 256, sleep: float = 0.05, progress: typing.Callable = None,
+               vacuum: bool = False) -> BackupJob:
+        """
+        Starts copying the database to another file on a background thread, the tables can be used as normal while it
+        runs.  Each step holds a read lock on the file for as long as it takes to copy its pages, so smaller steps let
+        writers in more often, but a write from another connection between steps starts the copy over.  In WAL mode a
+        single step (-1) doesn't block writers at all.
+
+        :param dest: The file to copy to, anything already there is replaced.
+        :param pages_per_step: The number of pages copied at a time, -1 for everything in one step.
+        :param sleep: The seconds to wait before retrying a step when the database is busy.
+        :param progress: Called after each step with (pages copied, total pages, pages per second).
+        :param vacuum: Write a compacted copy with VACUUM INTO instead of copying page by page.
+        :return: The running job, Wait on it for the copy to finish.
+        """
+        if self.InMemory:
+            raise ValueError("An in memory database is only visible to its own connection, use SnapshotTo.")
+        return BackupJob(self.DatabasePath, dest, pages_per_step, sleep, progress, vacuum)
+
+    @staticmethod
+    def _copy(source: sqlite3.Connection, dest: sqlite3.Connection, pages: int, sleep: float,
+              progress: typing.Callable = None):
+        """
+        Copies the whole of one database into another with the sqlite backup api.
+        """
+        source.backup(dest, pages=pages, progress=progress, sleep=sleep)
+
+    # endregion
+
+    def WriteStub(self, path: str):
+        """
+        Writes out a stub describing the tables, columns and rows of this database, for IDEs and type checkers.  The
+        stub holds a Database subclass named for the ini file with a typed attribute for each table, use it to annotate
+        the database (ie - db: ShopDatabase = Database('shop.ini')).  Save it as a .pyi next to the code using it, or
+        as a .py to import it.
+        :param path: The file to write.
+        """
+        pytypes = {StorageTypes.INTEGER: 'int', StorageTypes.REAL: 'float', StorageTypes.TEXT: 'str',
+                   StorageTypes.BLOB: 'bytes', 'date': 'datetime.date', 'datetime': 'datetime.datetime',
+                   'timestamp': 'datetime.datetime'}
+        stem = ''.join(ch for ch in os.path.splitext(os.path.basename(self._ini))[0].title() if ch.isalnum())
+
+        lines = [f'# Generated from {os.path.basename(self._ini)} by Database.WriteStub, regenerate it when the ini '
+                 f'file changes.',
+                 'import datetime',
+                 'import typing', '',
+                 'from Columns import Column',
+                 'from Tables import Table',
+                 'from MapTable import MapTable',
+                 'from Database import Database']
+        for name, table in self._tables.items():
+            cname = ''.join(ch for ch in name if ch.isalnum())
+            if isinstance(table, MapTable):
+                # map rows are whatever was selected from the two sides, so there's no fixed row to describe
+                lines += ['', '', f'class {cname}Table(MapTable):']
+                lines += [f'    {c}: Column' for c in table._columns.keys()]
+                continue
+
+            lines += ['', '', f'class {cname}Row(typing.NamedTuple):']
+            lines += [f'    {c}: typing.Optional[{pytypes.get(col.Temporal or col.StorageType, "typing.Any")}]'
+                      for c, col in table._columns.items()]
+            lines += ['', '', f'class {cname}Table(Table):']
+            lines += [f'    {c}: Column' for c in table._columns.keys()]
+            lines += ['', f'    def GetAll(self) -> list[{cname}Row]: ...']
+        # end for name, table
+
+        lines += ['', '', f'class {stem}Database(Database):']
+        lines += [f"    {name}: {''.join(ch for ch in name if ch.isalnum())}Table" for name in self._tables.keys()]
+
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def Close(self):
+        """
+        Finishes any queued writes and closes the connection to the database.
+        """
+        for table in self._tables.values():
+            table.Close()
+        if self.Maintenance is not None:
+            self.Maintenance.Close()
+            self.Maintenance = None
+        if self.WalPolicy is not None:
+            self.WalPolicy.Close()
+            self.WalPolicy = None
+        if self._writer is not None:
+            self._writer.Close()
+            self._writer = None
+        self._client.close()
+
+    def Join(self, primary, secondary, on: tuple = None, mode: JoinModes = JoinModes.LEFT):
+        """
+        Joins two tables from this database, more can be chained on by calling Join on the result.
+        :param primary: The left table, or its name.
+        :param secondary: The right table, or its name.
+        :param on: The (primary column, secondary column) pair to join on.  If not given the pair is found from the
+                   reference columns in the ini file.
+        :param mode: Inner or left join.
+        :return: The joined table.
+        """
+        primary = self._tables[primary] if isinstance(primary, str) else primary
+        secondary = self._tables[secondary] if isinstance(secondary, str) else secondary
+
+        return JoinedTable(primary, secondary, None if on is None else on[0], None if on is None else on[1], mode)
+
     def __getattr__(self, item):
         if item in self._tables.keys():
             return self._tables[item]
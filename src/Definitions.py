@@ -16,6 +16,7 @@ class ComparisonOps(IntEnum):
     LIKE = 7
     IN = 8
     IS = 9
+    MATCH = 10  # full text search, only for fulltext columns
 
     def AsStr(self):
         strs = {
@@ -27,7 +28,23 @@ class ComparisonOps(IntEnum):
             ComparisonOps.LSorEQ: '<=',
             ComparisonOps.LIKE: 'like',
             ComparisonOps.IN: 'in',
-            ComparisonOps.IS: 'is'
+            ComparisonOps.IS: 'is',
+            ComparisonOps.MATCH: 'match'
+        }
+        return strs[self.value]
+
+
+class JoinModes(IntEnum):
+    """
+    Enumeration of the ways the JoinedTable class can match up rows between its tables.
+    """
+    INNER = 0
+    LEFT = 1
+
+    def AsStr(self):
+        strs = {
+            JoinModes.INNER: 'Inner Join',
+            JoinModes.LEFT: 'Left Join'
         }
         return strs[self.value]
 
@@ -39,3 +56,74 @@ class Where:
     value: str
 
 
+@dataclass()
+class Change:
+    """
+    One entry from the change log, see Database.Changes.
+    """
+    seq: int  # position in the log, pass the last one seen as since to pick up from there
+    table: str
+    op: str  # insert, update or delete
+    key: object  # the primary key of the row (the rowid, or a json array without one, for a multi column key)
+
+
+@dataclass()
+class TransferStats:
+    """
+    How an import or export went, see Table.ImportCSV and friends.
+    """
+    rows: int  # rows read or written
+    seconds: float
+
+    @property
+    def RowsPerSecond(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass()
+class SlowQuery:
+    """
+    A statement which took longer than the slow query threshold, see Database.SlowQueries.
+    """
+    sql: str
+    params: str  # the shape of the parameters (ie - '3 params', 'many, 1000 rows'), not the values
+    seconds: float  # running the statement and fetching its rows
+    plan: list  # the query plan, one line per step indented by depth
+    at: float  # when it finished, seconds since the epoch
+
+
+@dataclass()
+class MaintenanceRun:
+    """
+    One task run by the maintenance thread, see Maintenance.History.
+    """
+    task: str  # analyze, optimize, checkpoint or incremental_vacuum
+    table: object  # the table analyzed, None for the tasks covering the whole file
+    seconds: float
+    at: float  # when it finished, seconds since the epoch
+    error: object = None  # the sqlite3.Error it failed with, None if it ran
+
+
+class CheckpointModes(IntEnum):
+    """
+    Enumeration of the ways a WAL checkpoint can run, see Database.Checkpoint.
+    """
+    PASSIVE = 0  # copy what it can without waiting on anyone
+    FULL = 1  # wait for the writers, then copy everything
+    RESTART = 2  # as full, then wait for the readers so the next writer starts the log over
+    TRUNCATE = 3  # as restart, and cut the log file back to nothing
+
+    def AsStr(self):
+        return self.name
+
+
+@dataclass()
+class CheckpointResult:
+    """
+    How a WAL checkpoint went.
+    """
+    mode: CheckpointModes
+    busy: bool  # it couldn't finish, something was in the way
+    frames: int  # frames in the log
+    checkpointed: int  # frames copied into the database file
+    seconds: float
@@ -43,20 +43,41 @@ class InvalidColumnValue(BaseException):
 
 class InvalidOperation(BaseException):
     """
-    Triggers when an operation is attempted on a column with a datatype that doesn't support it.
+    Triggers when an operation is attempted on a column with a datatype that doesn't support it, or on a table which
+    doesn't support it.
     """
 
-    def __init__(self, table: str, col: Columns.Column, op: ComparisonOps):
+    def __init__(self, table: str, col: Columns.Column = None, op: ComparisonOps = None, message: str = None):
         """
         Constructor
         :param table: The name of the table the column is in.
         :param col: THe column the inappropriate operation was attempted with.
         :param op: The operator attempted.
+        :param message: What was attempted, when it isn't an operator on a column.
         """
         self.Table = table
-        self.ColumnName = col.Name
-        self.DataType = col.ColumnType
+        self.ColumnName = col.Name if col is not None else None
+        self.DataType = col.ColumnType if col is not None else None
         self.Operation = op
+        self.Message = message
 
     def __str__(self):
+        if self.Message is not None:
+            return f'{self.Message} on {self.Table}.'
         return f'Cannot do a {self.Operation.AsStr()} on a column of type {self.DataType} on {self.Table}.{self.ColumnName}'
+
+
+class ReadOnlyTable(BaseException):
+    """
+    Exception for when a write is attempted on a table from a database opened read-only.
+    """
+
+    def __init__(self, table: str):
+        """
+        Constructor
+        :param table: The name of the table the write was attempted on.
+        """
+        self.Table = table
+
+    def __str__(self):
+        return f'Cannot write to {self.Table}, the database was opened read-only.'
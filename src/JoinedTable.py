@@ -1,4 +1,3 @@
-import sqlite3
 import typing
 
 from Columns import Column
@@ -6,117 +5,170 @@ from Tables import Table
 from Errors import *
 from Definitions import *
 
+
 class JoinedTable (Table):
     """
     A joined table is a left (primary) and right (secondary) table where the left table is extended with the columns
     from the right table based on common values in specific columns.  In classic DB speak this is a left join with
-    the all the entries from the primary table present but only the matching entries from the secondary table.  The
-    write commands ....
+    the all the entries from the primary table present but only the matching entries from the secondary table, or an
+    inner join with only the entries matching in both.  More tables can be chained on with Join, and every read,
+    including filters on columns from any of the tables, runs as a single statement inside sqlite.
 
     When performing actions which might change the data it will only allow for changes to the primary table as multiple
     entries might map to the secondary from the primary (ie - the primary is people and the secondary are addresses, two
-    people might share one).
+    people might share one).  Filters on any table still decide which primary rows are changed.
     """
 
     # TODO how to handle the sql representation?  since this is all virtual return an empty string?
 
     @property
     def TableName(self):
-        return f'{self._primaryT}/{self._secondT}'
+        return '/'.join([t.TableName for t in self._tables])
+
 
+    def __init__(self, primary: Table, secondary: Table, primaryCol: str = None, secondaryCol: str = None,
+                 mode: JoinModes = JoinModes.LEFT):
+        """
+        Constructor
+        :param primary: The table on the left of the join, and the only one written to.
+        :param secondary: The table joined on.
+        :param primaryCol: The column in the primary to join on, found from the reference columns if not given.
+        :param secondaryCol: The column in the secondary to join on, found from the reference columns if not given.
+        :param mode: Inner or left join.
+        """
+        # the same starting state as any table, with the client and the writer (if writes are being funneled) shared
+        # with the primary
+        self._initState(primary._client, primary._readonly)
+        self._writer = primary._writer
 
-    def __init__(self, primary: Table, secondary: Table, primaryCol: str, secondaryCol: str):
         self._primaryT = primary.TableName
-        self._secondT = secondary.TableName
-        self._primaryKey = primaryCol
-        self._secondKey = secondaryCol
+        self._primary = primary
+
+        self._tables = [primary]  # every table in the chain, in join order
+        self._joins = []  # (mode, table, left column, right column) for each table after the primary
+        self._hidden = set()  # the join columns, these are left out of GetAll to keep things clean
+        self._sqlcache = {}  # rendered selects, by the columns and filter shape
+
+        self._addTable(secondary, None if primaryCol is None else (primaryCol, secondaryCol), mode)
+    # end __init__()
+
+    def _addTable(self, other: Table, on: typing.Union[tuple, None], mode: JoinModes):
+        """
+        Puts another table on the end of the join chain and rebuilds the column lookups.
+        :param other: The table to join.
+        :param on: The (chain column, other column) pair to join on, or None to find it from the reference columns.
+        :param mode: Inner or left join.
+        """
+        if on is None:
+            left, right = self._inferKeys(other)
+        else:
+            # the left column can be from anywhere already in the chain, bare names only if they're in one table
+            owners = [t.TableName for t in self._tables if on[0] in t._columns.keys()]
+            if on[0].count('.') == 1 and \
+                    any([f"{t.TableName}.{c}" == on[0] for t in self._tables for c in t._columns.keys()]):
+                left = on[0]
+            elif len(owners) == 1:
+                left = f"{owners[0]}.{on[0]}"
+            else:
+                raise ImaginaryColumn(self.TableName, on[0])
+
+            right = on[1] if on[1].count('.') == 1 else f"{other.TableName}.{on[1]}"
+            if right.split('.')[0] != other.TableName or right.split('.')[1] not in other._columns.keys():
+                raise ImaginaryColumn(other.TableName, on[1])
 
-        # grab the client
-        self._client = primary._client
+        self._tables.append(other)
+        self._joins.append((mode, other.TableName, left, right))
+        # TODO add option to override this
+        self._hidden.update([left, right])
 
         # init the columns dictionary and primary keys list
-        self._columns = {}  # this will hold two lists of columns, one for the primary and the other for the secondary
-        self._columns[primary.TableName] = []
-        self._columns[secondary.TableName] = []
+        self._columns = {}  # this will hold a list of columns for each table
         self._pks = []  # a list of the names of primary keys
-        self._filters = []  # where clauses
 
-        for table in [primary, secondary]:
+        # name -> (qualified name, column), resolved once here so every lookup after is a single dict hit.  Any name
+        # can be used as table.column, the bare column name only works if it is in just one of the tables
+        self._colmap = {}
+        seen = {}
+
+        for table in self._tables:
+            self._columns[table.TableName] = []
+
             # grab all the columns in the table
             for col in table._columns:
+                qualified = f"{table.TableName}.{col}"
+                self._colmap[qualified] = (qualified, table._columns[col])
+                seen[col] = seen.get(col, 0) + 1
 
-                # TODO add option to override this
-                # if this is the one of the join keys skip it, keep things clean
-                if f"{table.TableName}.{col}" == f"{self._primaryT}.{self._primaryKey}":
-                    continue
-                if f"{table.TableName}.{col}" == f"{self._secondT}.{self._secondKey}":
+                # if this is the one of the join keys skip it
+                if qualified in self._hidden:
                     continue
 
                 # copy the column into the correct list
-                self._columns[table.TableName].append(col)
+                self._columns[table.TableName].append(table._columns[col])
 
                 if table._columns[col].PrimaryKey:
-                    self._pks.append(f"{table.TableName}.{col}")
+                    self._pks.append(qualified)
             # end for col
         # end for table
-    # end __init__()
+
+        for table in self._tables:
+            for col in table._columns:
+                if seen[col] == 1:
+                    self._colmap[col] = self._colmap[f"{table.TableName}.{col}"]
+
+        # the from clause only changes here, so render it once - the hidden rows of the joined tables are left out in
+        # the join, so a left join still keeps the primary's row
+        self._from = f"From {self._primaryT}" + ''.join(
+            [f" {m.AsStr()} {t} on {left} = {right}" + ''.join([f' and {c}' for c in table._hook_Hidden(f'{t}.')])
+             for (m, t, left, right), table in zip(self._joins, self._tables[1:])])
+        self._sqlcache.clear()
+    # end _addTable()
+
+    def _inferKeys(self, other: Table) -> (str, str):
+        """
+        Finds the join columns between the chain and another table from the reference columns in the ini file, in
+        either direction.
+        :return: The qualified (chain column, other column) pair.
+        """
+        found = []
+        for table in self._tables:
+            for name, col in other._columns.items():
+                if col.IsForeignKey and col.ForeignKey.split('.')[0] == table.TableName:
+                    found.append((f"{col.ForeignKey}", f"{other.TableName}.{name}"))
+            for name, col in table._columns.items():
+                if col.IsForeignKey and col.ForeignKey.split('.')[0] == other.TableName:
+                    found.append((f"{table.TableName}.{name}", f"{col.ForeignKey}"))
+
+        if len(found) != 1:
+            raise ValueError(f"Cannot work out how to join {other.TableName} to {self.TableName}, "
+                             f"{len(found)} references found - pass the columns to join on.")
+        return found[0]
 
     # region Hooks
     # These functions are available for inheriting classes to override, to change the behavior across multiple calls
     # within the API.
     def _hook_CheckColumn(self, col: str) -> typing.Union[Column, None]:
-        normed = None
-        match col.count('.'):
-            case 0:
-                if col in self._columns[self._primaryT]:
-                    normed = next(c for c in self._columns[self._primaryT] if c.Name == col)
-                elif col in self._columns[self._secondT]:
-                    normed = next(c for c in self._columns[self._primaryT] if c.Name == col)
-            case 1:
-                [t, c] = col.split('.')
-                if t in self._columns.keys():
-                    if c in self._columns[t]:
-                        normed = next(cx for cx in self._columns[t] if cx.Name == c)
-            # all other cases (the _ case) are invalid, and should return None
-        return normed
+        if col not in self._colmap:
+            return None
+        return self._colmap[col][1]
 
     def _hook_ValidateColumn(self, col: Column, value: typing.Any) -> bool:
         return col.Validate(value)
 
+    def _hook_DefaultColumns(self) -> list:
+        # every column of every table, except for the ones the tables are joined on
+        return [f"{t}.{c.Name}" for t in self._columns.keys() for c in self._columns[t]]
+
     def _hook_ApplyFilters(self, query: str, params: list) -> (str, list):
         # no filters, no work to do
-        if len(self._filters):
-            # Go ahead and add the first filter outside the loop, so we only need to
-            # do the check for existing where statement once - this is a possible
-            # performance improvement (not big, but still....)
-
-            # check for a where clause already in the statement
-            # not applicable now, but one day there might be an use case for function(s) with inline and
-            # also the class filters
-            if query.lower().find('where') > 0:
-                # add an and to bridge the clauses
-                query += ' and '
-            else:
-                # ok, this is the start of the where clause
-                query += ' Where '
-
-            # attach the first filter - outside loop because no and is needed
-            # query += f'{self._buildWhere(self._filters[0].column, self._filters[0].operator, self._filters[0].value)}'
-            query += f'{self._filters[0].column} {self._filters[0].operator.AsStr()} ?'
-            params.append(self._filters[0].value)
-
-            # add additional clauses if needed
-            if len(self._filters) > 1:
-                for f in self._filters[1:]:
-                    # now append the actual clause
-                    # query += f' and {self._buildWhere(f.column, f.operator, f.value)}'
-                    query += f' and {f.column} {f.operator.AsStr()} ?'
-                    params.append(f.value)
-                # end for filters
-            # end if len > 1
-        # end if len
-
-        return query, params
+        if len(self._filters) and not query.lower().startswith('select'):
+            # writes only touch the primary table, so find its rows through the join and the filters can be on any
+            keys = self._primary._rowKey()
+            select, params = super()._hook_ApplyFilters(
+                self._hook_BuildBaseQuery('select', [f'{self._primaryT}.{k}' for k in keys]), params)
+            return f'{query} Where ({", ".join(keys)}) in ({select})', params
+
+        return super()._hook_ApplyFilters(query, params)
 
     def _hook_InLineFilter(self, query: str, params: list, name: str, operator: ComparisonOps, value: typing.Any) -> \
     (str, list):
@@ -125,60 +177,176 @@ class JoinedTable (Table):
         if col is None:
             raise ImaginaryColumn(self.TableName, name)
 
-        # raises an error if the value is invalid for the column
-        if not self._hook_ValidateColumn(col, value):
-            raise InvalidColumnValue(self.TableName, col.Name, value)
+        if not query.lower().startswith('select'):
+            # same as the class filters, writes to the primary are matched through the join
+            keys = self._primary._rowKey()
+            select, params = super()._hook_InLineFilter(
+                self._hook_BuildBaseQuery('select', [f'{self._primaryT}.{k}' for k in keys]), params,
+                self._normalizeColumn(name), operator, value)
+            return f'{query} Where ({", ".join(keys)}) in ({select})', params
 
-        # add the where clause
-        query += f' Where {self._normalizeColumn(col)} {operator.AsStr()} ?'
-        params.append(value)
+        return super()._hook_InLineFilter(query, params, self._normalizeColumn(name), operator, value)
 
-        return query, params
+    def _hook_Hidden(self, prefix: str = '') -> list:
+        # the other tables' hidden rows are left out in the join
+        return self._primary._hook_Hidden(f'{self._primaryT}.')
 
-    def _hook_BuildBaseQuery(self, operation: str, columns: list[Column] = []):
+    def _hook_BuildBaseQuery(self, operation: str, columns: list = []):
         if operation.lower() == 'select':
-            # Select A.Cols, B.Cols from A left join B on A.ndx = B.a [where ....]
-            return f"Select {str.join(', ', columns)} From {self._primaryT} Left Join {self._secondT} on {self._primaryT}.{self._primaryKey} = {self._secondT}.{self._secondKey} "
+            self._refreshTables()
+            # Select A.Cols, B.Cols, C.Cols from A left join B on A.ndx = B.a left join C on ... [where ....]
+            # only the columns asked for are selected, never *
+            return f"Select {str.join(', ', [self._normalizeColumn(c) for c in columns])} {self._from}"
 
         elif operation.lower() == 'insert':
-            # insert into A (<cols>) values (?,?...); insert into B (<right_col>, <other cols> values (<left_col>, <other_vals>)
-            if len(columns) == 1:
-                return f"Insert into {self._primaryT}({columns[0]}) values (?)"
-            elif len(columns) == 0:
-                raise Exception()  # TODO replace with custom error for empty column list
-            else:
-                return f"Insert into {self._primaryT}({str.join(',', columns)}) values ({str.join(', ', ['?' for c in columns])})"
-        # end if insert
+            # only the primary is written to, the columns have already been checked against it
+            return self._primary._hook_BuildBaseQuery(operation, columns)
 
         elif operation.lower() == 'delete':
-            return f"Delete from {self._primaryT}"
+            # a soft delete is an update of the primary
+            return self._primary._hook_BuildBaseQuery(operation)
 
         elif operation.lower() == 'update':
-            """
-            This needs some re-processing
-            if the column being set is in the primary table, just run the set with the primaryT's key...what if filter on secondary?
-            if the column is in the secondary then there will be a need to do teh 'join' via a seondary key = select key from primaryT....
-            if there are filters, they will need to be applied either within the main query or the secondary select, based on which table they actually touch
-            there is a lot more complexity here, maybe we need a query object to pass around so the whole thing, base query, filters, et all can be combined in one shot?
-            """
-            if len(columns) == 1:
-                return f"Update {self._primaryT} set {columns[0] + ' = ?'}"
-            elif len(columns) == 0:
+            if len(columns) == 0:
                 raise Exception()  # TODO replace with custom error for empty column list
-            else:
-                return f"Update {self._primaryT} set {str.join(', ', [x + ' = ?' for x in columns])}"
+            for c in columns:
+                if not self._normalizeColumn(c).startswith(f"{self._primaryT}."):
+                    raise ImaginaryColumn(self._primaryT, c)
+            return f"Update {self._primaryT} set {str.join(', ', [x.split('.')[-1] + ' = ?' for x in columns])}"
         else:
             raise Exception()  # TODO replace with custom error for invalid db operation
 
     # endregion
 
-    def _normalizeColumn(self, col: Column) -> str:
-        if col in self._columns[self._primaryT]:
-            return f"{self._primaryT}.{col.Name}"
-        elif col in self._columns[self._secondT]:
-            return f"{self._secondT}.{col.Name}"
+    def _write(self, sql: str, params: typing.Any = (), many: bool = False):
+        # the statements are all against the primary, it knows how to write to itself (ie - to each partition)
+        self.Writes += len(params) if many else 1
+        self._primary._write(sql, params, many)
+
+    def _parallelPlan(self, workers: typing.Union[int, None]) -> typing.Union[tuple, None]:
+        # the rows of a join don't follow any one table's rowids, so there's nothing to split on - always read serially
+        return None
+
+    def _refreshTables(self):
+        """
+        Brings the views over any partitioned tables in the chain up to date before they're read through the join.
+        """
+        for table in self._tables:
+            if table._partition is not None:
+                table._refreshParts()
+
+    def _normalizeColumn(self, col: str) -> str:
+        # already qualified (ie - the rowid used for the writes)
+        if col in self._colmap:
+            return self._colmap[col][0]
+        elif col.count('.') == 1:
+            return col
         else:
-            raise ImaginaryColumn(self.TableName, col.Name)
+            raise ImaginaryColumn(self.TableName, col)
+
+    def Join(self, other: Table, on: tuple = None, mode: JoinModes = JoinModes.LEFT):
+        """
+        Creates a new joined table with another table added to the end of this chain.  This one is left as is.
+
+        :param other: The table to join with.
+        :param on: The (column from this chain, column from other) pair to join on.  If not given the pair is found
+                   from the reference columns in the ini file.
+        :param mode: Inner or left join.
+        :return: The new joined table.
+        """
+        # copy.copy trips over Table.__getattr__ on the empty instance, so do the shallow copy by hand
+        joined = type(self).__new__(type(self))
+        joined.__dict__.update(self.__dict__)
+        joined._tables = list(self._tables)
+        joined._joins = list(self._joins)
+        joined._hidden = set(self._hidden)
+        joined._filters = list(self._filters)
+        joined._rowfactories = {}
+        joined._sqlcache = {}
+
+        joined._addTable(other, on, mode)
+        return joined
+
+    def GetAll(self) -> list:
+        """
+        Performs a get for all the columns in all the tables, except for the columns the tables are joined on.  Any
+        filters set still apply to the results.
+        :return: The results.
+        """
+        return self.Get(self._hook_DefaultColumns())
+
+    def Get(self, columns: list) -> list:
+        """
+        Retrieves all values of a set of columns.  If the where clause is specified then only the matching values are
+        returned.  The statement is rendered once for each combination of columns and filters, after that only the
+        parameters change.
+
+        :param columns: A list of the column names to select, as table.column or just the column if it is unique.
+        :return: The rows, each a named tuple with the selected columns available by index or by name.
+        """
+        # an IN list changes the statement with the number of placeholders it's padded to
+        shape = (tuple(columns), tuple([(f.column, f.operator, self._inSlots(f.value)
+                                         if f.operator == ComparisonOps.IN else None) for f in self._filters]))
+
+        if shape not in self._sqlcache:
+            # sanity check the columns
+            for c in columns:
+                if self._hook_CheckColumn(c) is None:
+                    raise ImaginaryColumn(self.TableName, c)
+
+            query, params = self._hook_ApplyFilters(self._hook_BuildBaseQuery('select', columns), [])
+            self._sqlcache[shape] = query
+        else:
+            query = self._sqlcache[shape]
+            params = [p for f in self._filters for p in self._conditionParams(f.operator, f.value)]
+            self._refreshTables()
+
+        # execute the query, rows are built directly into the named row class for these columns
+        cur = self._client.cursor()
+        cur.row_factory = self._hook_RowFactory(columns)
+        cur.execute(query, params)
+
+        return cur.fetchall()
+
+    def Add(self, values):
+        """
+        Adds a new entry to the primary table.
+        :param values: A map of the column names and values, all of which have to be in the primary table.
+        """
+        cols = {}
+        for k in values.keys():
+            if k not in self._colmap or not self._colmap[k][0].startswith(f"{self._primaryT}."):
+                raise ImaginaryColumn(self._primaryT, k)
+            cols[self._colmap[k][0].split('.')[-1]] = values[k]
+
+        self._primary.Add(cols)
+
+    def ParallelAggregate(self, op: str, column: str, workers: int = None) -> typing.Any:
+        """
+        Works out an aggregate over a column for the rows of the join matching the current filters.  Joins are always
+        read serially (see _parallelPlan).
+        :param op: count, sum, min, max or avg.
+        :param column: The name of the column to aggregate, as table.column or just the column if it is unique.
+        :param workers: Ignored, kept to match Table.ParallelAggregate.
+        :return: The value of the aggregate, None if no rows matched (except for count).
+        """
+        if self._hook_CheckColumn(column) is None:
+            raise ImaginaryColumn(self.TableName, column)
+        # the aggregates are built around the name, so it has to already be in the form the select uses
+        return super().ParallelAggregate(op, self._normalizeColumn(column), workers)
+
+    def Filter(self, name: str, operator: ComparisonOps, value: typing.Any):
+        """
+        Adds a filter to the system which will restrict results to only those which meet the criteria.
+        :param name: The name of the column to filter on, use table.column when the name is in more than one table.
+        :param operator: How the value is applied.
+        :param value: The threshold or matching value to filter based on.
+        """
+        col = self._hook_CheckColumn(name)
+        if col is None:
+            raise ImaginaryColumn(self.TableName, name)
+
+        super().Filter(self._normalizeColumn(name), operator, value)
 
     # region Old Junk
     # def GetAll(self) -> list:
@@ -225,7 +393,6 @@ class JoinedTable (Table):
     #     # end if len > 0
     #
     #     # execute the query
-    #     print(query)
     #     cur = self._client.execute(query)
     #
     #     # marshall the results and return the rows
@@ -0,0 +1,127 @@
+import collections
+import contextlib
+import sqlite3
+import threading
+import time
+
+from Definitions import MaintenanceRun
+
+
+class Maintenance:
+    """
+    Keeps the query planner's statistics (and the file) in shape as the tables grow, on a background thread started by
+    the Database when maintenance = true in the global section of the ini file.
+
+    The thread watches the number of rows written through each table.  Once the writes stop for the idle time, any
+    table with more than the threshold of writes since it was last analyzed is analyzed, followed by PRAGMA optimize.
+    In WAL mode the log is checkpointed (and truncated) once the threshold of writes has gone in across all the tables,
+    and the free pages are given back with incremental_vacuum when there are more than vacuum_pages of them - this
+    needs auto_vacuum = incremental set on the file before its tables were created.
+
+    The tasks run on the thread's own connection.  When the database has a writer they run between its batches.
+    """
+
+    def __init__(self, path: str, tables: dict, lock: threading.Lock = None, idle: float = 1.0,
+                 writes: int = 10000, vacuum_pages: int = 0, history: int = 1000):
+        """
+        Constructor
+        :param path: The database file.
+        :param tables: The database's tables, by name.
+        :param lock: Held while each task runs, the writer's lock so the tasks run between its batches.
+        :param idle: The seconds without any writes before the tasks are run.
+        :param writes: The rows written to a table before it's analyzed again, and to all the tables before the WAL
+                       is checkpointed.
+        :param vacuum_pages: The free pages there can be before they're vacuumed away, 0 to never vacuum.
+        :param history: The number of task runs kept in History.
+        """
+        self._path = path
+        self._tables = tables
+        self._lock = lock
+        self._idle = idle
+        self._writes = writes
+        self._vacuumPages = vacuum_pages
+
+        self.History = collections.deque(maxlen=history)  # what ran and how long it took, oldest first
+
+        # the writes as of each table's last analyze, and across all of them as of the last checkpoint
+        self._analyzed = {name: 0 for name in tables.keys()}
+        self._checkpointed = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='IniLiteMaintenance', daemon=True)
+        self._thread.start()
+
+    def Close(self):
+        """
+        Stops the thread, letting any task already running finish.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _total(self) -> int:
+        return sum([t.Writes for t in list(self._tables.values())])
+
+    def _run(self):
+        # the connection has to be made on the thread which uses it
+        conn = sqlite3.connect(self._path, isolation_level=None)
+        try:
+            # the shards are in other files, attached here the same as on the database's connection
+            for table in list(self._tables.values()):
+                for schema, file in table._shards or []:
+                    conn.execute(f'Attach Database ? As {schema}', [file])
+
+            last = self._total()
+            quiet = time.monotonic()
+            while not self._stop.wait(self._idle / 4):
+                total = self._total()
+                if total != last:
+                    last, quiet = total, time.monotonic()
+                elif time.monotonic() - quiet >= self._idle:
+                    try:
+                        self._maintain(conn)
+                    except sqlite3.Error as e:
+                        # reading the file's state failed (ie - it's locked), it's all tried again next time
+                        self.History.append(MaintenanceRun('maintain', None, 0.0, time.time(), e))
+        finally:
+            conn.close()
+
+    def _maintain(self, conn: sqlite3.Connection):
+        """
+        Runs whichever of the tasks are due.
+        """
+        due = [name for name, table in list(self._tables.items())
+               if table.Writes - self._analyzed.get(name, 0) >= self._writes]
+        for name in due:
+            writes = self._tables[name].Writes
+            # a partitioned table is a view here, its partitions are what get analyzed
+            parts = self._tables[name]._parts if self._tables[name]._partition is not None else [name]
+            if all([self._task(conn, 'analyze', name, f'Analyze {table}') for table in parts]):
+                self._analyzed[name] = writes
+        if len(due) > 0:
+            self._task(conn, 'optimize', None, 'PRAGMA optimize')
+
+        total = self._total()
+        if total - self._checkpointed >= self._writes:
+            if conn.execute('PRAGMA journal_mode').fetchone()[0] != 'wal' or \
+                    self._task(conn, 'checkpoint', None, 'PRAGMA wal_checkpoint(TRUNCATE)'):
+                self._checkpointed = total
+
+        if 0 < self._vacuumPages < conn.execute('PRAGMA freelist_count').fetchone()[0]:
+            self._task(conn, 'incremental_vacuum', None, 'PRAGMA incremental_vacuum')
+
+    def _task(self, conn: sqlite3.Connection, task: str, table: str, sql: str) -> bool:
+        """
+        Runs one task and records it in History, along with the error if it failed.  A failed task (ie - the file was
+        busy) doesn't stop the thread, it's due again the next time the database is idle.
+        :return: True if the task ran.
+        """
+        start = time.monotonic()
+        error = None
+        try:
+            with self._lock if self._lock is not None else contextlib.nullcontext():
+                # the pragmas hand back rows, they have to be read for the work to be done
+                conn.execute(sql).fetchall()
+        except sqlite3.Error as e:
+            error = e
+        self.History.append(MaintenanceRun(task, table, time.monotonic() - start, time.time(), error))
+        return error is None
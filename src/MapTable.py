@@ -1,13 +1,265 @@
+import typing
+
+from Columns import Column
 from Tables import Table
+from Errors import *
+from Definitions import *
+
 
 class MapTable(Table):
     """
-    A map table takes two tables and sets a relationship between the two.
+    A map table takes two tables and sets a relationship between the two.  The relationship is stored in a link table
+    holding one row per pair of related keys, so any entry in the primary can relate to many in the secondary and the
+    other way around (ie - people and phone numbers where a house phone is shared).
+
+    The link table is keyed on (primary, secondary) and carries a reverse index on (secondary, primary), so lookups
+    from either side are answered from an index rather than a scan.  Reads join all three tables in a single query.
+
+    In the ini file a map is declared as a section with a map entry naming the two tables, and optionally the columns
+    to relate (the primary keys are used by default):
+        [PersonPhone]
+        map = Person.id, Phone
     """
 
-    # TODO does this need to represented in the ini file?  if so, how?
+    # Select A.Cols, B.Cols from A join M on A.ndx = M.a join B on M.b = B.ndx
+
+    def __init__(self, primary: Table, secondary: Table, primaryCol: str = "PrimaryKey",
+                 secondaryCol: str = "PrimaryKey", name: str = None):
+        """
+        Constructor
+        :param primary: The table on the left side of the relationship.
+        :param secondary: The table on the right side of the relationship.
+        :param primaryCol: The column in the primary table to relate on, PrimaryKey for the table's key.
+        :param secondaryCol: The column in the secondary table to relate on, PrimaryKey for the table's key.
+        :param name: The name of the link table, defaults to the two table names run together.
+        """
+        # the same starting state as any table, with the client and the writer (if writes are being funneled) shared
+        # with the primary - the columns are the two links, which is what actually gets written to the db
+        self._initState(primary._client, primary._readonly)
+        self._writer = primary._writer
+        self._withoutRowid = True  # the link table is keyed on the pair, see Build_SQL
+
+        self._primaryT = primary
+        self._secondT = secondary
+        self.TableName = name if name is not None else f"{primary.TableName}{secondary.TableName}"
+
+        # resolve the columns being related
+        self._primaryKey = self._resolveKey(primary, primaryCol)
+        self._secondKey = self._resolveKey(secondary, secondaryCol)
+
+        # the link columns are named for the table and column they point to
+        self._primaryLink = f"{primary.TableName}_{self._primaryKey}"
+        self._secondLink = f"{secondary.TableName}_{self._secondKey}"
+        if self._primaryLink == self._secondLink:
+            # relating a table to itself, keep the two ends distinct
+            self._secondLink += "2"
+
+        for link, table, key in [(self._primaryLink, primary, self._primaryKey),
+                                 (self._secondLink, secondary, self._secondKey)]:
+            self._columns[link] = Column(link, f"{table._columns[key].ColumnType}, required, "
+                                               f"reference {table.TableName}.{key}")
+            self._pks.append(link)
+
+        # resolve every readable column once so lookups by name are a single dict hit, the unqualified names only
+        # work when they aren't in both tables
+        self._joined = {}
+        for table in [primary, secondary]:
+            for col in table._columns:
+                self._joined[f"{table.TableName}.{col}"] = table._columns[col]
+        for table, other in [(primary, secondary), (secondary, primary)]:
+            for col in table._columns:
+                if col not in other._columns:
+                    self._joined[col] = table._columns[col]
+        for link in self._columns:
+            self._joined[f"{self.TableName}.{link}"] = self._columns[link]
+    # end __init__()
+
+    @staticmethod
+    def _resolveKey(table: Table, col: str) -> str:
+        if col == "PrimaryKey":
+            if len(table._pks) != 1:
+                raise ValueError(f"{table.TableName}: a map needs a single column primary key or an explicit column.")
+            return table._pks[0]
+        if col not in table._columns.keys():
+            raise ImaginaryColumn(table.TableName, col)
+        return col
+
+    def Create(self):
+        """
+        Adds the link table and its reverse index to the active schema.
+        """
+        with self._client:
+            self._client.execute(self.Build_SQL())
+            for idx in self.Build_IndexSQL():
+                self._client.execute(idx)
+
+    def Build_SQL(self):
+        """
+        Creates a SQL statement which would build the link table.  The composite key covers lookups from the primary
+        side, and without a rowid the key is the table so there is no second b-tree to maintain.
+        :return: The SQL Statement.
+        """
+        cols = []
+        for link, table, key in [(self._primaryLink, self._primaryT, self._primaryKey),
+                                 (self._secondLink, self._secondT, self._secondKey)]:
+            cols.append(f"{link} {self._columns[link].ColumnType} not null "
+                        f"References {table.TableName}({key}) On Delete Cascade")
+        return f'Create Table {self.TableName} ({", ".join(cols)}, ' \
+               f'Primary Key ({self._primaryLink}, {self._secondLink})) Without Rowid;'
+
+    def Build_IndexSQL(self) -> list:
+        """
+        Creates the SQL statement for the reverse index, used when traversing from the secondary to the primary.  The
+        primary side is already covered by the key.
+        :return: A list of the SQL statements.
+        """
+        return [f'Create Index If Not Exists {self.TableName}_reverse '
+                f'On {self.TableName} ({self._secondLink}, {self._primaryLink});']
+
+    # region Hooks
+
+    def _hook_CheckColumn(self, col: str) -> typing.Union[Column, None]:
+        if col in self._columns.keys():
+            return self._columns[col]
+        return self._joined.get(col)
+
+    def _hook_DefaultColumns(self) -> list:
+        # the columns of both tables, the links are just the same keys again
+        return [f"{t.TableName}.{c}" for t in [self._primaryT, self._secondT] for c in t._columns.keys()]
+
+    def _hook_InLineFilter(self, query: str, params: list, name: str, operator: ComparisonOps, value: typing.Any) -> \
+            (str, list):
+        return super()._hook_InLineFilter(query, params, self._qualify(name), operator, value)
+
+    def _hook_BuildBaseQuery(self, operation: str, columns: list = []):
+        if operation.lower() == 'select':
+            return f"Select {str.join(', ', [self._qualify(c) for c in columns])} From {self._primaryT.TableName} " \
+                   f"Join {self.TableName} On {self._primaryT.TableName}.{self._primaryKey} = " \
+                   f"{self.TableName}.{self._primaryLink} " \
+                   f"Join {self._secondT.TableName} On {self.TableName}.{self._secondLink} = " \
+                   f"{self._secondT.TableName}.{self._secondKey}"
+        elif operation.lower() == 'insert':
+            return f"Insert or Ignore into {self.TableName}({self._primaryLink}, {self._secondLink}) values (?, ?)"
+        elif operation.lower() == 'delete':
+            return f"Delete from {self.TableName} Where {self._primaryLink} = ? and {self._secondLink} = ?"
+        else:
+            raise InvalidOperation(self.TableName, message=f'Cannot build a {operation} statement')
+
+    def _hook_Hidden(self, prefix: str = '') -> list:
+        # the links stay when either side is soft deleted, the rows just don't show through them
+        return self._primaryT._hook_Hidden(f'{self._primaryT.TableName}.') + \
+               self._secondT._hook_Hidden(f'{self._secondT.TableName}.')
+
+    def _hook_ChangeKey(self, row: str) -> str:
+        # no rowid, the pair is the key
+        return f"json_array({row}.{self._primaryLink}, {row}.{self._secondLink})"
+
+    # endregion
+
+    def _qualify(self, name: str) -> str:
+        """
+        Converts a column name into the table.column form used in the joined query.
+        """
+        col = self._hook_CheckColumn(name)
+        if col is None:
+            raise ImaginaryColumn(self.TableName, name)
+
+        if name.count('.') == 1:
+            return name
+        elif name in self._columns.keys():
+            return f"{self.TableName}.{name}"
+        elif name in self._primaryT._columns.keys():
+            return f"{self._primaryT.TableName}.{name}"
+        return f"{self._secondT.TableName}.{name}"
+
+    def _checkPairs(self, pairs: typing.Iterable) -> list:
+        """
+        Validates the key pairs against the columns they point to.
+        :return: The pairs as a list ready for executemany.
+        """
+        pcol = self._primaryT._columns[self._primaryKey]
+        scol = self._secondT._columns[self._secondKey]
+
+        checked = []
+        for p, s in pairs:
+            if not pcol.Validate(p):
+                raise InvalidColumnValue(self.TableName, self._primaryLink, p)
+            if not scol.Validate(s):
+                raise InvalidColumnValue(self.TableName, self._secondLink, s)
+            checked.append((p, s))
+        return checked
+
+    # region DB Interactions
+
+    def GetAll(self) -> list:
+        """
+        Performs a get for all the columns in both tables.  Any filters set still apply to the results.
+        :return: The results.
+        """
+        return self.Get(self._hook_DefaultColumns())
+
+    def Link(self, pairs: typing.Iterable):
+        """
+        Relates entries in the primary table to entries in the secondary.  Pairs already linked are left alone.
+        :param pairs: An iterable of (primary value, secondary value) tuples.
+        """
+        self._write(self._hook_BuildBaseQuery('insert'), self._checkPairs(pairs), True)
+
+    def Unlink(self, pairs: typing.Iterable):
+        """
+        Removes the relationships between entries.  Pairs which aren't linked are ignored.
+        :param pairs: An iterable of (primary value, secondary value) tuples.
+        """
+        self._write(self._hook_BuildBaseQuery('delete'), self._checkPairs(pairs), True)
+
+    def Add(self, values):
+        """
+        Adds a single relationship.
+        :param values: A map of the link column names and values.
+        """
+        for k in values.keys():
+            if k not in self._columns.keys():
+                raise ImaginaryColumn(self.TableName, k)
+        self.Link([(values[self._primaryLink], values[self._secondLink])])
+
+    def Delete(self, name: str = None, operator: ComparisonOps = ComparisonOps.Noop, value: typing.Any = None):
+        """
+        Removes all the relationships matching the where clause whose details are passed in, or the current filter if
+        none are provided.  The conditions can be on the columns of either table.
+
+        :param name: The name of the column the delete condition is based on.
+        :param operator: The operator for the condition.
+        :param value: The value to compare the current value of the column to.
+        """
+        params = []
+
+        # find the matching pairs with the joined select, then drop those from the link table
+        select = self._hook_BuildBaseQuery('select', [self._primaryLink, self._secondLink])
+        if operator != ComparisonOps.Noop:
+            select, params = self._hook_InLineFilter(select, params, name, operator, value)
+        else:
+            select, params = self._hook_ApplyFilters(select, params)
+
+        self._write(f"Delete from {self.TableName} Where ({self._primaryLink}, {self._secondLink}) in ({select})", params)
+
+    def UpdateValue(self, name: str, value: typing.Any, compname: str = '', operator: ComparisonOps = ComparisonOps.Noop
+                    , compval: typing.Any = None):
+        """
+        Relationships are only ever linked or unlinked, update the tables on either side directly.
+        """
+        raise InvalidOperation(self.TableName, message='Cannot update a map table, use Link and Unlink')
+
+    # endregion
+
+    # region Infrastructure
 
-    # Select A.Cols, B.Cols from A,B,M where A.ndx = M.a and M.b = B.ndx
+    def Filter(self, name: str, operator: ComparisonOps, value: typing.Any):
+        """
+        Adds a filter to the system which will restrict results to only those which meet the criteria.
+        :param name: The name of the column to filter on, use table.column when the name is in both tables.
+        :param operator: How the value is applied.
+        :param value: The threshold or matching value to filter based on.
+        """
+        super().Filter(self._qualify(name), operator, value)
 
-    def __init__(self, primary: Table, secondary: Table, primaryCol: str = "PrimaryKey", secondaryCol: str = "PrimaryKey"):
-        pass
\ No newline at end of file
+    # endregion
@@ -0,0 +1,72 @@
+import sqlite3
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker side of the parallel scans in Table.ParallelGet and Table.ParallelAggregate.  Everything here runs in the pool
+# processes, so it works from plain values (the file uri, the sql and its parameters) and opens its own read-only
+# connection for each range.
+
+
+def ScanRange(uri: str, query: str, params: list, lo: int, hi: int) -> list:
+    """
+    Runs a select over one rowid range of the table.
+    :param uri: The read-only uri of the database file.
+    :param query: The select, with the rowid range as its first two parameters.
+    :param params: The rest of the parameters (the filters).
+    :param lo: The first rowid in the range.
+    :param hi: One past the last rowid in the range.
+    :return: The rows as plain tuples.
+    """
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return conn.execute(query, [lo, hi] + params).fetchall()
+    finally:
+        conn.close()
+
+
+def AggregateRange(uri: str, query: str, params: list, lo: int, hi: int) -> tuple:
+    """
+    Works out the partial aggregate (count, sum, min, max) for one rowid range, see ScanRange for the parameters.
+    """
+    return ScanRange(uri, query, params, lo, hi)[0]
+
+
+def Ranges(lo: int, hi: int, chunks: int) -> list:
+    """
+    Splits the rowids from lo to hi (inclusive) into evenly sized [start, end) ranges.
+    """
+    step = max(1, (hi - lo + chunks) // chunks)
+    return [(start, min(start + step, hi + 1)) for start in range(lo, hi + 1, step)]
+
+
+def Run(func: typing.Callable, uri: str, query: str, params: list, ranges: list, workers: int) -> list:
+    """
+    Spreads the ranges over a pool of worker processes.
+    :return: The result for each range, in the order of the ranges.
+    """
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(func, uri, query, params, lo, hi) for lo, hi in ranges]
+        return [f.result() for f in futures]
+
+
+def MergeAggregates(op: str, parts: list) -> typing.Any:
+    """
+    Combines the partial aggregates from each range into the final value.
+    :param op: count, sum, min, max or avg.
+    :param parts: The (count, sum, min, max) tuples from AggregateRange.
+    """
+    parts = [p for p in parts if p[0] > 0]
+    if op == 'count':
+        return sum([p[0] for p in parts])
+    if len(parts) == 0:
+        return None
+
+    match op:
+        case 'sum':
+            return sum([p[1] for p in parts])
+        case 'min':
+            return min([p[2] for p in parts])
+        case 'max':
+            return max([p[3] for p in parts])
+        case 'avg':
+            return sum([p[1] for p in parts]) / sum([p[0] for p in parts])
@@ -1,16 +1,33 @@
+import atexit
+import calendar
+import concurrent.futures
 import configparser
+import datetime
+import itertools
+import json
+import operator
+import os
+import re
 import sqlite3
+import time
 import typing
+import urllib.parse
+import zlib
+from collections import namedtuple
 from os import MFD_ALLOW_SEALING
 
 from sqlparse import engine, tokens as Token
 
 from Errors import *
 from Definitions import *
-from Columns import Column
+from Columns import Column, StorageTypes
+from Writer import RowBuffer
+import Arrow
+import Parallel
+import Trace
+import Transfer
 
 
-# TODO add date as a special type (subset of text - sqlite doesn't have native date/time support)
 # TODO refactor the executes into a private function (_run)
 #   * isolate the connect, execute, and close calls inside
 #   * determine how to return values without knowing the query type
@@ -28,6 +45,35 @@ class Table:
 
     # region 'Constants'
 
+    # table level settings which can be in the ini section, these are not columns
+    __OPTIONS = ['buffered',  # true to queue adds and commit them in batches
+                 'buffer_rows',  # most rows in a batch
+                 'buffer_ms',  # longest a row waits for its batch
+                 'buffer_size',  # most rows queued before Add blocks
+                 'durability',  # commit - Add returns once the row is written, enqueue - once it's queued
+                 'parallel_workers',  # processes used by the parallel reads, defaults to the cpu count
+                 'parallel_min_rows',  # tables estimated smaller than this are read serially
+                 'partition',  # date column, day|month|year - keep the rows in a table per period of the column
+                 'shard_key',  # the column the rows are spread over the shards by, defaults to the primary key
+                 'shards',  # database files to spread the rows over, comma separated
+                 'soft_delete',  # true to mark rows deleted instead of removing them
+                 'strict',  # true for sqlite to enforce the column types
+                 'without_rowid']  # true to store the rows in the primary key's b-tree, there's no rowid
+
+    # the column soft deleted rows are marked in, with when they were deleted, it isn't one of the ini columns
+    Tombstone = '_deleted'
+
+    # how a partition's name is made from its period, for each partition size
+    __PERIODS = {'year': '%Y', 'month': '%Y%m', 'day': '%Y%m%d'}
+
+    # key the table level tokens (the options after the columns) are passed in under, not a possible ini column
+    OptionTokens = '#table'
+
+    # IN lists up to this long are written out as placeholders, padded to the next power of two so the number of
+    # distinct statements stays small, longer lists are passed as a single json array (or padded to a multiple of
+    # this when they hold blobs, which json can't carry)
+    __IN_PLACEHOLDERS = 256
+
     # Expected label names from the pragma read in the __init__
     __LBLNAME = 'name'  # name of the column
     __LBLTYPE = 'type'  # data type of the column
@@ -37,34 +83,44 @@ class Table:
 
     #endregion
 
-    def __init__(self, section: configparser.SectionProxy, conn: sqlite3.Connection, toks={}): #TODO annotation for toks
-        self._client = conn
-        self._seeds = None  # start with an empty seeding file
+    def __init__(self, section: configparser.SectionProxy, conn: sqlite3.Connection, toks={}, readonly: bool = False): #TODO annotation for toks
+        self._initState(conn, readonly)
         self.TableName = section.name
 
-        # init the columns dictionary and primary keys list
-        self._columns = {}  # this will hold _Column objects indexed by name
-        self._pks = []  # a list of the names of primary keys
-        self._filters = []  # where clauses
-
-        self._valid = True
-
         # the seeding values file is not a real column, but save it for later use
         if 'Values' in section.keys():
             self._seeds = section['Values']
             section.pop('Values')  # clear to not process as column
         
+        # same for the table settings, pulled into their own section so they can use the configparser conversions
+        for opt in self.__OPTIONS:
+            if opt in section.keys():
+                self._options[opt] = section[opt]
+                section.pop(opt)
+
+        if self._options.getboolean('buffered', False):
+            # the flusher writes on its own thread, so it needs its own connection to the same file
+            self._path = conn.execute('PRAGMA database_list').fetchone()[2]
+            if self._path == '':
+                raise ValueError(f"{self.TableName}: buffered tables need a database file, not an in-memory db.")
+
+        self._strict = self._options.getboolean('strict', False)
+        self._withoutRowid = self._options.getboolean('without_rowid', False)
+        self._softDelete = self._options.getboolean('soft_delete', False)
+
         # the names will the keys, the details will be the value
+        existing = len(toks.keys()) > 0
+        if existing:
+            self._valid &= sorted(toks.pop(self.OptionTokens, [])) == sorted(self._tableOptions())
         for col in section.keys():
-            if len(toks.keys()) > 0:
-                self._columns[col] = Column(col, section[col], toks[col] if col in toks.keys() else [])
-                toks.pop(col)
+            if existing:
+                self._columns[col] = Column(col, section[col], toks[col] if col in toks.keys() else [], self._strict)
 
-                # if the column didn't validate we're out of sync
-                self._valid &= self._columns[col].IsValid
+                # if the column didn't validate (or isn't in the db yet) we're out of sync
+                self._valid &= self._columns[col].IsValid and toks.pop(col, None) is not None
             else:
                 # save the column after converting to an object
-                self._columns[col] = Column(col, section[col])
+                self._columns[col] = Column(col, section[col], [], self._strict)
                 # we have a new column in the ini file
                 self._valid = False 
 
@@ -74,20 +130,169 @@ class Table:
                 self._pks.append(col)
         # end for col
 
+        # the tombstone isn't one of the columns, but it has to be there
+        if existing and self._softDelete:
+            self._valid &= toks.pop(self.Tombstone, None) is not None
+
         # if there were any columns in the db not also in ini file we are out of sync
         if len(toks.keys()) != 0:
             self._valid = False
+
+        # Sync has to rebuild the table if the columns themselves are out of sync
+        self._columnsValid = self._valid
+
+        # fulltext columns are copied into an fts5 index, which has to be checked along with the table, as do the
+        # other indexes
+        self._fulltext = [c for c in self._columns.keys() if self._columns[c].FullText]
+        if self._withoutRowid and (len(self._pks) == 0 or len(self._fulltext) > 0):
+            raise ValueError(f"{self.TableName}: a table without a rowid needs a primary key, and can't be fulltext.")
+        if existing:
+            self._valid &= self._fullTextValid() and self._indexesValid()
+
+        # a partitioned table is kept as a table per period, read through a view over all of them (see _refreshParts)
+        if 'partition' in self._options.keys():
+            opts = [o.strip() for o in self._options['partition'].split(',')]
+            col, period = opts[0], opts[1].lower() if len(opts) > 1 else ''
+            if col not in self._columns.keys() or self._columns[col].Temporal is None or period not in self.__PERIODS:
+                raise ValueError(f"{self.TableName}: partition needs a date column and day, month or year, not "
+                                 f"{self._options['partition']}.")
+            if len(self._fulltext) > 0 or self._options.getboolean('buffered', False):
+                raise ValueError(f"{self.TableName}: a partitioned table can't be fulltext or buffered.")
+            self._partition = (col, period)
+
+        # a sharded table is spread over other database files by the hash of a key, attached to the connection and
+        # read through the same sort of view - to the rest of the code it's partitioned by the key
+        if 'shards' in self._options.keys():
+            self._attachShards(conn, readonly)
+
+        # sqlite would number the rows of each partition from 1, so the key comes from a counter they all share
+        if self._partition is not None and len(self._pks) == 1 and not self._withoutRowid and \
+                self._columns[self._pks[0]].StorageType == StorageTypes.INTEGER:
+            self._seq = f'{self.TableName}_seq'
+
+        # build the full width row factory now since GetAll is the most common read - narrower projections get theirs
+        # on first use
+        self._hook_RowFactory(list(self._columns.keys()))
+
+        # put the columns on the table itself so table.column is an ordinary attribute lookup, only names which clash
+        # with the table's own attributes are left to __getattr__
+        for col in self._columns:
+            if col not in self.__dict__ and not hasattr(type(self), col):
+                self.__dict__[col] = self._columns[col]
     # end init()
 
+    def _initState(self, conn: sqlite3.Connection, readonly: bool = False):
+        """
+        Sets up everything a table starts out with, before any of it is read from the ini file.  The map and joined
+        tables aren't built from a section, they call this and then fill in their own parts.
+        :param conn: The connection to the database.
+        :param readonly: Refuse every write, for a read-only snapshot.
+        """
+        self._client = conn
+        self._seeds = None  # start with an empty seeding file
+
+        # init the columns dictionary and primary keys list
+        self._columns = {}  # this will hold _Column objects indexed by name
+        self._pks = []  # a list of the names of primary keys
+        self._filters = []  # where clauses
+
+        self._valid = True
+        self._columnsValid = True
+
+        # the table settings, empty unless the section has some
+        self._options = configparser.ConfigParser()['DEFAULT']
+        self._strict = False
+        self._withoutRowid = False
+        self._softDelete = False
+        self._fulltext = []  # the columns copied into the fts5 index
+        self._buffer = None
+
+        self._partition = None  # (column, period), or (key, 'hash') for a sharded table
+        self._parts = []  # the names of the partitions, oldest first
+        self._schemaVersion = None  # the schema the view was built against
+        self._seq = None  # the table the keys are counted in
+        self._shards = None  # (schema, file) for each shard
+
+        # row factories are cached by the tuple of selected columns
+        self._rowfactories = {}
+
+        # tables related through reference columns, filled in by the Database once all the tables are loaded
+        self._relations = {}  # relation name (see Relate) -> (table, column here, column there)
+
+        # when set, writes are handed to the single writer (see Writer.py) instead of committed on this connection
+        self._writer = None
+        # the database's wal_autocheckpoint, for the buffer's connection
+        self._autocheckpoint = None
+        # set by the Database when opened as a read-only snapshot, every write is refused
+        self._readonly = readonly
+        # set by the Database when it keeps a change log, so new partitions get the triggers too
+        self._changeLog = None
+        # rows written through the table, watched by the maintenance thread (see Maintenance.py)
+        self.Writes = 0
+
+    def _attachShards(self, conn: sqlite3.Connection, readonly: bool = False):
+        """
+        Checks the shard settings and attaches the shard files to the connection, each as {table}_shard{n}.
+        :param readonly: Attach them as immutable snapshots, the same as the main file of a read-only database (the
+                         connection has to have been opened with uri=True).
+        """
+        if self._partition is not None or len(self._fulltext) > 0 or self._options.getboolean('buffered', False):
+            raise ValueError(f"{self.TableName}: a sharded table can't also be partitioned, fulltext or buffered.")
+        if any([c.IsForeignKey for c in self._columns.values()]):
+            raise ValueError(f"{self.TableName}: sqlite can't enforce a reference across files, a sharded table can't "
+                             f"have reference columns.")
+
+        key = self._options.get('shard_key', self._pks[0] if len(self._pks) == 1 else '')
+        if key not in self._columns.keys():
+            raise ValueError(f"{self.TableName}: shard_key has to name a column, unless the table has a single column "
+                             f"key.")
+
+        files = [f.strip() for f in self._options['shards'].split(',')]
+        attached = len([r for r in conn.execute('PRAGMA database_list') if r[0] > 1])
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if attached + len(files) > limit:
+            raise ValueError(f"{self.TableName}: sqlite only attaches {limit} files to a connection, "
+                             f"{attached + len(files)} are needed.")
+
+        self._shards = []
+        for n, file in enumerate(files):
+            schema = f'{self.TableName}_shard{n}'
+            path = f'file:{urllib.parse.quote(os.path.abspath(file))}?mode=ro&immutable=1' if readonly else file
+            conn.execute(f'Attach Database ? As {schema}', [path])
+            self._shards.append((schema, file))
+        self._partition = (key, 'hash')
+
     def Create(self):
         """
         Adds the table to the active schema.
         :return:
         """
+        if self._partition is not None:
+            # the partitions are made as the rows for them arrive, only the key counter and the view are needed now -
+            # the shards are fixed, so they're made up front
+            with self._client:
+                if self._seq is not None:
+                    self._client.execute(f'Create Table If Not Exists {self._seq} (next integer not null)')
+                    self._client.execute(f'Insert into {self._seq} (next) Select 1 Where not exists '
+                                         f'(Select 1 From {self._seq})')
+                for part in [f'{schema}.{self.TableName}' for schema, file in self._shards or []]:
+                    for sql in self._partSQL(part):
+                        self._client.execute(sql)
+            self._refreshParts(True)
+            return
+
         sql = self.Build_SQL()
         try:
             with self._client:
                 self._client.execute(sql)
+
+                # index the reference columns, sqlite doesn't do it on its own and they're what the related rows
+                # are looked up by
+                for idx in self.Build_IndexSQL():
+                    self._client.execute(idx)
+
+                for fts in self.Build_FullTextSQL():
+                    self._client.execute(fts)
         except sqlite3.DataError as de:
             pass
         except sqlite3.IntegrityError as ie:
@@ -97,7 +302,86 @@ class Table:
     # end Create()
 
     def Sync(self):
-        pass
+        """
+        Brings the table in line with the ini file.  When the columns differ the table is rebuilt from the ini file and
+        the rows copied over, converting any dates held as text into the date types.  Columns in the database but not
+        the ini file are never dropped, if there are any the columns are left as they are.  The indexes, including the
+        full text index, are then brought up to date.  A partitioned table only has its partitions' indexes brought up
+        to date.
+        """
+        if self._partition is not None:
+            self._refreshParts(True)
+            with self._client:
+                for part in self._parts:
+                    for idx in self.Build_IndexSQL(part):
+                        self._client.execute(idx)
+            return
+
+        rebuilt = False
+        if not self._columnsValid:
+            rebuilt = self._rebuild()
+
+        with self._client:
+            for idx in self.Build_IndexSQL():
+                self._client.execute(idx)
+
+            # a rebuild takes the full text triggers with the old table
+            if rebuilt or not self._fullTextValid():
+                for sql in self.Build_DropFullTextSQL():
+                    self._client.execute(sql)
+                for sql in self.Build_FullTextSQL():
+                    self._client.execute(sql)
+
+        self._columnsValid |= rebuilt
+        self._valid = self._columnsValid
+
+    def _rebuild(self) -> bool:
+        """
+        Replaces the table with one built from the ini file, copying the rows across.
+        :return: True if the table was rebuilt, False if it would have lost columns.
+        """
+        known = list(self._columns.keys()) + ([self.Tombstone] if self._softDelete else [])
+        current = [r[1] for r in self._client.execute(f'PRAGMA table_info({self.TableName})')]
+        if any([c not in known for c in current]):
+            return False
+        copied = [c for c in known if c in current]
+
+        # the foreign keys can only be switched off outside a transaction, and have to be or dropping the old table
+        # would take the rows referencing it too
+        fks = self._client.execute('PRAGMA foreign_keys').fetchone()[0]
+        self._client.execute('PRAGMA foreign_keys = OFF')
+        try:
+            with self._client:
+                self._client.execute(self.Build_SQL().replace(f'Create Table {self.TableName} (',
+                                                              f'Create Table {self.TableName}_sync (', 1))
+                self._client.execute(f"Insert into {self.TableName}_sync ({', '.join(copied)}) Select "
+                                     f"{', '.join([self._copySQL(c) for c in copied])} "
+                                     f"From {self.TableName}")
+                self._client.execute(f'Drop Table {self.TableName}')
+                self._client.execute(f'Alter Table {self.TableName}_sync Rename To {self.TableName}')
+        finally:
+            if fks:
+                self._client.execute('PRAGMA foreign_keys = ON')
+        return True
+
+    def _copySQL(self, name: str) -> str:
+        # the tombstone is copied as it is
+        return self._columns[name].Build_CopySQL() if name in self._columns.keys() else name
+
+    def _indexesValid(self) -> bool:
+        """
+        Checks all the indexes from the ini file are in the database.
+        """
+        present = [r[1] for r in self._client.execute(f'PRAGMA index_list({self.TableName})')]
+        return all([name in present for name, col in self._indexes()])
+
+    def _fullTextValid(self) -> bool:
+        """
+        Checks the full text index in the database covers the fulltext columns from the ini file (and that there isn't
+        one left behind if they've all been removed).
+        """
+        indexed = [r[1] for r in self._client.execute(f'PRAGMA table_info({self.TableName}_fts)')]
+        return indexed == self._fulltext
 
     # region Hooks
     # These functions are available for inheriting classes to override, to change the behavior across multiple calls
@@ -111,6 +395,10 @@ class Table:
     def _hook_ValidateColumn(self, col: Column, value: typing.Any) -> bool:
         return col.Validate(value)
 
+    def _hook_DefaultColumns(self) -> list:
+        # what GetAll reads, and the other reads when they're not given the columns
+        return list(self._columns.keys())
+
     def _hook_ApplyFilters(self, query: str, params: list) -> (str, list):
         # no filters, no work to do
         if len(self._filters):
@@ -130,20 +418,24 @@ class Table:
 
             # attach the first filter - outside loop because no and is needed
             # query += f'{self._buildWhere(self._filters[0].column, self._filters[0].operator, self._filters[0].value)}'
-            query += f'{self._filters[0].column} {self._filters[0].operator.AsStr()} ?'
-            params.append(self._filters[0].value)
+            query += self._hook_Condition(self._filters[0].column, self._filters[0].operator, self._filters[0].value)
+            params += self._conditionParams(self._filters[0].operator, self._filters[0].value)
 
             # add additional clauses if needed
             if len(self._filters) > 1:
                 for f in self._filters[1:]:
                     # now append the actual clause
                     # query += f' and {self._buildWhere(f.column, f.operator, f.value)}'
-                    query += f' and {f.column} {f.operator.AsStr()} ?'
-                    params.append(f.value)
+                    query += f' and {self._hook_Condition(f.column, f.operator, f.value)}'
+                    params += self._conditionParams(f.operator, f.value)
                 # end for filters
             # end if len > 1
         # end if len
 
+        # and the rows which are hidden whatever the filters
+        for cond in self._hook_Hidden():
+            query += f" {'and' if query.lower().find('where') > 0 else 'Where'} {cond}"
+
         return query, params
 
     def _hook_InLineFilter(self, query: str, params: list, name: str, operator: ComparisonOps, value: typing.Any) -> (str, list):
@@ -156,17 +448,101 @@ class Table:
             raise InvalidOperation(self.TableName, col, operator)
 
         # raises an error if the value is invalid for the column
-        if not self._hook_ValidateColumn(col, value):
-            raise InvalidColumnValue(self.TableName, col.Name, value)
+        value = self._checkFilterValue(col, operator, value)
 
         # add the where clause
-        query += f' Where {name} {operator.AsStr()} ?'
-        params.append(value)
+        query += f' Where {self._hook_Condition(name, operator, value)}'
+        params += self._conditionParams(operator, value)
+        for cond in self._hook_Hidden():
+            query += f' and {cond}'
 
         return query, params
 
+    def _hook_Hidden(self, prefix: str = '') -> list:
+        """
+        Gives the conditions added to every filtered statement for the rows which are kept but treated as gone (the
+        soft deleted rows).
+        :param prefix: Put in front of the column names (ie - 'Person.' in a join).
+        """
+        return [f'{prefix}{self.Tombstone} is null'] if self._softDelete else []
+
+    def _inSlots(self, values: list) -> int:
+        """
+        Works out how many placeholders an IN list is written with, 0 when it's too long and goes in as json.
+        """
+        if len(values) > self.__IN_PLACEHOLDERS:
+            if any(isinstance(v, (bytes, bytearray, memoryview)) for v in values):
+                return -(-len(values) // self.__IN_PLACEHOLDERS) * self.__IN_PLACEHOLDERS
+            return 0
+        # next power of two, the extra slots repeat the last value
+        return 1 << max(len(values) - 1, 0).bit_length()
+
+    def _conditionParams(self, operator: ComparisonOps, value: typing.Any) -> list:
+        """
+        Gives the parameters for a condition from _hook_Condition.
+        """
+        if operator != ComparisonOps.IN:
+            return [value]
+
+        slots = self._inSlots(value)
+        if slots == 0:
+            return [json.dumps(value)]
+        if len(value) == 0:
+            # nothing to pad with, an IN against a lone null matches nothing
+            return [None]
+        return value + [value[-1]] * (slots - len(value))
+
+    def _checkFilterValue(self, col: Column, operator: ComparisonOps, value: typing.Any) -> typing.Any:
+        """
+        Validates the value of a filter against its column, for IN that's every value in the list.
+        :return: The value to store, converted for the column (IN lists are copied into a list).
+        """
+        if operator == ComparisonOps.IN:
+            value = list(value)
+            for v in value:
+                if not self._hook_ValidateColumn(col, v):
+                    raise InvalidColumnValue(self.TableName, col.Name, v)
+            value = [col.ToStorage(v) for v in value]
+            # blobs can't go in as json, each one needs a placeholder of its own
+            slots = self._inSlots(value)
+            if slots > self._client.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER):
+                raise InvalidColumnValue(self.TableName, col.Name, f'{len(value)} blobs')
+            return value
+
+        if not self._hook_ValidateColumn(col, value):
+            raise InvalidColumnValue(self.TableName, col.Name, value)
+        return col.ToStorage(value)
+
+    def _hook_RowFactory(self, columns: list) -> typing.Callable:
+        key = tuple(columns)
+        if key not in self._rowfactories:
+            # namedtuple rows are plain tuples with __slots__ = (), so they cost no more than the raw sqlite rows but
+            # still allow for access by column name (row.fname)
+            rowclass = namedtuple(f"{''.join(ch for ch in self.TableName if ch.isalnum())}Row",
+                                  [c.replace('.', '_') for c in key], rename=True)
+            # dates come back as numbers, anything selecting one has to convert it on the way out
+            converters = []
+            for i, c in enumerate(key):
+                col = self._hook_CheckColumn(c)
+                if col is not None and col.Temporal is not None:
+                    converters.append((i, col.FromStorage))
+
+            if len(converters) == 0:
+                self._rowfactories[key] = lambda cursor, row: rowclass._make(row)
+            else:
+                def factory(cursor, row):
+                    row = list(row)
+                    for i, convert in converters:
+                        row[i] = convert(row[i])
+                    return rowclass._make(row)
+                self._rowfactories[key] = factory
+        return self._rowfactories[key]
+
     def _hook_BuildBaseQuery(self, operation: str, columns: list = []):
         if operation.lower() == 'select':
+            if self._partition is not None:
+                # another connection may have added a partition since the view was made
+                self._refreshParts()
             return f"Select {str.join(', ', columns)} From {self.TableName}"
         elif operation.lower() == 'insert':
             if len(columns) == 1:
@@ -177,6 +553,9 @@ class Table:
                 return f"Insert into {self.TableName}({str.join(',', columns)}) values ({str.join(', ', ['?' for c in columns])})"
         #end if insert
         elif operation.lower() == 'delete':
+            if self._softDelete:
+                # the row stays, marked with when it was deleted
+                return f"Update {self.TableName} set {self.Tombstone} = cast(strftime('%s', 'now') as integer)"
             return f"Delete from {self.TableName}"
         elif operation.lower() == 'update':
             if len(columns) == 1:
@@ -188,11 +567,40 @@ class Table:
         else:
             raise Exception() #TODO replace with custom error for invalid db operation
 
+    def _hook_Condition(self, name: str, operator: ComparisonOps, value: typing.Any) -> str:
+        """
+        Gives the where condition for a filter on a column, with placeholders for the parameters from _conditionParams.
+        :param name: The name of the column, as used in the query.
+        :param operator: The comparison.
+        :param value: The value being compared to, only its shape (the length of an IN list) matters.
+        """
+        if operator == ComparisonOps.MATCH:
+            # the text lives in the full text index, find the rows through it
+            table, col = name.split('.') if '.' in name else (self.TableName, name)
+            return f'{table}.rowid in (Select rowid From {table}_fts Where {col} Match ?)'
+        if operator == ComparisonOps.IN:
+            slots = self._inSlots(value)
+            if slots == 0:
+                return f'{name} in (Select value From json_each(?))'
+            return f"{name} in ({', '.join(['?'] * slots)})"
+        return f'{name} {operator.AsStr()} ?'
+
+    def _hook_ChangeKey(self, row: str) -> str:
+        """
+        Gives the expression used in the change log triggers for the key of the changed row.
+        :param row: NEW or OLD.
+        """
+        if len(self._pks) == 1:
+            return f"{row}.{self._pks[0]}"
+        if self._withoutRowid:
+            return f"json_array({', '.join([f'{row}.{k}' for k in self._pks])})"
+        return f"{row}.rowid"
+
     #endregion
 
     #region DB Interactions
 
-    def Join(self, other, otherCol: str, myCol: str):
+    def Join(self, other, otherCol: str = None, myCol: str = None, mode: JoinModes = JoinModes.LEFT):
         """
         Creates a psuedo-table by performing a left join on the table other.
         This will only join on equals between two columns.
@@ -200,24 +608,33 @@ class Table:
         :param other: The table to join with.
         :param otherCol: The name of the column from the other table to join with.
         :param myCol: The name of the column from within this table to match to otherCol.
-        :return:
+        :param mode: Inner or left join.
+        :return: The joined table, more tables can be added with its Join.  If the columns aren't given they are found
+                 from the reference columns in the ini file.
         """
-        pass
+        # JoinedTable is built on Table, so it can't be imported up top
+        from JoinedTable import JoinedTable
+        return JoinedTable(self, other, myCol, otherCol, mode)
 
     def GetAll(self) -> list:
         """
         Performs a get for all the columns in the table.  Any filters set still apply to the results.
         :return: The results.
         """
-        return self.Get(list(self._columns.keys()))
+        return self.Get(self._hook_DefaultColumns())
 
-    def Get(self, columns: list) -> list:
+    def Get(self, columns: list, include: list = None) -> typing.Union[list, tuple]:
         """
         Retrieves all values of a set of columns.  If the where clause is specified then only the matching values are
         returned.
 
         :param columns: A list of the column names to select.
-        :return:
+        :param include: Relations (see Relate) to load the rows of along with the results - the reference column here
+                        for the row it points at, <table>.<reference column> for the rows pointing here, or just the
+                        table name when there's only one relationship with it.  Each one is read with a single query,
+                        no matter how many rows matched here.
+        :return: The rows, each a named tuple with the selected columns available by index or by name.  When include is
+                 given it's a tuple of the rows and a dict of include name -> {key value: [related rows]}.
         """
 
         params = []  # this will be the second arg with the order parameters into the query
@@ -225,7 +642,7 @@ class Table:
         # sanity check the columns
         for c in columns:
             if self._hook_CheckColumn(c) is None:
-                raise ImaginaryColumn(self.TableName, c.Name)
+                raise ImaginaryColumn(self.TableName, c)
         # end for c
 
         # initialize the select statement
@@ -234,50 +651,638 @@ class Table:
         # get all the filters into where clauses
         query, params = self._hook_ApplyFilters(query, params)
 
-        # execute the query
-        cur = self._client.execute(query, params)
+        # execute the query, rows are built directly into the named row class for these columns
+        cur = self._client.cursor()
+        cur.row_factory = self._hook_RowFactory(columns)
+        cur.execute(query, params)
 
         # marshall the results and return the rows
-        return cur.fetchall()
+        if include is None:
+            return cur.fetchall()
+        return cur.fetchall(), {name: self._loadRelated(name) for name in include}
+
+    def Search(self, text: str, columns: list = None, limit: int = None) -> list:
+        """
+        Finds the rows whose fulltext columns match a full text query, best matches first (by bm25).  Any filters set
+        still apply to the results.
+        :param text: The fts5 query (ie - 'sqlite AND (fast OR small)', 'notes: "exact phrase"', 'pref*').
+        :param columns: A list of the column names to select, all of them if not given.
+        :param limit: The most rows to return, all the matches if not given.
+        :return: The rows, each a named tuple with the selected columns.
+        """
+        if len(self._fulltext) == 0:
+            raise ValueError(f"{self.TableName} has no fulltext columns to search.")
+
+        columns = list(self._columns.keys()) if columns is None else columns
+        for c in columns:
+            if self._hook_CheckColumn(c) is None:
+                raise ImaginaryColumn(self.TableName, c)
+
+        # the ranking comes from the index, join it in as a subquery so its columns can't clash with the table's
+        query = f"{self._hook_BuildBaseQuery('select', columns)} Join (Select rowid As _ftsrow, " \
+                f"bm25({self.TableName}_fts) As _ftsrank From {self.TableName}_fts(?)) On _ftsrow = " \
+                f"{self.TableName}.rowid"
+        query, params = self._hook_ApplyFilters(query, [text])
+        query += ' Order By _ftsrank'
+        if limit is not None:
+            query += ' Limit ?'
+            params.append(limit)
+
+        cur = self._client.cursor()
+        cur.row_factory = self._hook_RowFactory(columns)
+        return cur.execute(query, params).fetchall()
+
+    def Explain(self, columns: list = None) -> list:
+        """
+        Shows how sqlite would run the Get for a set of columns with the current filters, to see whether it's using an
+        index or scanning the table.
+        :param columns: A list of the column names to select, all of them if not given.
+        :return: The steps of the query plan, one line each, indented two spaces for each level of nesting.
+        """
+        columns, query, params = self._select(columns)
+        return Trace.Plan(self._client, query, params)
+
+    def _loadRelated(self, name: str) -> dict:
+        """
+        Reads the rows of a related table for everything matching the current filters, in one query.
+        :param name: The name of the relation, or of the related table if there's only one relation with it.
+        :return: The related rows grouped by the value of the column they're related on.
+        """
+        if name not in self._relations.keys():
+            # a bare table name works as long as it only picks out one of the relations
+            matches = [r for r in self._relations.values() if r[0].TableName == name]
+            if len(matches) == 0:
+                raise ValueError(f"{self.TableName} has no relationship with {name}.")
+            if len(matches) > 1:
+                names = ', '.join(k for k, r in self._relations.items() if r[0].TableName == name)
+                raise ValueError(f"{self.TableName} has more than one relationship with {name}, use one of {names}.")
+            other, mine, theirs = matches[0]
+        else:
+            other, mine, theirs = self._relations[name]
+
+        # the keys come from the same filtered select as the main query, so sqlite does the IN in one pass
+        keys, params = self._hook_ApplyFilters(self._hook_BuildBaseQuery('select', [mine]), [])
+        cols = list(other._columns.keys())
+        query = f"{other._hook_BuildBaseQuery('select', cols)} Where {theirs} in ({keys})"
+        query += ''.join([f' and {cond}' for cond in other._hook_Hidden()])
+
+        cur = self._client.cursor()
+        cur.row_factory = other._hook_RowFactory(cols)
+
+        grouped = {}
+        keyndx = cols.index(theirs)
+        for row in cur.execute(query, params):
+            grouped.setdefault(row[keyndx], []).append(row)
+        return grouped
+
+    def Relate(self, other, mine: str, theirs: str):
+        """
+        Records a relationship to another table, allowing its rows to be loaded with include on Get.  It's named for
+        the reference column, so two references to the same table (or a table referencing itself) don't collide: the
+        column here when it references the other table, otherwise <other table>.<column there>.
+        :param other: The related table.
+        :param mine: The column in this table holding the shared value.
+        :param theirs: The column in the other table holding the shared value.
+        """
+        if mine not in self._columns.keys():
+            raise ImaginaryColumn(self.TableName, mine)
+        if theirs not in other._columns.keys():
+            raise ImaginaryColumn(other.TableName, theirs)
+
+        col = self._columns[mine]
+        if col.IsForeignKey and col.ForeignKey == f'{other.TableName}.{theirs}':
+            self._relations[mine] = (other, mine, theirs)
+        else:
+            self._relations[f'{other.TableName}.{theirs}'] = (other, mine, theirs)
+
+    def ParallelGet(self, columns: list, workers: int = None) -> list:
+        """
+        Same as Get, but the table is split into rowid ranges which are read by a pool of worker processes, each with
+        its own read-only connection.  Tables estimated (from sqlite_stat1, or the rowid span without it) to be under
+        the parallel_min_rows setting are just read with Get.
+
+        :param columns: A list of the column names to select.
+        :param workers: The number of processes to use, defaults to the parallel_workers setting or the cpu count.
+        :return: The rows, in the same order Get would return them.
+        """
+        for c in columns:
+            if self._hook_CheckColumn(c) is None:
+                raise ImaginaryColumn(self.TableName, c)
+
+        plan = self._parallelPlan(workers)
+        if plan is None:
+            return self.Get(columns)
+        uri, ranges, workers = plan
+
+        query, params = self._hook_ApplyFilters(
+            f"{self._hook_BuildBaseQuery('select', columns)} Where rowid >= ? and rowid < ?", [])
+        parts = Parallel.Run(Parallel.ScanRange, uri, query, params, ranges, workers)
+
+        # the ranges come back in rowid order, so joining them up keeps the serial ordering
+        factory = self._hook_RowFactory(columns)
+        return [factory(None, row) for part in parts for row in part]
+
+    def ParallelAggregate(self, op: str, column: str, workers: int = None) -> typing.Any:
+        """
+        Works out an aggregate over a column for the rows matching the current filters, with each worker process
+        handling a rowid range and the partial results merged at the end.  Small tables are done in one query here.
+
+        :param op: count, sum, min, max or avg.
+        :param column: The name of the column to aggregate.
+        :param workers: The number of processes to use, defaults to the parallel_workers setting or the cpu count.
+        :return: The value of the aggregate, None if no rows matched (except for count).
+        """
+        if op.lower() not in ['count', 'sum', 'min', 'max', 'avg']:
+            raise ValueError(f"{op} is not an aggregate ParallelAggregate can merge.")
+        if self._hook_CheckColumn(column) is None:
+            raise ImaginaryColumn(self.TableName, column)
+
+        # every range reports everything needed to merge any of the aggregates
+        partials = [f'{agg}({column})' for agg in ['count', 'sum', 'min', 'max']]
+
+        plan = self._parallelPlan(workers)
+        if plan is None:
+            query, params = self._hook_ApplyFilters(self._hook_BuildBaseQuery('select', partials), [])
+            parts = [self._client.execute(query, params).fetchone()]
+        else:
+            query, params = self._hook_ApplyFilters(
+                f"{self._hook_BuildBaseQuery('select', partials)} Where rowid >= ? and rowid < ?", [])
+            uri, ranges, workers = plan
+            parts = Parallel.Run(Parallel.AggregateRange, uri, query, params, ranges, workers)
+
+        return Parallel.MergeAggregates(op.lower(), parts)
+
+    def _parallelPlan(self, workers: typing.Union[int, None]) -> typing.Union[tuple, None]:
+        """
+        Decides if a read is worth spreading over processes.
+        :return: None to read serially, otherwise the read-only uri, the rowid ranges, and the number of workers.
+        """
+        path = self._client.execute('PRAGMA database_list').fetchone()[2]
+        if path == '' or self._withoutRowid or self._partition is not None:
+            # in memory the workers would have nothing to open, and without a rowid (or with one per partition)
+            # there's nothing to split on
+            return None
+
+        lo, hi = self._client.execute(f'Select min(rowid), max(rowid) From {self.TableName}').fetchone()
+        if lo is None:
+            return None
+
+        # ANALYZE leaves the row count as the first number in the stats, fall back to the rowid span without it
+        estimate = hi - lo + 1
+        try:
+            stat = self._client.execute('Select stat From sqlite_stat1 Where tbl = ? and idx is null',
+                                        [self.TableName]).fetchone()
+            if stat is None:
+                stat = self._client.execute('Select stat From sqlite_stat1 Where tbl = ?', [self.TableName]).fetchone()
+            if stat is not None:
+                estimate = int(stat[0].split(' ')[0])
+        except sqlite3.OperationalError:
+            # no sqlite_stat1 until ANALYZE has been run on the file
+            pass
+
+        if estimate < self._options.getint('parallel_min_rows', 100000):
+            return None
+
+        if workers is None:
+            workers = self._options.getint('parallel_workers', os.cpu_count())
+        # a few ranges per worker keeps them all busy when the rows aren't spread evenly
+        return f'file:{urllib.parse.quote(path)}?mode=ro', Parallel.Ranges(lo, hi, workers * 4), workers
 
     def Add(self, values):
         """
-        Adds a new entry to the table.
+        Adds a new entry to the table.  On a buffered table the row is validated and queued, and committed with the
+        rest of its batch.
         :param values: A map of the column names and values.  Any missing values will be filled in with the default value (except primary keys).
         """
 
-        cols = list(self._columns.keys()) # these will be the ones which get default values
+        # let sqlite handle filling in the primary keys, everything else is written every time - without a rowid there's
+        # nothing for sqlite to fill them in from, so they're written too
+        cols = [c for c in self._columns.keys() if c not in self._pks or self._withoutRowid]
         vals = {}
 
         # grab the values from the parameter
         for k in values.keys():
-            if self._hook_CheckColumn(k) is None:
-                # TODO add logging
-                continue
+            col = self._hook_CheckColumn(k)
+            if col is None:
+                raise ImaginaryColumn(self.TableName, k)
 
-            # remove the column as needing a default
-            cols.remove(k)
             # do not add in primary keys
-            if k not in self._pks:
-                vals[k] = values[k]
+            if k in self._pks and not self._withoutRowid:
+                continue
+
+            if not self._hook_ValidateColumn(col, values[k]):
+                raise InvalidColumnValue(self.TableName, k, values[k])
+            vals[k] = col.ToStorage(values[k])
+
+        # fill in any missing values with the defaults, always in column order so every add is the same statement
+        params = [vals[c] if c in vals.keys() else self._columns[c].Default for c in cols]
+        if self._partition is not None:
+            if self._shards is not None and self._seq is not None:
+                # the shard can depend on the key, so it's taken from the counter before the row is written
+                cols = [self._pks[0]] + cols
+                params = [self._nextKeys(1)] + params
+            part = self._partName(params[cols.index(self._partition[0])])
+            self._ensurePart(part)
+            insert = self._partInsert(part, cols)
+        else:
+            insert = self._hook_BuildBaseQuery('insert', cols)
+
+        # perform the action
+        if self._options.getboolean('buffered', False):
+            self._bufferRow(insert, params)
+        else:
+            self._write(insert, params)
+
+    def Load(self, rows: typing.Iterable, trusted: bool = False) -> int:
+        """
+        Adds many rows at once with a single statement, in a single transaction, so either every row goes in or none
+        do.  Each row is a map of the column names and values, and every row has to have the columns of the first.
+        Unlike Add, the primary keys are written when given.
+
+        A trusted load is for rows from our own pipelines which are known to be good.  The columns are checked once
+        against the first row and the values go straight in, only the dates are converted.  For the length of the load
+        the indexes are dropped (and rebuilt after), foreign keys aren't checked, and the journal is kept in memory
+        without syncing, so a crash part way through can damage the file.  The settings are put back and the table
+        analyzed once it's done.  On a partitioned table the rows are sorted into their partitions, and trusted only
+        skips the checks.  On a sharded table each shard's rows are written on a connection of its own, all at once,
+        so each shard commits (or fails) on its own.
+        :param rows: An iterable of maps of the column names and values.
+        :param trusted: Skip the per value checks and load with the file's safety settings off.
+        :return: The number of rows loaded.
+        """
+        if self._readonly:
+            raise ReadOnlyTable(self.TableName)
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+
+        cols = []
+        for k in first.keys():
+            col = self._hook_CheckColumn(k)
+            if col is None:
+                raise ImaginaryColumn(self.TableName, k)
+            cols.append(col)
+        insert = self._hook_BuildBaseQuery('insert', [c.Name for c in cols])
+        rows = itertools.chain([first], rows)
+        params = self._trustedParams(cols, rows) if trusted else self._checkedParams(cols, rows)
+
+        # anything still buffered was added first
+        self.Flush()
+
+        if self._partition is not None:
+            count = self._loadParts([c.Name for c in cols], params)
+            self.Writes += count
+            return count
+
+        if self._writer is not None:
+            if trusted:
+                raise ValueError(f"{self.TableName}: a trusted load changes the connection's settings, it can't be "
+                                 f"sent to the writer.")
+            params = list(params)
+            self._writer.Write(insert, params, True)
+            self.Writes += len(params)
+            return len(params)
+
+        if not trusted:
+            with self._client:
+                count = self._client.executemany(insert, params).rowcount
+            self.Writes += count
+            return count
+
+        # the pragmas are ignored inside a transaction, so these all have to be set around it
+        fks = self._client.execute('PRAGMA foreign_keys').fetchone()[0]
+        sync = self._client.execute('PRAGMA synchronous').fetchone()[0]
+        journal = self._client.execute('PRAGMA journal_mode').fetchone()[0]
+        self._client.execute('PRAGMA foreign_keys = OFF')
+        self._client.execute('PRAGMA synchronous = OFF')
+        if journal != 'wal':
+            # leaving wal needs every other connection closed, and wal doesn't sync on each commit anyway
+            self._client.execute('PRAGMA journal_mode = MEMORY')
+        try:
+            # building the indexes once at the end is much cheaper than keeping them up to date row by row, and
+            # if the load fails the rollback puts them back - begun by hand, as sqlite3 only opens a transaction on
+            # its own for the insert
+            with self._client:
+                self._client.execute('Begin Immediate')
+                for name, c in self._indexes():
+                    self._client.execute(f'Drop Index If Exists {name}')
+                count = self._client.executemany(insert, params).rowcount
+                for idx in self.Build_IndexSQL():
+                    self._client.execute(idx)
+        finally:
+            if journal != 'wal':
+                self._client.execute(f'PRAGMA journal_mode = {journal}')
+            self._client.execute(f'PRAGMA synchronous = {sync}')
+            if fks:
+                self._client.execute('PRAGMA foreign_keys = ON')
+
+        self._client.execute(f'Analyze {self.TableName}')
+        self._client.commit()
+        self.Writes += count
+        return count
 
-        # fill in any missing values with the defaults
-        for c in cols:
-            # let sqlite handle filling in the primary keys
-            if c not in self._pks:
-                vals[c] = self._columns[c].Default
+    def _loadParts(self, names: list, params: typing.Iterable) -> int:
+        """
+        Loads rows into a partitioned table, each partition's rows with their own statement in the one transaction.
+        """
+        if self._shards is not None and self._seq is not None:
+            params = [list(row) for row in params]
+            key = self._pks[0]
+            if key in names:
+                # keep the counter ahead of the keys given
+                top = max([row[names.index(key)] for row in params], default=None)
+                if top is not None:
+                    self._client.execute(f'Update {self._seq} Set next = max(next, ?)', [top + 1])
+            else:
+                first = self._nextKeys(len(params))
+                names = [key] + names
+                params = [[first + i] + row for i, row in enumerate(params)]
+
+        if self._partition[0] not in names:
+            raise InvalidColumnValue(self.TableName, self._partition[0], None)
+        ndx = names.index(self._partition[0])
+
+        parts = {}
+        for row in params:
+            parts.setdefault(self._partName(row[ndx]), []).append(row)
+        for part in parts.keys():
+            self._ensurePart(part)
+
+        # the shards are separate files with their own locks, so they can all be written at once - except for the
+        # change log, whose triggers are only on this connection
+        if self._shards is not None and len(parts) > 1 and self._changeLog is None and \
+                ':memory:' not in [file for schema, file in self._shards]:
+            self._client.commit()
+            return self._loadShards(names, parts)
 
-        # do we need another hook right here to order the dictionary?
-        # for JoinedTable there is a need to get the left_col adn right_col values aligned in the query
+        if self._writer is not None:
+            for part, rows in parts.items():
+                self._writer.Write(self._partInsert(part, names), rows, True)
+        else:
+            with self._client:
+                for part, rows in parts.items():
+                    self._client.executemany(self._partInsert(part, names), rows)
+        return sum([len(rows) for rows in parts.values()])
 
-        # with all the
-        insert = self._hook_BuildBaseQuery('insert', vals.keys())
-        params = list(vals.values())  # this will be the second arg with the order parameters into the query
+    def _loadShards(self, names: list, parts: dict) -> int:
+        """
+        Writes each shard's rows on its own connection, on its own thread.
+        :param names: The columns being written.
+        :param parts: The rows for each shard, by the shard's table.
+        :return: The number of rows written.
+        """
+        files = dict(self._shards)
+        insert = self._partInsert(self.TableName, names)
+
+        def load(part: str, rows: list) -> int:
+            conn = sqlite3.connect(files[part.split('.')[0]])
+            try:
+                with conn:
+                    conn.executemany(insert, rows)
+            finally:
+                conn.close()
+            return len(rows)
+
+        with concurrent.futures.ThreadPoolExecutor(len(parts)) as pool:
+            return sum(pool.map(load, parts.keys(), parts.values()))
+
+    def _nextKeys(self, count: int) -> int:
+        """
+        Takes a block of keys from the counter, in the transaction the rows are written in.
+        :return: The first key of the block.
+        """
+        return self._client.execute(f'Update {self._seq} Set next = next + ? Returning next - ?',
+                                    [count, count]).fetchall()[0][0]
+
+    def _checkedParams(self, cols: list, rows: typing.Iterable) -> typing.Iterator:
+        """
+        Validates and converts the rows for Load one value at a time, the same as Add would.
+        """
+        for row in rows:
+            vals = []
+            for col in cols:
+                value = row[col.Name]
+                if not self._hook_ValidateColumn(col, value):
+                    raise InvalidColumnValue(self.TableName, col.Name, value)
+                vals.append(col.ToStorage(value))
+            yield vals
+
+    def _trustedParams(self, cols: list, rows: typing.Iterable) -> typing.Iterator:
+        """
+        Pulls the values for a trusted Load out of the rows, converting the dates and nothing else.
+        """
+        names = [c.Name for c in cols]
+        # itemgetter hands back a bare value for a single name
+        get = operator.itemgetter(*names) if len(names) > 1 else lambda r: (r[names[0]],)
+
+        temporal = [(i, c) for i, c in enumerate(cols) if c.Temporal]
+        if len(temporal) == 0:
+            return map(get, rows)
+
+        def convert(row):
+            vals = list(get(row))
+            for i, c in temporal:
+                vals[i] = c.ToStorage(vals[i])
+            return vals
+        return map(convert, rows)
+
+    def ExportCSV(self, dest: typing.Any, columns: list = None, chunk_size: int = 10000) -> TransferStats:
+        """
+        Writes the rows matching the current filters to a CSV file, with a header row of the column names.  The rows
+        are read and written a chunk at a time, so the table is never held in memory.  Dates are written as iso 8601
+        and blobs as hex.
+        :param dest: A file path, gzipped when it ends in .gz, or an open stream.
+        :param columns: A list of the column names to write, all of them if not given.
+        :param chunk_size: The number of rows fetched at a time.
+        :return: The number of rows written and how long it took.
+        """
+        return self._export(Transfer.WriteCSV, dest, columns, chunk_size)
+
+    def ExportJSONL(self, dest: typing.Any, columns: list = None, chunk_size: int = 10000) -> TransferStats:
+        """
+        Writes the rows matching the current filters to a JSON lines file, each row an object of the column names and
+        values.  See ExportCSV for the parameters.
+        """
+        return self._export(Transfer.WriteJSONL, dest, columns, chunk_size)
+
+    def ImportCSV(self, source: typing.Any, chunk_size: int = 10000) -> TransferStats:
+        """
+        Adds the rows from a CSV file with a header row of the column names.  The file is read lazily and the values
+        converted to each column's type, then added with Load a chunk at a time, each chunk in its own transaction - if
+        a row is bad the chunks before it are already in.
+        :param source: A file path, gzipped when it ends in .gz, or an open stream.
+        :param chunk_size: The number of rows added in each transaction.
+        :return: The number of rows added and how long it took.
+        """
+        return self._import(Transfer.ReadCSV, source, chunk_size)
+
+    def ImportJSONL(self, source: typing.Any, chunk_size: int = 10000) -> TransferStats:
+        """
+        Adds the rows from a JSON lines file of objects of the column names and values.  See ImportCSV for the
+        parameters.
+        """
+        return self._import(Transfer.ReadJSONL, source, chunk_size)
+
+    def ToArrow(self, columns: list = None, filters: list = None, chunk_size: int = 65536) -> 'pyarrow.Table':
+        """
+        Reads the rows matching the current filters into a pyarrow Table, built a record batch at a time straight from
+        the cursor so there's never a python object per value.  Needs pyarrow installed.
+        :param columns: A list of the column names to read, all of them if not given.
+        :param filters: (name, operator, value) tuples applied along with the table's filters, only for this read.
+        :param chunk_size: The number of rows in each record batch.
+        :return: The table, with the arrow types mapped from the columns (see Arrow.FieldType).
+        """
+        Arrow.Require()
+        schema, cols, cur = self._arrowScan(columns, filters)
+        batches = [Arrow.Batch(schema, cols, rows) for rows in self._fetchChunks(cur, chunk_size)]
+        return Arrow.pa.Table.from_batches(batches, schema)
+
+    def ExportParquet(self, dest: typing.Any, columns: list = None, filters: list = None, chunk_size: int = 65536,
+                      compression: str = 'zstd') -> TransferStats:
+        """
+        Writes the rows matching the current filters to a parquet file, one row group per chunk, so the table is never
+        held in memory.  Needs pyarrow installed.  See ToArrow for the columns, filters and chunk_size.
+        :param dest: A file path or an open binary stream.
+        :param compression: The parquet compression codec (ie - zstd, snappy, gzip, none).
+        :return: The number of rows written and how long it took.
+        """
+        Arrow.Require()
+        start = time.monotonic()
+        schema, cols, cur = self._arrowScan(columns, filters)
+
+        count = 0
+        writer = Arrow.ParquetWriter(dest, schema, compression)
+        try:
+            for rows in self._fetchChunks(cur, chunk_size):
+                writer.write_batch(Arrow.Batch(schema, cols, rows))
+                count += len(rows)
+        finally:
+            writer.close()
+        return TransferStats(count, time.monotonic() - start)
+
+    def FromArrow(self, data: typing.Any, trusted: bool = False) -> TransferStats:
+        """
+        Adds the rows of a pyarrow Table or RecordBatch whose column names match the table's, with Load in a single
+        transaction.  Needs pyarrow installed.
+        :param data: The arrow table, or record batch.
+        :param trusted: Load trusted, see Load.
+        :return: The number of rows added and how long it took.
+        """
+        Arrow.Require()
+        start = time.monotonic()
+        count = self.Load(Arrow.Rows(data), trusted)
+        return TransferStats(count, time.monotonic() - start)
+
+    def _select(self, columns: typing.Union[list, None], filters: list = None) -> (list, str, list):
+        """
+        Builds the select for the export and interchange reads.
+        :param columns: The column names, all of them if None.
+        :param filters: (name, operator, value) tuples to apply along with the table's filters.
+        :return: The column names, the query and its parameters.
+        """
+        columns = self._hook_DefaultColumns() if columns is None else columns
+        for c in columns:
+            if self._hook_CheckColumn(c) is None:
+                raise ImaginaryColumn(self.TableName, c)
+
+        # the extra filters go through Filter for the checks, then the table's own are put back
+        saved = self._filters
+        self._filters = list(saved)
+        try:
+            for name, op, value in filters if filters is not None else []:
+                self.Filter(name, op, value)
+            query, params = self._hook_ApplyFilters(self._hook_BuildBaseQuery('select', columns), [])
+        finally:
+            self._filters = saved
+        return columns, query, params
+
+    def _arrowScan(self, columns: typing.Union[list, None], filters: typing.Union[list, None]) -> tuple:
+        """
+        Starts the read for ToArrow and ExportParquet, the values are left as stored for Arrow to convert.
+        :return: The arrow schema, the Column for each selected column, and the executed cursor.
+        """
+        columns, query, params = self._select(columns, filters)
+        cols = [self._hook_CheckColumn(c) for c in columns]
 
-        # perform the action
         cur = self._client.cursor()
-        cur.execute(insert, params)
-        self._client.commit()
+        cur.row_factory = None
+        cur.execute(query, params)
+        return Arrow.Schema(columns, cols), cols, cur
+
+    @staticmethod
+    def _fetchChunks(cur: sqlite3.Cursor, chunk_size: int) -> typing.Iterator[list]:
+        rows = cur.fetchmany(chunk_size)
+        while len(rows) > 0:
+            yield rows
+            rows = cur.fetchmany(chunk_size)
+
+    def _export(self, write: typing.Callable, dest: typing.Any, columns: typing.Union[list, None],
+                chunk_size: int) -> TransferStats:
+        start = time.monotonic()
+
+        columns, query, params = self._select(columns)
+        cur = self._client.cursor()
+        cur.row_factory = self._hook_RowFactory(columns)
+        cur.execute(query, params)
+
+        with Transfer.Open(dest, True) as stream:
+            count = write(stream, columns, self._fetchChunks(cur, chunk_size))
+        return TransferStats(count, time.monotonic() - start)
+
+    def _import(self, read: typing.Callable, source: typing.Any, chunk_size: int) -> TransferStats:
+        start = time.monotonic()
+
+        def parse(row: dict) -> dict:
+            vals = {}
+            for k, v in row.items():
+                col = self._hook_CheckColumn(k)
+                if col is None:
+                    raise ImaginaryColumn(self.TableName, k)
+                vals[k] = Transfer.Parse(col, v)
+            return vals
+
+        count = 0
+        with Transfer.Open(source, False) as stream:
+            for chunk in Transfer.Chunks(map(parse, read(stream)), chunk_size):
+                count += self.Load(chunk)
+        return TransferStats(count, time.monotonic() - start)
+
+    def _bufferRow(self, insert: str, params: list):
+        """
+        Hands a row to the table's buffer, starting the buffer on first use.
+        """
+        if self._readonly:
+            raise ReadOnlyTable(self.TableName)
+
+        if self._buffer is None:
+            self._buffer = RowBuffer(self._path, insert, self._writer, self._options.getint('buffer_rows', 1000),
+                                     self._options.getfloat('buffer_ms', 50.0) / 1000,
+                                     self._options.getint('buffer_size', 100000), self._autocheckpoint)
+            atexit.register(self._buffer.Close)
+        # end if no buffer
+
+        # commit durability waits for the row to be in the file, enqueue returns as soon as it's buffered
+        self.Writes += 1
+        self._buffer.Add(params, self._options.get('durability', 'commit').lower() == 'commit')
+
+    def Flush(self):
+        """
+        Commits any rows waiting in the table's buffer, returning once they're written.  A no-op for tables which
+        aren't buffered.
+        """
+        if self._buffer is not None:
+            self._buffer.Flush()
+
+    def Close(self):
+        """
+        Flushes and stops the table's buffer, if it has one.
+        """
+        if self._buffer is not None:
+            atexit.unregister(self._buffer.Close)
+            self._buffer.Close()
+            self._buffer = None
 
     def UpdateValue(self, name: str, value: typing.Any, compname: str = '', operator: ComparisonOps = ComparisonOps.Noop
                     , compval: typing.Any = None):
@@ -293,8 +1298,6 @@ class Table:
         """
         # TODO make the where clause a list of tuples or actual where objects?
 
-        params = [value]  # this will be the second arg with the order parameters into the query
-
         # verify the column
         col = self._hook_CheckColumn(name)
         if col is None:
@@ -304,6 +1307,12 @@ class Table:
         if not self._hook_ValidateColumn(col, value):
             raise InvalidColumnValue(self.TableName, col.Name, value)
 
+        # the rows would be left in the partition for their old value
+        if self._partition is not None and name == self._partition[0]:
+            raise ValueError(f"{self.TableName}: {name} is what the rows are partitioned on, it can't be updated.")
+
+        params = [col.ToStorage(value)]  # this will be the second arg with the order parameters into the query
+
         # create the base update statement
         # make sure to wrap text values in ""
         update = self._hook_BuildBaseQuery('update', [name])
@@ -317,9 +1326,7 @@ class Table:
             update, params = self._hook_ApplyFilters(update, params)
 
         # perform the action
-        cur = self._client.cursor()
-        cur.execute(update, params)
-        self._client.commit()
+        self._write(update, params)
 
     def Delete(self, name: str = None, operator: ComparisonOps = ComparisonOps.Noop, value: typing.Any = None):
         """
@@ -354,12 +1361,192 @@ class Table:
             delete, params = self._hook_ApplyFilters(delete, params)
 
         # perform the action
-        cur = self._client.cursor()
-        try:
-            cur.execute(delete, params)
-            self._client.commit()
-        except sqlite3.OperationalError:
-            print(delete)
+        self._write(delete, params)
+
+    def Purge(self, before: typing.Union[datetime.datetime, int] = None):
+        """
+        Removes soft deleted rows for good.
+        :param before: Only the rows deleted before this (a datetime, or seconds since the epoch), all of them if not
+                       given.
+        """
+        if not self._softDelete:
+            raise ValueError(f"{self.TableName} doesn't soft delete, there's nothing to purge.")
+
+        delete = f'Delete from {self.TableName} Where {self.Tombstone} is not null'
+        params = []
+        if before is not None:
+            # naive datetimes are utc, the same as the date columns
+            if isinstance(before, datetime.datetime):
+                before = calendar.timegm(before.utctimetuple())
+            delete += f' and {self.Tombstone} < ?'
+            params.append(before)
+        self._write(delete, params)
+
+    @property
+    def Partitions(self) -> list:
+        """
+        The names of the tables a partitioned table's rows are kept in, oldest first (or by shard, as schema.table, for
+        a sharded table).  Empty for any other table.
+        """
+        if self._partition is None:
+            return []
+        self._refreshParts()
+        return list(self._parts)
+
+    def DropPartitions(self, before: datetime.date) -> list:
+        """
+        Drops the partitions only holding rows from before a date, each one a single drop rather than a delete of
+        every row in it.
+        :param before: Partitions whose period ends on or before this date are dropped.
+        :return: The names of the partitions dropped.
+        """
+        if self._partition is None or self._shards is not None:
+            raise ValueError(f"{self.TableName} isn't partitioned by date.")
+        if isinstance(before, datetime.datetime):
+            before = before.date()
+
+        dropped = []
+        for part in self.Partitions:
+            start = datetime.datetime.strptime(part[len(self.TableName) + 1:], self.__PERIODS[self._partition[1]])
+            match self._partition[1]:
+                case 'year':
+                    end = datetime.date(start.year + 1, 1, 1)
+                case 'month':
+                    end = datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1)
+                case _:
+                    end = start.date() + datetime.timedelta(days=1)
+
+            if end <= before:
+                self._write(f'Drop Table {part}')
+                dropped.append(part)
+
+        self._refreshParts(True)
+        return dropped
+
+    def _partName(self, value: typing.Any) -> str:
+        """
+        Names the partition a row belongs in, from its value (as stored) of the partition column.
+        """
+        col, period = self._partition
+        if self._shards is not None:
+            # integers are spread round robin, anything else by its crc
+            spread = value if isinstance(value, int) else zlib.crc32(str(value).encode())
+            return f'{self._shards[spread % len(self._shards)][0]}.{self.TableName}'
+
+        when = self._columns[col].FromStorage(value)
+        if not isinstance(when, datetime.date):
+            raise InvalidColumnValue(self.TableName, col, when)
+        return f'{self.TableName}_{when.strftime(self.__PERIODS[period])}'
+
+    def _ensurePart(self, part: str):
+        """
+        Makes a partition, along with its indexes and triggers, if it isn't there yet.
+        :param part: The name of the partition, from _partName.
+        """
+        self._refreshParts()
+        if part in self._parts:
+            return
+        if self._readonly:
+            raise ReadOnlyTable(self.TableName)
+
+        statements = self._partSQL(part)
+        if self._writer is not None:
+            for sql in statements:
+                self._writer.Write(sql)
+        else:
+            with self._client:
+                for sql in statements:
+                    self._client.execute(sql)
+
+        self._refreshParts(True)
+
+    def _partSQL(self, part: str) -> list:
+        """
+        Creates the SQL statements for a partition (or shard) and its indexes and triggers.
+        """
+        statements = [self.Build_SQL().replace(f'Create Table {self.TableName} (',
+                                               f'Create Table If Not Exists {part} (', 1)]
+        statements += self.Build_IndexSQL(part)
+        if self._seq is not None and self._shards is None:
+            key = self._pks[0]
+            statements.append(f'Create Trigger If Not Exists {part}_seq After Insert On {part} Begin '
+                              f'Update {self._seq} Set next = max(next, new.{key} + 1); End;')
+        if self._changeLog is not None:
+            statements += self.Build_ChangeSQL(self._changeLog, part)
+        return statements
+
+    def _partInsert(self, part: str, cols: list) -> str:
+        """
+        Gives the insert for rows going into a partition.  Keys which sqlite would fill in are taken from the counter.
+        """
+        if self._seq is not None and self._pks[0] not in cols:
+            return f"Insert into {part}({self._pks[0]}, {', '.join(cols)}) values ((Select next From {self._seq}), " \
+                   f"{', '.join(['?'] * len(cols))})"
+        return f"Insert into {part}({', '.join(cols)}) values ({', '.join(['?'] * len(cols))})"
+
+    def _refreshParts(self, force: bool = False):
+        """
+        Keeps the list of partitions, and the temporary view over them the reads go through, in step with the file.
+        The view only exists on this connection, so it's rebuilt whenever the schema changes (ie - another connection
+        made a partition).
+        :param force: Rebuild the view even if the schema hasn't changed.
+        """
+        version = self._client.execute('PRAGMA schema_version').fetchone()[0]
+        if version == self._schemaVersion and not force:
+            return
+
+        if self._shards is not None:
+            self._parts = [f'{schema}.{self.TableName}' for schema, file in self._shards]
+        else:
+            digits = len(datetime.date(2000, 1, 1).strftime(self.__PERIODS[self._partition[1]]))
+            self._parts = [r[0] for r in self._client.execute(
+                "Select name From sqlite_master Where type = 'table' and name glob ? Order By name",
+                [f"{self.TableName}_{'[0-9]' * digits}"])]
+
+        cols = list(self._columns.keys()) + ([self.Tombstone] if self._softDelete else [])
+        if len(self._parts) == 0:
+            view = f"Select {', '.join([f'null As {c}' for c in cols])} Where 0"
+        else:
+            view = ' Union All '.join([f"Select {', '.join(cols)} From {part}" for part in self._parts])
+        self._client.execute(f'Drop View If Exists temp.{self.TableName}')
+        self._client.execute(f'Create Temp View {self.TableName} As {view}')
+        self._schemaVersion = version
+
+    def _perPartition(self, sql: str) -> list:
+        """
+        Splits an update or delete written against a partitioned table (the view) into one for each partition.
+        Anything else (ie - an insert, already aimed at its partition) is left as it is.
+        """
+        found = re.match(rf'(Update|Delete from) {self.TableName}\b', sql)
+        if found is None:
+            return [sql]
+        self._refreshParts()
+        return [f'{found.group(1)} {part}{sql[found.end():]}' for part in self._parts]
+
+    def _write(self, sql: str, params: typing.Any = (), many: bool = False):
+        """
+        The one place writes leave the table, either committed here or passed on to the writer for the database.
+        :param sql: The statement to run.
+        :param params: The parameters for the statement, or a list of them when many is set.
+        :param many: Run the statement with executemany.
+        """
+        if self._readonly:
+            raise ReadOnlyTable(self.TableName)
+
+        self.Writes += len(params) if many else 1
+        # the view over a partitioned table can't be written to, so it's written to each partition
+        statements = self._perPartition(sql) if self._partition is not None else [sql]
+        if self._writer is not None:
+            for stmt in statements:
+                self._writer.Write(stmt, params, many)
+            return
+
+        with self._client:
+            for stmt in statements:
+                if many:
+                    self._client.executemany(stmt, params)
+                else:
+                    self._client.execute(stmt, params)
 
     #endregion
 
@@ -377,9 +1564,11 @@ class Table:
         if col is None:
             raise ImaginaryColumn(self.TableName, name)
 
+        if not col.ValidateOP(operator):
+            raise InvalidOperation(self.TableName, col, operator)
+
         # verify the value is the correct type
-        if not self._hook_ValidateColumn(col, value):
-            raise InvalidColumnValue(self.TableName, col.Name, value)
+        value = self._checkFilterValue(col, operator, value)
 
         # Don't think we need this - tested with param'd queries and None is accepted in several cases
 #        if value is None:
@@ -493,7 +1682,109 @@ class Table:
         Creates a SQL statement which would build this table as is.
         :return: The SQL Statement.
         """
-        return f'Create Table {self.TableName} ({", ".join([self._columns[c].Build_SQL() for c in self._columns.keys()])});'
+        composite = len(self._pks) > 1
+        cols = [self._columns[c].Build_SQL(composite) for c in self._columns.keys()]
+        if self._softDelete:
+            cols.append(f'{self.Tombstone} integer')
+        if composite:
+            cols.append(f'Primary Key ({", ".join(self._pks)})')
+
+        options = ', '.join([o.title() for o in self._tableOptions()])
+        return f'Create Table {self.TableName} ({", ".join(cols)}){" " + options if len(options) > 0 else ""};'
+
+    def _tableOptions(self) -> list:
+        """
+        Lists the table options set in the ini file, as they appear at the end of the create statement.
+        """
+        return [o for o, on in [('without rowid', self._withoutRowid), ('strict', self._strict)] if on]
+
+    def _rowKey(self) -> list:
+        """
+        Names the columns which identify a row, the rowid or the primary key when there isn't one.
+        """
+        return list(self._pks) if self._withoutRowid or self._partition is not None else ['rowid']
+
+    def Build_IndexSQL(self, table: str = None) -> list:
+        """
+        Creates the SQL statements for the indexes on the reference columns and the columns marked index.
+        :param table: The table to index, one of this table's partitions, this table if not given.
+        :return: A list of the SQL statements.
+        """
+        table = self.TableName if table is None else table
+        # in an attached file the index is named with the schema, but made on the bare table
+        return [f'Create Index If Not Exists {name} On {table.split(".")[-1]} ({c});'
+                for name, c in self._indexes(table)]
+
+    def _indexes(self, table: str = None) -> list:
+        """
+        Names the indexes the table (or one of its partitions) should have.
+        :return: A list of (index name, column) tuples.
+        """
+        table = self.TableName if table is None else table
+        return [(f'{table}_{c}_fk' if col.IsForeignKey else f'{table}_{c}_idx', c)
+                for c, col in self._columns.items() if col.IsForeignKey or col.Indexed]
+
+    def Build_FullTextSQL(self) -> list:
+        """
+        Creates the SQL statements for the full text index over the fulltext columns.  The index is an fts5 external
+        content table, so the text isn't stored twice, kept up to date by triggers on the table.  The last statement
+        fills the index from whatever is already in the table.
+        :return: A list of the SQL statements, empty if there are no fulltext columns.
+        """
+        if len(self._fulltext) == 0:
+            return []
+
+        fts = f'{self.TableName}_fts'
+        cols = ', '.join(self._fulltext)
+        new = ', '.join([f'new.{c}' for c in self._fulltext])
+        old = ', '.join([f'old.{c}' for c in self._fulltext])
+        return [f"Create Virtual Table If Not Exists {fts} Using fts5({cols}, content='{self.TableName}');",
+                f"Create Trigger If Not Exists {fts}_insert After Insert On {self.TableName} Begin "
+                f"Insert into {fts}(rowid, {cols}) values (new.rowid, {new}); End;",
+                f"Create Trigger If Not Exists {fts}_delete After Delete On {self.TableName} Begin "
+                f"Insert into {fts}({fts}, rowid, {cols}) values ('delete', old.rowid, {old}); End;",
+                f"Create Trigger If Not Exists {fts}_update After Update On {self.TableName} Begin "
+                f"Insert into {fts}({fts}, rowid, {cols}) values ('delete', old.rowid, {old}); "
+                f"Insert into {fts}(rowid, {cols}) values (new.rowid, {new}); End;",
+                f"Insert into {fts}({fts}) values ('rebuild');"]
+
+    def Build_DropFullTextSQL(self) -> list:
+        """
+        Creates the SQL statements which remove the full text index and its triggers.
+        :return: A list of the SQL statements.
+        """
+        fts = f'{self.TableName}_fts'
+        return [f'Drop Trigger If Exists {fts}_{op};' for op in ['insert', 'delete', 'update']] + \
+               [f'Drop Table If Exists {fts};']
+
+    def Build_ChangeSQL(self, log: str, table: str = None) -> list:
+        """
+        Creates the SQL statements for the triggers which record every insert, update and delete on the table in the
+        change log.  Being triggers, writes made outside of the ORM are caught too - except on a shard, where a trigger
+        in the file can't reach the log, so they're temporary triggers which only see this connection's writes.  With
+        soft delete, setting the tombstone is logged as the delete and purging the row later isn't logged again.
+        :param log: The name of the change log table.
+        :param table: The partition to put the triggers on, all of them for a partitioned table if not given.
+        :return: A list of the SQL statements.
+        """
+        if self._partition is not None and table is None:
+            self._refreshParts()
+            return [sql for part in self._parts for sql in self.Build_ChangeSQL(log, part)]
+
+        table = self.TableName if table is None else table
+        temp = 'Temp ' if '.' in table else ''
+        # (trigger name, event, when, logged as)
+        triggers = [('Insert', 'Insert', '', 'insert'), ('Update', 'Update', '', 'update'),
+                    ('Delete', 'Delete', '', 'delete')]
+        if self._softDelete:
+            deleting = f'OLD.{self.Tombstone} is null and NEW.{self.Tombstone} is not null'
+            triggers = [('Insert', 'Insert', '', 'insert'), ('Update', 'Update', f' When not ({deleting})', 'update'),
+                        ('SoftDelete', f'Update Of {self.Tombstone}', f' When {deleting}', 'delete'),
+                        ('Delete', 'Delete', f' When OLD.{self.Tombstone} is null', 'delete')]
+        return [f"Create {temp}Trigger If Not Exists {table.replace('.', '_')}_{name}_log After {event} On {table}"
+                f"{when} Begin Insert into {log} (tbl, op, rowkey) values ('{self.TableName}', '{op}', "
+                f"{self._hook_ChangeKey('OLD' if op == 'delete' else 'NEW')}); End;"
+                for name, event, when, op in triggers]
 
     def __getattr__(self, item):
         if item in self._columns.keys():
@@ -0,0 +1,156 @@
+import collections
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+import typing
+
+from Definitions import SlowQuery
+
+# The slow query log.  When it's turned on the database's connection is made with TracedConnection, so every
+# statement any table runs is timed, from the execute through to the last row fetched, without the tables doing
+# anything different.  Rows read by iterating over the cursor (rather than fetching them) aren't counted.
+
+
+def Plan(conn: sqlite3.Connection, sql: str, params: typing.Any = ()) -> list:
+    """
+    Asks sqlite how it would run a statement.
+    :return: The steps of the plan, one line each, indented two spaces for each level of nesting.
+    """
+    # a plain cursor, so explaining doesn't get timed too
+    rows = sqlite3.Cursor(conn).execute(f'Explain Query Plan {sql}', params).fetchall()
+
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+class SlowLog:
+    """
+    Keeps the most recent statements which went over the threshold, and appends them to a JSON lines file if given one.
+    """
+
+    def __init__(self, threshold: float, keep: int = 1000, path: str = None):
+        """
+        Constructor
+        :param threshold: The seconds a statement has to take to be logged.
+        :param keep: The number of entries kept in memory, the oldest are dropped first.
+        :param path: A file to append every entry to as well, None to only keep them in memory.
+        """
+        self.Threshold = threshold
+        self.Entries = collections.deque(maxlen=keep)
+        self._path = path
+        self._lock = threading.Lock()
+
+    def Record(self, conn: sqlite3.Connection, sql: str, params: typing.Any, many: bool, rows: int, seconds: float):
+        """
+        Logs a statement which went over the threshold, along with its plan.
+        """
+        if many:
+            shape = f'many, {rows} rows'
+            plan = []  # there's no one set of parameters to explain with
+        else:
+            shape = f'{len(params)} {"named" if isinstance(params, dict) else "params"}'
+            try:
+                plan = Plan(conn, sql, params)
+            except sqlite3.Error:
+                # not everything can be explained (ie - pragmas), or the statement failed in the first place
+                plan = []
+
+        entry = SlowQuery(sql, shape, seconds, plan, time.time())
+        self.Entries.append(entry)
+        if self._path is not None:
+            with self._lock:
+                with open(self._path, 'a') as f:
+                    f.write(json.dumps(dataclasses.asdict(entry)) + '\n')
+
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Times each statement from its execute until its rows are all fetched (or the cursor moves on), then hands it to
+    the connection's SlowLog if it was over the threshold.
+    """
+
+    _sql = None
+    _params = ()
+    _many = False
+    _seconds = 0.0
+
+    def execute(self, sql: str, parameters: typing.Any = ()):
+        self._begin(sql, parameters, False)
+        try:
+            return self._timed(super().execute, sql, parameters)
+        finally:
+            # nothing to fetch, it's finished
+            if self.description is None:
+                self._finish()
+
+    def executemany(self, sql: str, parameters: typing.Iterable):
+        self._begin(sql, (), True)
+        try:
+            return self._timed(super().executemany, sql, parameters)
+        finally:
+            self._finish()
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size: int = None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _timed(self, func: typing.Callable, *args) -> typing.Any:
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._seconds += time.perf_counter() - start
+
+    def _begin(self, sql: str, params: typing.Any, many: bool):
+        # whatever ran before on this cursor is done with
+        self._finish()
+        self._sql, self._params, self._many, self._seconds = sql, params, many, 0.0
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        log = self.connection.SlowLog
+        if log is not None and self._seconds >= log.Threshold:
+            log.Record(self.connection, self._sql, self._params, self._many, self.rowcount, self._seconds)
+        self._sql = None
+
+
+class TracedConnection(sqlite3.Connection):
+    """
+    A connection whose cursors are all TracedCursors, pass it as the factory to sqlite3.connect then set SlowLog.
+    """
+
+    SlowLog = None
+
+    def cursor(self, factory: type = None):
+        return super().cursor(factory if factory is not None else TracedCursor)
+
+    def execute(self, sql: str, parameters: typing.Any = ()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: typing.Iterable):
+        return self.cursor().executemany(sql, parameters)
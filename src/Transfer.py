@@ -0,0 +1,134 @@
+import contextlib
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import typing
+
+from Columns import Column, StorageTypes
+
+# Helpers for the CSV and JSON lines import and export in Table.  The files are read and written a chunk at a time, so
+# nothing ever holds more than a chunk of rows.  Dates are written as iso 8601 text and blobs as hex, since neither
+# format has anything better, and read back according to the column they're for.
+
+
+@contextlib.contextmanager
+def Open(target: typing.Any, write: bool) -> typing.Iterator[typing.TextIO]:
+    """
+    Opens the file (or stream) being imported from or exported to as text.
+    :param target: A file path, gzipped when it ends in .gz, or an open stream.  Binary streams (ie - gzip.open(...))
+                   are read or written as utf-8, and are left open afterwards.
+    :param write: True when exporting.
+    """
+    if not isinstance(target, (str, os.PathLike)):
+        if not isinstance(target, (io.RawIOBase, io.BufferedIOBase)):
+            yield target
+            return
+
+        text = io.TextIOWrapper(target, encoding='utf-8', newline='')
+        try:
+            yield text
+        finally:
+            text.flush()
+            # let go of the stream without closing it
+            text.detach()
+        return
+
+    if os.fspath(target).endswith('.gz'):
+        stream = gzip.open(target, 'wt' if write else 'rt', encoding='utf-8', newline='')
+    else:
+        stream = open(target, 'w' if write else 'r', encoding='utf-8', newline='')
+    with stream:
+        yield stream
+
+
+def Chunks(rows: typing.Iterable, size: int) -> typing.Iterator[list]:
+    """
+    Splits the rows up into lists of at most size rows.
+    """
+    rows = iter(rows)
+    chunk = list(itertools.islice(rows, size))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(itertools.islice(rows, size))
+
+
+def Format(value: typing.Any) -> typing.Any:
+    """
+    Converts a value read from a table into what's written to the file.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def Parse(col: Column, value: typing.Any) -> typing.Any:
+    """
+    Converts a value read from a file into the python type for the column.  Everything in a CSV file is text, and an
+    empty cell is taken as null for anything but a text column.
+    :param col: The column the value is for.
+    :param value: The value from the file.
+    """
+    if not isinstance(value, str):
+        return value
+    if value == '' and (col.Temporal is not None or col.StorageType != StorageTypes.TEXT):
+        return None
+
+    if col.Temporal is not None:
+        return col.FromString(value)
+    match col.StorageType:
+        case StorageTypes.INTEGER:
+            return int(value)
+        case StorageTypes.REAL:
+            return float(value)
+        case StorageTypes.BLOB:
+            return bytes.fromhex(value)
+    return value
+
+
+def WriteCSV(stream: typing.TextIO, columns: list, chunks: typing.Iterable) -> int:
+    """
+    Writes a header row of the column names then the rows, a chunk at a time.
+    :return: The number of rows written.
+    """
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+
+    count = 0
+    for chunk in chunks:
+        writer.writerows([[Format(v) for v in row] for row in chunk])
+        count += len(chunk)
+    return count
+
+
+def WriteJSONL(stream: typing.TextIO, columns: list, chunks: typing.Iterable) -> int:
+    """
+    Writes each row as a json object of the column names and values, one per line, a chunk at a time.
+    :return: The number of rows written.
+    """
+    count = 0
+    for chunk in chunks:
+        stream.write(''.join([json.dumps(dict(zip(columns, [Format(v) for v in row]))) + '\n' for row in chunk]))
+        count += len(chunk)
+    return count
+
+
+def ReadCSV(stream: typing.TextIO) -> typing.Iterator[dict]:
+    """
+    Reads the rows of a CSV file with a header row of the column names, one at a time.
+    """
+    return csv.DictReader(stream)
+
+
+def ReadJSONL(stream: typing.TextIO) -> typing.Iterator[dict]:
+    """
+    Reads the rows of a JSON lines file, one at a time.  Blank lines are skipped.
+    """
+    for line in stream:
+        if line.strip() != '':
+            yield json.loads(line)
@@ -0,0 +1,408 @@
+import queue
+import sqlite3
+import threading
+import time
+import typing
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+
+class BatchWriter:
+    """
+    Owns the one connection which writes to the database file and commits whatever has been queued up to it in groups,
+    so many small writes share a single transaction (and a single sync to disk).  A group is committed when it reaches
+    the maximum batch size or when the oldest write in it has waited the maximum latency, whichever comes first.
+
+    Each write runs inside its own savepoint, so one bad statement only fails the caller who sent it and the rest of the
+    group still commits.
+    """
+
+    def __init__(self, path: str, max_batch: int = 500, max_latency: float = 0.005, max_size: int = 0,
+                 autocheckpoint: int = None):
+        """
+        Constructor
+        :param path: The database file to write to.
+        :param max_batch: The most writes to put in a single transaction.
+        :param max_latency: The longest, in seconds, a write waits for others to join its transaction.
+        :param max_size: The most writes allowed to wait in the queue, callers block when it's full.  0 for no limit.
+        :param autocheckpoint: The WAL pages after which a commit checkpoints, 0 for never, None to leave sqlite's
+                               default.
+        """
+        self._path = path
+        self._autocheckpoint = autocheckpoint
+        self._max_batch = max_batch
+        self._max_latency = max_latency
+        self._queue = queue.Queue(max_size)
+
+        # held for the length of each transaction, anyone needing the file quiet (ie - a checkpoint) can take it to
+        # run between batches
+        self.Lock = threading.Lock()
+
+        self.Batches = 0  # number of transactions committed
+        self.Writes = 0  # number of statements committed
+        self.Errors = deque(maxlen=1000)  # (params, error) for failed writes nobody was waiting on
+        self._failed = None  # what stopped the writer thread, if it has died - later writes raise it
+
+        self._thread = threading.Thread(target=self._run, name='IniLiteWriter', daemon=True)
+        self._thread.start()
+
+    def Write(self, sql: str, params: typing.Any = (), many: bool = False, wait: bool = True):
+        """
+        Queues a statement for the next transaction.
+        :param sql: The statement to run.
+        :param params: The parameters for the statement, or a list of them when many is set.
+        :param many: Run the statement with executemany.
+        :param wait: Block until the transaction holding the statement commits, raising any error it caused.
+        """
+        if self._failed is not None:
+            raise self._failed
+
+        item = [sql, params, many, threading.Event() if wait else None, None]
+        self._queue.put(item)
+        if self._failed is not None:
+            # the thread may have died after draining the queue, nobody else will pick this up
+            self._drain()
+
+        if wait:
+            item[3].wait()
+            if item[4] is not None:
+                raise item[4]
+
+    def Flush(self):
+        """
+        Commits everything queued so far without waiting for the batch to fill, returning once it's done.
+        """
+        marker = threading.Event()
+        self._queue.put(marker)
+        if self._failed is not None:
+            self._drain()
+        marker.wait()
+        if self._failed is not None:
+            raise self._failed
+
+    def Close(self):
+        """
+        Commits anything still queued and stops the writer.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _connect(self) -> typing.Union[sqlite3.Connection, None]:
+        # transactions are managed by hand so the savepoints behave
+        conn = sqlite3.connect(self._path, isolation_level=None)
+        if self._autocheckpoint is not None:
+            # the automatic checkpoints are run by whichever connection commits, which is this one
+            conn.execute(f'PRAGMA wal_autocheckpoint = {int(self._autocheckpoint)}')
+        return conn
+
+    def _run(self):
+        conn = None
+        try:
+            # the connection has to be made on the thread which uses it
+            conn = self._connect()
+            self._gather(conn)
+        except Exception as e:
+            # not a bad write, those only fail their caller - nothing queued after this would ever be written
+            self._failed = e
+            self._drain()
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _gather(self, conn: sqlite3.Connection):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # gather up everything else which arrives before the batch is full or the first write has waited long
+            # enough, a flush marker ends the gathering early
+            batch = [item]
+            deadline = time.monotonic() + self._max_latency
+            while len(batch) < self._max_batch and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    running = False
+                    break
+                batch.append(nxt)
+            # end while gathering
+
+            markers = [i for i in batch if isinstance(i, threading.Event)]
+            batch = [i for i in batch if not isinstance(i, threading.Event)]
+
+            try:
+                if len(batch) > 0:
+                    with self.Lock:
+                        self._commit(conn, batch)
+            except Exception as e:
+                for item in batch:
+                    item[4] = e if item[4] is None else item[4]
+                raise
+            finally:
+                # whatever happened, nobody is left waiting on this batch
+                self._release(batch, markers)
+        # end while running
+
+    def _release(self, batch: list, markers: list):
+        """
+        Wakes everyone waiting on a batch, keeping the errors for the writes nobody is waiting on.
+        """
+        for item in batch:
+            if item[3] is not None:
+                item[3].set()
+            elif item[4] is not None:
+                self.Errors.append((item[1], item[4]))
+        for marker in markers:
+            marker.set()
+
+    def _drain(self):
+        """
+        Fails everything still queued once the writer thread is gone.
+        """
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, threading.Event):
+                self._release([], [item])
+            elif item is not None:
+                item[4] = self._failed
+                self._release([item], [])
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        try:
+            conn.execute('Begin Immediate')
+            for item in batch:
+                conn.execute('Savepoint write')
+                try:
+                    if item[2]:
+                        conn.executemany(item[0], item[1])
+                    else:
+                        conn.execute(item[0], item[1])
+                    conn.execute('Release write')
+                except Exception as e:
+                    # not only sqlite's errors, a parameter it can't bind (ie - an int over 64 bits) is just as bad
+                    conn.execute('Rollback To write')
+                    conn.execute('Release write')
+                    item[4] = e
+            # end for item
+            conn.execute('Commit')
+
+            self.Batches += 1
+            self.Writes += len([i for i in batch if i[4] is None])
+        except Exception as e:
+            # the whole transaction failed (ie - the file is locked by someone outside the system)
+            if conn.in_transaction:
+                conn.execute('Rollback')
+            for item in batch:
+                item[4] = e
+
+
+class RowBuffer(BatchWriter):
+    """
+    Buffers the rows for a single insert statement and commits them with one executemany per batch, for tables which
+    take a high rate of single row adds.  If a batch fails as a whole it's retried row by row so only the bad rows fail.
+    When the database has a writer (see WriteServer) the batches are handed to it rather than written directly.
+    """
+
+    def __init__(self, path: str, sql: str, writer=None, max_rows: int = 1000, max_latency: float = 0.05,
+                 max_size: int = 100000, autocheckpoint: int = None):
+        """
+        Constructor
+        :param path: The database file to write to.
+        :param sql: The insert statement the rows are for.
+        :param writer: The database's writer, None to write to the file directly.
+        :param max_rows: The most rows to commit in a single batch.
+        :param max_latency: The longest, in seconds, a row waits in the buffer.
+        :param max_size: The most rows allowed in the buffer, Add blocks when it's full.
+        :param autocheckpoint: The WAL pages after which a commit checkpoints, see BatchWriter.
+        """
+        self._sql = sql
+        self._writer = writer
+        super().__init__(path, max_rows, max_latency, max_size, autocheckpoint)
+
+    def Add(self, row: list, wait: bool = True):
+        """
+        Buffers a row for the next batch.
+        :param row: The parameters for the insert.
+        :param wait: Block until the row is committed, raising any error it caused.
+        """
+        self.Write(self._sql, row, False, wait)
+
+    def _connect(self) -> typing.Union[sqlite3.Connection, None]:
+        return None if self._writer is not None else super()._connect()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        rows = [i[1] for i in batch]
+        try:
+            if self._writer is not None:
+                self._writer.Write(self._sql, rows, True)
+            else:
+                conn.execute('Begin Immediate')
+                conn.executemany(self._sql, rows)
+                conn.execute('Commit')
+
+            self.Batches += 1
+            self.Writes += len(rows)
+        except (EOFError, OSError) as e:
+            # the writer's process went away (or turned the connection down), row by row won't get any further
+            for item in batch:
+                item[4] = e
+        except Exception:
+            if conn is not None and conn.in_transaction:
+                conn.execute('Rollback')
+
+            # something in there was bad, go row by row so the rest still make it in
+            if self._writer is not None:
+                for item in batch:
+                    try:
+                        self._writer.Write(self._sql, item[1])
+                        self.Writes += 1
+                    except Exception as e:
+                        item[4] = e
+            else:
+                super()._commit(conn, batch)
+
+
+class LockSet:
+    """
+    Holds every batch lock in the process at once, for work which needs the file quiet between batches (ie - a
+    checkpoint).  The locks are looked up each time it's taken, so buffers started later are covered too.
+    """
+
+    def __init__(self, locks: typing.Callable[[], list]):
+        """
+        Constructor
+        :param locks: Gives the locks to take, in the order they're taken - a buffer hands its batches to the writer
+                      while holding its own lock, so the buffers' locks have to come before the writer's.
+        """
+        self._locks = locks
+        self._held = threading.local()
+
+    def __enter__(self):
+        held = []
+        try:
+            for lock in self._locks():
+                lock.acquire()
+                held.append(lock)
+        except BaseException:
+            for lock in reversed(held):
+                lock.release()
+            raise
+        self._held.locks = held
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self._held.locks):
+            lock.release()
+
+
+class WriteServer:
+    """
+    Runs in the process designated as the writer and accepts writes from the other processes over a local socket,
+    handing them all to one BatchWriter so writes from many processes are grouped into shared transactions instead of
+    fighting over the file lock.
+    """
+
+    def __init__(self, path: str, address: typing.Union[str, tuple], authkey: bytes = None, max_batch: int = 500,
+                 max_latency: float = 0.005, autocheckpoint: int = None):
+        """
+        Constructor
+        :param path: The database file to write to.
+        :param address: Where to listen, a (host, port) tuple or the path of a unix socket.
+        :param authkey: Shared secret the clients have to present.  The writes arrive pickled, so without it anything
+                        able to reach the address could run code in this process - it's required.
+        :param max_batch: The most writes to put in a single transaction.
+        :param max_latency: The longest, in seconds, a write waits for others to join its transaction.
+        :param autocheckpoint: The WAL pages after which a commit checkpoints, see BatchWriter.
+        """
+        if not authkey:
+            raise ValueError(f"The writer at {address} needs an authkey, it unpickles whatever it's sent.")
+        self.Writer = BatchWriter(path, max_batch, max_latency, autocheckpoint=autocheckpoint)
+        self._listener = Listener(address, authkey=authkey)
+        self.Address = self._listener.address
+        self._running = True
+
+        self._thread = threading.Thread(target=self._accept, name='IniLiteWriteServer', daemon=True)
+        self._thread.start()
+
+    def Write(self, sql: str, params: typing.Any = (), many: bool = False):
+        """
+        Writes from the server's own process skip the socket.
+        """
+        self.Writer.Write(sql, params, many)
+
+    def Close(self):
+        """
+        Stops taking new connections and commits anything still queued.
+        """
+        self._running = False
+        self._listener.close()
+        self.Writer.Close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # listener was closed, or a client failed the handshake
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    sql, params, many = conn.recv()
+                except (EOFError, OSError):
+                    break
+
+                # each client waits on its own write, but all the clients waiting together share the transaction
+                try:
+                    self.Writer.Write(sql, params, many)
+                    err = None
+                except Exception as e:
+                    err = e
+                try:
+                    conn.send(err)
+                except (EOFError, OSError):
+                    break
+            # end while True
+
+
+class WriteClient:
+    """
+    Sends writes to the WriteServer in the designated writer process, returning once they have been committed.
+    """
+
+    def __init__(self, address: typing.Union[str, tuple], authkey: bytes = None):
+        """
+        Constructor
+        :param address: Where the server is listening, a (host, port) tuple or the path of a unix socket.
+        :param authkey: Shared secret the server expects.
+        """
+        if not authkey:
+            raise ValueError(f"The writer at {address} needs an authkey, the server won't talk without one.")
+        self._conn = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+
+    def Write(self, sql: str, params: typing.Any = (), many: bool = False):
+        """
+        Sends a statement to the writer and waits for it to commit, raising any error it caused.
+        """
+        with self._lock:
+            self._conn.send((sql, list(params), many))
+            err = self._conn.recv()
+
+        if err is not None:
+            raise err
+
+    def Close(self):
+        self._conn.close()
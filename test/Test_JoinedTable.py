@@ -1,9 +1,12 @@
+import io
+
 # grab the setup for the DB from here
 from Fixtures import *
 
 from Tables import Table
 from JoinedTable import JoinedTable
 from Tables import ComparisonOps
+from Definitions import JoinModes
 import Errors
 
 
@@ -220,4 +223,193 @@ def test_Filter_InvalidValue(config, buildDBFile):
     # just to be safe
     jt.ClearFilters()
 
-# endregion
\ No newline at end of file
+# endregion
+
+
+def test_Filter_SecondaryColumn(config, buildDBFile):
+    per = Table(config["Person"], buildDBFile)
+    bifold = Table(config["Wallet"], buildDBFile)
+
+    jt = JoinedTable(per, bifold, "id", "personid")
+
+    jt.Filter("amount", ComparisonOps.GREATER, 500.0)
+    jt.Filter("Person.lname", ComparisonOps.IS, 'Doe')
+    data = jt.Get(["fname", "Wallet.amount"])
+
+    assert len(data) == 1
+    assert data[0].fname == "John"
+    assert data[0].Wallet_amount == 1010.12
+
+    jt.ClearFilters()
+
+# endregion
+
+
+# region Join Mode Tests
+
+def test_InnerJoin(config, buildDBFile):
+    per = Table(config["Person"], buildDBFile)
+    bifold = Table(config["Wallet"], buildDBFile)
+
+    jt = JoinedTable(per, bifold, "id", "personid", JoinModes.INNER)
+    data = jt.Get(["fname"])
+
+    assert [r[0] for r in data] == ["Joe", "June", "John"]
+
+# endregion
+
+
+# region Update Tests
+
+def test_Update_SecondaryFilter(config, buildDBFile, dirtyDB):
+    per = Table(config["Person"], buildDBFile)
+    bifold = Table(config["Wallet"], buildDBFile)
+
+    jt = JoinedTable(per, bifold, "id", "personid")
+
+    jt.Filter("amount", ComparisonOps.LESSER, 700.0)
+    jt.UpdateValue("nickname", "Saver")
+    jt.ClearFilters()
+
+    data = per.Get(["fname", "nickname"])
+    assert data[0] == ("Joe", "Saver")
+    assert data[1] == ("June", "Saver")
+    assert data[5] == ("John", "Pops")
+
+
+def test_Update_SecondaryColumn(config, buildDBFile):
+    per = Table(config["Person"], buildDBFile)
+    bifold = Table(config["Wallet"], buildDBFile)
+
+    jt = JoinedTable(per, bifold, "id", "personid")
+
+    with pytest.raises(Errors.ImaginaryColumn):
+        jt.UpdateValue("amount", 1.0, "fname", ComparisonOps.IS, "Joe")
+
+# endregion
+
+
+# region Chain Tests
+
+chain_ini = """
+[global]
+file = {0}
+
+[Person]
+id = integer, key
+fname = text, required
+
+[Wallet]
+id = integer, key
+personid = integer, reference Person.id
+amount = real
+
+[Card]
+id = integer, key
+walletid = integer, reference Wallet.id
+cardnum = text
+"""
+
+
+@pytest.fixture
+def chainDB(tmp_path):
+    from Database import Database
+
+    cfg = tmp_path / 'chain.ini'
+    cfg.write_text(chain_ini.format(tmp_path / 'chain.db'))
+    db = Database(str(cfg))
+
+    db.Person.Add({'fname': 'Joe'})
+    db.Person.Add({'fname': 'June'})
+    db.Wallet.Add({'personid': 1, 'amount': 10.0})
+    db.Wallet.Add({'personid': 2, 'amount': 20.0})
+    db.Card.Add({'walletid': 1, 'cardnum': '1111'})
+    db.Card.Add({'walletid': 1, 'cardnum': '2222'})
+    return db
+
+
+def test_Chain_InferredKeys(chainDB):
+    jt = chainDB.Join('Person', 'Wallet').Join(chainDB.Card, mode=JoinModes.INNER)
+
+    assert jt.TableName == 'Person/Wallet/Card'
+    assert sorted(jt.Get(['fname', 'cardnum'])) == [('Joe', '1111'), ('Joe', '2222')]
+
+
+def test_Chain_ExplicitKeys(chainDB):
+    jt = chainDB.Join('Person', 'Wallet', ('id', 'personid')).Join(chainDB.Card, ('Wallet.id', 'walletid'))
+
+    jt.Filter('amount', ComparisonOps.GREATER, 15.0)
+    assert jt.Get(['fname', 'cardnum']) == [('June', None)]
+
+
+def test_Chain_CachedProjection(chainDB):
+    jt = chainDB.Join('Person', 'Wallet').Join(chainDB.Card)
+
+    jt.Filter('cardnum', ComparisonOps.EQUALS, '1111')
+    assert jt.Get(['fname']) == [('Joe',)]
+
+    # same shape, new value - the statement is reused
+    jt.ClearFilters()
+    jt.Filter('cardnum', ComparisonOps.EQUALS, '2222')
+    assert jt.Get(['fname']) == [('Joe',)]
+
+    assert len(jt._sqlcache) == 1
+    sql = list(jt._sqlcache.values())[0]
+    assert sql.startswith('Select Person.fname From Person Left Join Wallet')
+    assert '*' not in sql
+
+
+def test_Chain_NoReference(config, buildDBFile):
+    per = Table(config["Person"], buildDBFile)
+    bifold = Table(config["Wallet"], buildDBFile)
+
+    with pytest.raises(ValueError):
+        per.Join(bifold)
+
+
+def test_Chain_Parallel(chainDB):
+    # there's no rowid to split a join on, it's read like Get
+    jt = chainDB.Join('Person', 'Wallet')
+    assert sorted(jt.ParallelGet(['fname', 'amount'])) == [('Joe', 10.0), ('June', 20.0)]
+    assert jt.ParallelAggregate('sum', 'amount') == 30.0
+
+    jt.Filter('fname', ComparisonOps.EQUALS, 'June')
+    assert jt.ParallelAggregate('count', 'Wallet.id') == 1
+
+
+def test_Chain_Explain(chainDB):
+    # with no columns given the plan is for the same columns as GetAll
+    jt = chainDB.Join('Person', 'Wallet')
+    jt.Filter('fname', ComparisonOps.EQUALS, 'Joe')
+    plan = jt.Explain()
+    assert any(step.strip().startswith('SCAN Person') for step in plan)
+    assert any('Wallet' in step for step in plan)
+    assert jt.Explain(['fname', 'amount']) == plan
+
+
+def test_Chain_Export(chainDB):
+    jt = chainDB.Join('Person', 'Wallet')
+    jt.Filter('amount', ComparisonOps.GREATER, 15.0)
+
+    buf = io.StringIO()
+    assert jt.ExportCSV(buf).rows == 1
+    assert buf.getvalue().splitlines() == ['Person.fname,Wallet.id,Wallet.amount', 'June,2,20.0']
+
+    pytest.importorskip('pyarrow')
+    data = jt.ToArrow()
+    assert data.column_names == ['Person.fname', 'Wallet.id', 'Wallet.amount']
+    assert data.column('Person.fname').to_pylist() == ['June']
+
+# endregion
+
+
+def test_Filter_InList_Cached(chainDB):
+    j = chainDB.Join('Person', 'Wallet')
+    j.Filter('Person.id', ComparisonOps.IN, [1, 5, 6])
+    assert [r.fname for r in j.Get(['fname'])] == ['Joe']
+    j.ClearFilters()
+
+    # same bucket, same statement
+    j.Filter('Person.id', ComparisonOps.IN, [2, 3, 4, 5])
+    assert [r.fname for r in j.Get(['fname'])] == ['June']
+    assert len(j._sqlcache) == 1
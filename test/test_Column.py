@@ -1,3 +1,5 @@
+import datetime
+
 from Columns import Column, StorageTypes
 
 def test_Int_Column_Init():
@@ -51,3 +53,34 @@ def test_Double_Column_Init():
     assert c.Validate(0.1), 'Failed to validate 0.0'
     assert not c.Validate(1), 'Failed to validate 1'
     assert not c.Validate('one'), 'Incorrectly validated \"one\"'
+
+
+def test_Date_Column_Init():
+    c = Column('birthday', 'date, index')
+    assert c.Temporal == 'date'
+    assert c.Indexed
+    assert c._storageT == StorageTypes.INTEGER
+    assert c.Default is None
+    assert c.Build_SQL() == 'birthday date'
+
+    assert c.Validate(datetime.date(1911, 11, 11))
+    assert c.Validate(0), 'Failed to validate a stored value'
+    assert not c.Validate(datetime.datetime(1911, 11, 11)), 'Would lose the time'
+    assert not c.Validate('1911-11-11')
+
+
+def test_Date_Conversions():
+    d = Column('day', 'date')
+    assert d.ToStorage(datetime.date(1911, 11, 11)) == -1834790400
+    assert d.FromStorage(-1834790400) == datetime.date(1911, 11, 11)
+
+    dt = Column('seen', 'datetime, default 2000-01-01T12:00:00')
+    assert dt.Default == 946728000
+    assert dt.FromStorage(dt.ToStorage(datetime.datetime(2024, 2, 29, 23, 59, 59))) == \
+           datetime.datetime(2024, 2, 29, 23, 59, 59)
+
+    ts = Column('at', 'timestamp')
+    aware = datetime.datetime(2024, 1, 1, 5, 30, 0, 250, tzinfo=datetime.timezone(datetime.timedelta(hours=5, minutes=30)))
+    assert ts.ToStorage(aware) == 1704067200.00025
+    assert ts.FromStorage(ts.ToStorage(aware)) == aware
+    assert ts.Validate(1704067200)
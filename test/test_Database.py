@@ -0,0 +1,712 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from Database import Database
+from Definitions import ComparisonOps, CheckpointModes
+import Errors
+
+ini = """
+[global]
+file = {0}
+foreign_keys = true
+
+[Person]
+id = integer, key
+fname = text, required
+
+[Wallet]
+id = integer, key
+personid = integer, reference Person.id
+amount = real
+"""
+
+
+@pytest.fixture
+def relDB(tmp_path):
+    cfg = tmp_path / 'rel.ini'
+    cfg.write_text(ini.format(tmp_path / 'rel.db'))
+    db = Database(str(cfg))
+
+    for name in ['Joe', 'June', 'Jack']:
+        db.Person.Add({'fname': name})
+    db.Wallet.Add({'personid': 1, 'amount': 10.0})
+    db.Wallet.Add({'personid': 1, 'amount': 11.0})
+    db.Wallet.Add({'personid': 2, 'amount': 20.0})
+    return db
+
+
+# region Relationship Tests
+
+def test_Create_ForeignKey(relDB):
+    sql = relDB._client.execute("Select sql From sqlite_master Where name = 'Wallet'").fetchone()[0]
+    assert 'References Person(id)' in sql
+
+    indexes = [r[1] for r in relDB._client.execute("PRAGMA index_list('Wallet')")]
+    assert 'Wallet_personid_fk' in indexes
+
+
+def test_Get_IncludeChildren(relDB):
+    relDB.Person.Filter('fname', ComparisonOps.LIKE, 'J%')
+    rows, related = relDB.Person.Get(['id', 'fname'], include=['Wallet'])
+    relDB.Person.ClearFilters()
+
+    assert len(rows) == 3
+    wallets = related['Wallet']
+    assert sorted(w.amount for w in wallets[1]) == [10.0, 11.0]
+    assert [w.amount for w in wallets[2]] == [20.0]
+    assert 3 not in wallets
+
+
+def test_Get_IncludeParent(relDB):
+    relDB.Wallet.Filter('amount', ComparisonOps.GREATER, 15.0)
+    rows, related = relDB.Wallet.Get(['personid', 'amount'], include=['Person'])
+    relDB.Wallet.ClearFilters()
+
+    assert rows == [(2, 20.0)]
+    assert related['Person'][2][0].fname == 'June'
+
+
+def test_Get_IncludeUnrelated(relDB):
+    with pytest.raises(ValueError):
+        relDB.Person.Get(['id'], include=['Phone'])
+
+
+def test_Get_IncludeByColumn(tmp_path):
+    # a table referencing itself and two references to the same table are kept apart by the reference column
+    cfg = tmp_path / 'loan.ini'
+    cfg.write_text(ini.format(tmp_path / 'loan.db') + """
+[Staff]
+id = integer, key
+name = text
+managerid = integer, reference Staff.id
+
+[Loan]
+id = integer, key
+lender = integer, reference Staff.id
+borrower = integer, reference Staff.id
+amount = real
+""")
+    db = Database(str(cfg))
+    db.Staff.Add({'name': 'Boss', 'managerid': 1})
+    db.Staff.Add({'name': 'Worker', 'managerid': 1})
+    db.Loan.Add({'lender': 1, 'borrower': 2, 'amount': 5.0})
+
+    rows, related = db.Loan.Get(['lender', 'borrower'], include=['lender', 'borrower'])
+    assert related['lender'][1][0].name == 'Boss'
+    assert related['borrower'][2][0].name == 'Worker'
+
+    db.Staff.Filter('id', ComparisonOps.EQUALS, 1)
+    rows, related = db.Staff.Get(['id'], include=['Staff.managerid', 'Loan.lender', 'Loan.borrower'])
+    assert sorted(s.name for s in related['Staff.managerid'][1]) == ['Boss', 'Worker']
+    assert related['Loan.lender'][1][0].amount == 5.0
+    assert related['Loan.borrower'] == {}
+    db.Staff.ClearFilters()
+
+    db.Staff.Filter('id', ComparisonOps.EQUALS, 2)
+    assert db.Staff.Get(['managerid'], include=['managerid'])[1]['managerid'][1][0].name == 'Boss'
+    db.Staff.ClearFilters()
+
+    # the table name alone is ambiguous here
+    with pytest.raises(ValueError):
+        db.Loan.Get(['id'], include=['Staff'])
+
+
+def test_Delete_RaisesErrors(relDB):
+    relDB._client.execute('Drop Table Wallet')
+    with pytest.raises(sqlite3.OperationalError):
+        relDB.Wallet.Delete()
+
+
+def test_Reopen_Valid(relDB, tmp_path):
+    db = Database(str(tmp_path / 'rel.ini'))
+    assert db.Person.IsValid
+    assert db.Wallet.IsValid
+
+# endregion
+
+# region Read Only Tests
+
+def test_ReadOnly_SharedAcrossThreads(relDB, tmp_path):
+    relDB.Close()
+    db = Database(str(tmp_path / 'rel.ini'), readonly=True)
+    counts = []
+
+    def work():
+        for _ in range(20):
+            counts.append(len(db.Wallet.GetAll()))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counts == [3] * 80
+    assert db.Person.Get(['fname'], include=['Wallet'])[1]['Wallet'][1][0].amount == 10.0
+
+
+def test_ReadOnly_RejectsWrites(relDB, tmp_path):
+    relDB.Close()
+    cfg = tmp_path / 'rel.ini'
+    cfg.write_text(cfg.read_text().replace('foreign_keys = true', 'foreign_keys = true\nmode = readonly'))
+    db = Database(str(cfg))
+
+    with pytest.raises(Errors.ReadOnlyTable):
+        db.Person.Add({'fname': 'Jill'})
+    with pytest.raises(Errors.ReadOnlyTable):
+        db.Wallet.UpdateValue('amount', 0.0)
+    with pytest.raises(Errors.ReadOnlyTable):
+        db.Join('Wallet', 'Person').Delete()
+    assert len(db.Person.GetAll()) == 3
+
+# endregion
+
+# region In Memory Tests
+
+def test_Memory_SnapshotRoundTrip(tmp_path):
+    cfg = tmp_path / 'mem.ini'
+    cfg.write_text(ini.format(':memory:'))
+    db = Database(str(cfg))
+    assert db.InMemory
+
+    for i in range(500):
+        db.Person.Add({'fname': f'P{i}'})
+    steps = []
+    db.SnapshotTo(str(tmp_path / 'snap.db'), pages_per_step=2, progress=lambda *a: steps.append(a))
+    db.Close()
+    assert len(steps) > 1
+
+    # pick the snapshot back up in memory, nothing goes to the file until the next snapshot
+    cfg.write_text(ini.format(tmp_path / 'snap.db'))
+    db = Database(str(cfg), memory=True)
+    assert db.Person.IsValid
+    assert len(db.Person.GetAll()) == 500
+
+    db.Wallet.Add({'personid': 1, 'amount': 1.0})
+    db.Close()
+    assert len(Database(str(cfg)).Wallet.GetAll()) == 0
+
+
+def test_Memory_NoWriter(tmp_path):
+    cfg = tmp_path / 'mem.ini'
+    cfg.write_text(ini.format(':memory:').replace('foreign_keys = true', 'writer = server'))
+
+    with pytest.raises(ValueError):
+        Database(str(cfg))
+
+# endregion
+
+# region Backup Tests
+
+def test_Backup_WhileWriting(relDB, tmp_path):
+    for i in range(2000):
+        relDB.Wallet.Add({'personid': 3, 'amount': float(i)})
+
+    steps = []
+    job = relDB.Backup(str(tmp_path / 'backup.db'), pages_per_step=4, sleep=0, progress=lambda *a: steps.append(a))
+    relDB.Person.Add({'fname': 'Jill'})
+    assert job.Wait(10)
+
+    assert job.Pages == job.TotalPages > 0
+    assert job.PagesPerSecond > 0
+    assert steps[-1][0] == steps[-1][1]
+
+    copy = sqlite3.connect(tmp_path / 'backup.db')
+    assert copy.execute('Select count(*) From Wallet').fetchone()[0] == 2003
+
+
+def test_Backup_Vacuum(relDB, tmp_path):
+    relDB.Wallet.Delete('amount', ComparisonOps.GREATER, 0.0)
+    job = relDB.Backup(str(tmp_path / 'compact.db'), vacuum=True)
+    assert job.Wait(10)
+
+    copy = sqlite3.connect(tmp_path / 'compact.db')
+    assert copy.execute('Select count(*) From Wallet').fetchone()[0] == 0
+    assert copy.execute('Select count(*) From Person').fetchone()[0] == 3
+
+
+def test_Backup_Unwritable(relDB, tmp_path):
+    # the failure comes back from Wait rather than looking like the copy finished
+    for vacuum in [False, True]:
+        job = relDB.Backup(str(tmp_path / 'missing' / 'backup.db'), vacuum=vacuum)
+        with pytest.raises(sqlite3.OperationalError):
+            job.Wait(10)
+
+    def full(*args):
+        raise OSError(28, 'No space left on device')
+    job = relDB.Backup(str(tmp_path / 'full.db'), pages_per_step=1, progress=full)
+    with pytest.raises(OSError):
+        job.Wait(10)
+
+# endregion
+
+# region Change Log Tests
+
+def test_Changes_Feed(tmp_path):
+    cfg = tmp_path / 'cdc.ini'
+    cfg.write_text(ini.format(tmp_path / 'cdc.db').replace('foreign_keys = true', 'changes = true'))
+    db = Database(str(cfg))
+
+    db.Person.Add({'fname': 'Joe'})
+    db.Person.Add({'fname': 'June'})
+    db.Person.UpdateValue('fname', 'Jo', 'id', ComparisonOps.EQUALS, 1)
+    db.Person.Delete('id', ComparisonOps.EQUALS, 2)
+
+    # writes from outside the orm are caught by the triggers too
+    raw = sqlite3.connect(tmp_path / 'cdc.db')
+    raw.executemany('Insert into Wallet (personid, amount) values (?, ?)', [(1, 1.0), (1, 2.0)])
+    raw.commit()
+
+    changes = list(db.Changes(batch=2))
+    assert [(c.table, c.op, c.key) for c in changes] == [('Person', 'insert', 1), ('Person', 'insert', 2),
+                                                          ('Person', 'update', 1), ('Person', 'delete', 2),
+                                                          ('Wallet', 'insert', 1), ('Wallet', 'insert', 2)]
+    assert [c.key for c in db.Changes(since=changes[3].seq)] == [1, 2]
+
+    db.PruneChanges(changes[-1].seq)
+    assert list(db.Changes()) == []
+    db.Close()
+
+    # reopening leaves the log alone
+    db = Database(str(cfg))
+    assert db.Person.IsValid
+    db.Person.Add({'fname': 'Jack'})
+    assert [c.seq for c in db.Changes()] == [changes[-1].seq + 1]
+
+
+def test_Changes_SoftDelete(tmp_path):
+    cfg = tmp_path / 'cdc.ini'
+    cfg.write_text(ini.format(tmp_path / 'cdc.db').replace('foreign_keys = true', 'changes = true')
+                   .replace('amount = real', 'amount = real\nsoft_delete = true'))
+    db = Database(str(cfg))
+
+    db.Wallet.Add({'personid': 1, 'amount': 1.0})
+    db.Wallet.UpdateValue('amount', 2.0, 'id', ComparisonOps.EQUALS, 1)
+    db.Wallet.Delete('id', ComparisonOps.EQUALS, 1)
+    db.Wallet.Purge()
+
+    # the tombstone is the delete, purging it afterwards isn't another change
+    assert [(c.op, c.key) for c in db.Changes()] == [('insert', 1), ('update', 1), ('delete', 1)]
+
+# endregion
+
+# region Accessor Tests
+
+def test_Attributes_Bound(relDB):
+    # tables and columns are plain attributes, not found through __getattr__
+    assert vars(relDB)['Person'] is relDB._tables['Person']
+    assert vars(relDB.Wallet)['amount'] is relDB.Wallet._columns['amount']
+
+    with pytest.raises(ValueError):
+        relDB.Purse
+
+
+def test_WriteStub(relDB, tmp_path):
+    stub = tmp_path / 'relstub.py'
+    relDB.WriteStub(str(stub))
+    text = stub.read_text()
+
+    assert 'class WalletRow(typing.NamedTuple):\n    id: typing.Optional[int]\n    personid: typing.Optional[int]\n' \
+           '    amount: typing.Optional[float]\n' in text
+    assert 'class RelDatabase(Database):\n    Person: PersonTable\n    Wallet: WalletTable\n' in text
+
+    # and it's valid python
+    namespace = {}
+    exec(compile(text, str(stub), 'exec'), namespace)
+    assert namespace['WalletRow']._fields == ('id', 'personid', 'amount')
+
+# endregion
+
+# region Date Tests
+
+dates_ini = """
+[global]
+file = {0}
+foreign_keys = true
+
+[Person]
+id = integer, key
+fname = text, required
+birthday = {1}
+
+[Wallet]
+id = integer, key
+personid = integer, reference Person.id
+lastused = {2}
+"""
+
+
+def test_Dates_RoundTrip(tmp_path):
+    cfg = tmp_path / 'dates.ini'
+    cfg.write_text(dates_ini.format(tmp_path / 'dates.db', 'date, index', 'timestamp'))
+    db = Database(str(cfg))
+
+    for i, day in enumerate([datetime.date(1911, 11, 11), datetime.date(2001, 10, 1), datetime.date(2222, 2, 22)]):
+        db.Person.Add({'fname': f'P{i}', 'birthday': day})
+    db.Wallet.Add({'personid': 1, 'lastused': datetime.datetime(2024, 5, 1, 8, 30, tzinfo=datetime.timezone.utc)})
+    db.Wallet.Add({'personid': 2})
+
+    assert db.Person.GetAll()[0].birthday == datetime.date(1911, 11, 11)
+    assert [r.lastused for r in db.Wallet.GetAll()] == \
+           [datetime.datetime(2024, 5, 1, 8, 30, tzinfo=datetime.timezone.utc), None]
+
+    # range filters compare numbers, through the index
+    db.Person.Filter('birthday', ComparisonOps.GREATER, datetime.date(2000, 1, 1))
+    assert [r.fname for r in db.Person.Get(['fname'])] == ['P1', 'P2']
+    query, params = db.Person._hook_ApplyFilters(db.Person._hook_BuildBaseQuery('select', ['fname']), [])
+    plan = ' '.join(r[-1] for r in db._client.execute(f'Explain Query Plan {query}', params))
+    assert 'Person_birthday_idx' in plan
+
+    # the joined rows convert too
+    assert db.Join('Wallet', 'Person').Get(['birthday', 'lastused'])[0].birthday == datetime.date(1911, 11, 11)
+
+
+def test_Dates_SyncFromText(tmp_path):
+    cfg = tmp_path / 'dates.ini'
+    cfg.write_text(dates_ini.format(tmp_path / 'dates.db', 'text', 'text'))
+    db = Database(str(cfg))
+    db.Person.Add({'fname': 'Joe', 'birthday': '1911-11-11'})
+    db.Wallet.Add({'personid': 1, 'lastused': '2024-05-01 08:30:00.5'})
+    db.Close()
+
+    # switch the columns over, opening the database converts what's there
+    cfg.write_text(dates_ini.format(tmp_path / 'dates.db', 'date, index', 'timestamp'))
+    db = Database(str(cfg))
+    assert db.Person.IsValid and db.Wallet.IsValid
+    assert db.Person.GetAll()[0].birthday == datetime.date(1911, 11, 11)
+    assert db.Wallet.GetAll()[0].lastused == datetime.datetime(2024, 5, 1, 8, 30, 0, 500000,
+                                                                    tzinfo=datetime.timezone.utc)
+    assert db._client.execute('Select typeof(birthday) From Person').fetchone()[0] == 'integer'
+    assert db._client.execute('PRAGMA foreign_key_check').fetchall() == []
+    db.Close()
+
+    # and after that it's in sync
+    db = Database(str(cfg))
+    assert db.Person.IsValid and db.Wallet.IsValid
+
+# endregion
+
+# region Table Option Tests
+
+def test_TableOptions_Reopen(tmp_path):
+    cfg = tmp_path / 'opts.ini'
+    text = ini.format(tmp_path / 'opts.db') + 'strict = true\n'
+    cfg.write_text(text)
+    db = Database(str(cfg))
+    db.Person.Add({'fname': 'Joe'})
+    db.Wallet.Add({'personid': 1, 'amount': 1.0})
+    db.Close()
+
+    db = Database(str(cfg))
+    assert db.Wallet.IsValid
+    db.Close()
+
+    # dropping the option is picked up, and syncing rebuilds the table without it
+    cfg.write_text(text.replace('strict = true\n', 'without_rowid = true\n'))
+    db = Database(str(cfg))
+    assert db.Wallet.IsValid
+    sql = db._client.execute("Select sql From sqlite_master Where name = 'Wallet'").fetchone()[0]
+    assert sql.endswith('Without Rowid') and 'Strict' not in sql
+    assert db.Wallet.GetAll()[0].amount == 1.0
+
+# endregion
+
+# region Query Plan Tests
+
+def test_Explain(relDB):
+    relDB.Wallet.Filter('personid', ComparisonOps.EQUALS, 1)
+    plan = relDB.Wallet.Explain(['amount'])
+    assert len(plan) == 1 and 'USING INDEX Wallet_personid_fk' in plan[0]
+    relDB.Wallet.ClearFilters()
+
+    assert relDB.Wallet.Explain() == ['SCAN Wallet']
+
+
+def test_SlowQueryLog(tmp_path):
+    cfg = tmp_path / 'slow.ini'
+    # a threshold of 0 logs everything
+    slow = f'slow_query_ms = 0\nslow_query_log = {tmp_path / "slow.log"}'
+    cfg.write_text(ini.format(tmp_path / 'slow.db').replace('foreign_keys = true', slow))
+    db = Database(str(cfg))
+    db.Person.Load([{'fname': f'p{i}'} for i in range(100)])
+    db.Wallet.Filter('personid', ComparisonOps.EQUALS, 3)
+    db.Wallet.GetAll()
+
+    get = db.SlowQueries[-1]
+    assert get.sql.startswith('Select id, personid, amount From Wallet Where')
+    assert get.params == '1 params'
+    assert 'USING INDEX Wallet_personid_fk' in get.plan[0]
+    assert any(q.params == 'many, 100 rows' for q in db.SlowQueries)
+
+    with open(tmp_path / 'slow.log') as f:
+        logged = [json.loads(line) for line in f]
+    assert logged[-1]['sql'] == get.sql
+    db.Close()
+
+    # off unless there's a threshold
+    cfg.write_text(ini.format(tmp_path / 'slow.db'))
+    db = Database(str(cfg))
+    db.Person.GetAll()
+    assert db.SlowQueries == []
+    db.Close()
+
+# endregion
+
+# region Maintenance Tests
+
+def test_Maintenance_WhenIdle(tmp_path):
+    cfg = tmp_path / 'maint.ini'
+    maint = 'maintenance = true\nmaintenance_idle_ms = 100\nmaintenance_writes = 50'
+    cfg.write_text(ini.format(tmp_path / 'maint.db').replace('foreign_keys = true', maint))
+    db = Database(str(cfg))
+    db._client.execute('PRAGMA journal_mode = WAL')
+
+    db.Person.Load([{'fname': f'p{i}'} for i in range(100)])
+    db.Wallet.Add({'personid': 1, 'amount': 1.0})
+
+    deadline = time.monotonic() + 5
+    while len(db.Maintenance.History) < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    # only the table with enough writes is analyzed
+    assert [(r.task, r.table) for r in db.Maintenance.History] == [('analyze', 'Person'), ('optimize', None),
+                                                                   ('checkpoint', None)]
+    assert db._client.execute("Select tbl From sqlite_stat1").fetchall() == [('Person',)]
+    assert all([r.error is None for r in db.Maintenance.History])
+
+    # a failed task is recorded rather than ending the thread, and is due again next time
+    db._client.execute('Drop Table Wallet')
+    db.Wallet.Writes += 100
+    deadline = time.monotonic() + 5
+    while len(db.Maintenance.History) < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    failed = db.Maintenance.History[3]
+    assert (failed.task, failed.table) == ('analyze', 'Wallet')
+    assert isinstance(failed.error, sqlite3.OperationalError)
+    db.Wallet.Writes += 1
+
+    def retried():
+        return [r for r in list(db.Maintenance.History)[4:] if r.table == 'Wallet']
+    while len(retried()) == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert retried()[0].task == 'analyze'
+    db.Close()
+
+# endregion
+
+# region Checkpoint Tests
+
+def test_Checkpoint_Modes(tmp_path):
+    cfg = tmp_path / 'wal.ini'
+    cfg.write_text(ini.format(tmp_path / 'wal.db').replace('foreign_keys = true', 'wal_autocheckpoint = 0'))
+    db = Database(str(cfg))
+    assert db._client.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    db.Person.Load([{'fname': f'p{i}'} for i in range(1000)])
+    passive = db.Checkpoint()
+    assert not passive.busy and passive.frames > 0 and passive.checkpointed == passive.frames
+
+    # a truncate leaves the log empty
+    assert db.Checkpoint(CheckpointModes.TRUNCATE).frames == 0
+    assert (tmp_path / 'wal.db-wal').stat().st_size == 0
+    db.Close()
+
+
+def test_WalPolicy_BehindReader(tmp_path):
+    cfg = tmp_path / 'wal.ini'
+    policy = 'wal_autocheckpoint = 0\nwal_checkpoint_mb = 0.05\nwal_limit_mb = 100\nwal_check_ms = 20'
+    cfg.write_text(ini.format(tmp_path / 'wal.db').replace('foreign_keys = true', policy))
+    db = Database(str(cfg))
+
+    # a reader part way through keeps the log from being truncated
+    reader = sqlite3.connect(tmp_path / 'wal.db', isolation_level=None)
+    reader.execute('Begin')
+    reader.execute('Select count(*) From Person').fetchone()
+
+    db.Person.Load([{'fname': 'x' * 100} for i in range(2000)])
+    deadline = time.monotonic() + 5
+    while db.WalPolicy.Checkpoints == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert db.WalPolicy.Last.mode == CheckpointModes.PASSIVE
+    assert db.WalPolicy.WalBytes > 0
+
+    # once it's done the next check truncates
+    reader.execute('Commit')
+    while db.WalPolicy.Last.mode != CheckpointModes.TRUNCATE and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert db.WalPolicy.Last.mode == CheckpointModes.TRUNCATE
+    assert db.WalPolicy.Frames > 0 and db.WalPolicy.Seconds > 0
+    assert (tmp_path / 'wal.db-wal').stat().st_size == 0
+    db.Close()
+
+# endregion
+
+# region Soft Delete and Partition Tests
+
+def test_SoftDelete(relDB, tmp_path):
+    cfg = tmp_path / 'rel.ini'
+    relDB.Close()
+
+    # turning it on rebuilds the table with the tombstone
+    cfg.write_text(ini.format(tmp_path / 'rel.db').replace('amount = real', 'amount = real\nsoft_delete = true'))
+    db = Database(str(cfg))
+    assert '_deleted' in [r[1] for r in db._client.execute('PRAGMA table_info(Wallet)')]
+    assert Database(str(cfg)).Wallet.IsValid
+
+    db.Wallet.Delete('amount', ComparisonOps.EQUALS, 11.0)
+    assert [w.amount for w in db.Wallet.GetAll()] == [10.0, 20.0]
+    assert db._client.execute('Select count(*) From Wallet').fetchone()[0] == 3
+
+    # hidden from the related rows and the joins too
+    rows, related = db.Person.Get(['id'], include=['Wallet'])
+    assert [w.amount for w in related['Wallet'][1]] == [10.0]
+    assert [(p.Person_fname, p.Wallet_amount) for p in db.Join(db.Person, db.Wallet).GetAll()] == \
+        [('Joe', 10.0), ('June', 20.0), ('Jack', None)]
+
+    db.Wallet.Delete()
+    assert db.Wallet.GetAll() == []
+    db.Wallet.Purge(datetime.datetime(2000, 1, 1))
+    assert db._client.execute('Select count(*) From Wallet').fetchone()[0] == 3
+    db.Wallet.Purge()
+    assert db._client.execute('Select count(*) From Wallet').fetchone()[0] == 0
+    db.Close()
+
+
+partition_ini = """
+[global]
+file = {0}
+changes = true
+
+[Event]
+id = integer, key
+at = date, index
+what = text
+partition = at, month
+"""
+
+
+def test_Partitions(tmp_path):
+    cfg = tmp_path / 'part.ini'
+    cfg.write_text(partition_ini.format(tmp_path / 'part.db'))
+    db = Database(str(cfg))
+    assert db.Event.GetAll() == []
+
+    db.Event.Add({'at': datetime.date(2024, 1, 5), 'what': 'a'})
+    db.Event.Add({'at': datetime.date(2024, 2, 5), 'what': 'b'})
+    db.Event.Load([{'at': datetime.date(2024, m, 9), 'what': f'l{m}'} for m in [1, 2, 3]])
+    assert db.Event.Partitions == ['Event_202401', 'Event_202402', 'Event_202403']
+    assert 'Event_202403_at_idx' in [r[1] for r in db._client.execute('PRAGMA index_list(Event_202403)')]
+
+    # the keys are shared across the partitions
+    assert sorted([(e.id, e.what) for e in db.Event.GetAll()]) == [(1, 'a'), (2, 'b'), (3, 'l1'), (4, 'l2'), (5, 'l3')]
+
+    db.Event.Filter('at', ComparisonOps.LESSER, datetime.date(2024, 2, 1))
+    assert [e.what for e in db.Event.GetAll()] == ['a', 'l1']
+    db.Event.ClearFilters()
+
+    db.Event.UpdateValue('what', 'z', 'id', ComparisonOps.EQUALS, 4)
+    db.Event.Delete('what', ComparisonOps.EQUALS, 'b')
+    assert sorted([e.what for e in db.Event.GetAll()]) == ['a', 'l1', 'l3', 'z']
+    with pytest.raises(ValueError):
+        db.Event.UpdateValue('at', datetime.date(2024, 5, 1))
+    assert [(c.table, c.op) for c in db.Changes()][-2:] == [('Event', 'update'), ('Event', 'delete')]
+
+    # another connection sees the same table
+    other = Database(str(cfg))
+    assert len(other.Event.GetAll()) == 4
+
+    # only whole months before the date are dropped
+    assert db.Event.DropPartitions(datetime.date(2024, 2, 20)) == ['Event_202401']
+    assert sorted([e.what for e in other.Event.GetAll()]) == ['l3', 'z']
+    db.Event.Add({'at': datetime.date(2024, 3, 1), 'what': 'c'})
+    assert max([e.id for e in other.Event.GetAll()]) == 6
+    other.Close()
+    db.Close()
+
+
+def test_Partitions_Joined(tmp_path):
+    cfg = tmp_path / 'part.ini'
+    cfg.write_text(partition_ini.format(tmp_path / 'part.db').replace('what = text', 'what = text\nwho = integer') +
+                   '\n[Person]\nid = integer, key\nfname = text\n')
+    db = Database(str(cfg))
+    for name in ['Joe', 'June']:
+        db.Person.Add({'fname': name})
+    db.Event.Add({'at': datetime.date(2024, 1, 5), 'what': 'a', 'who': 1})
+    db.Event.Add({'at': datetime.date(2024, 1, 6), 'what': 'b', 'who': 2})
+
+    joined = db.Join('Event', 'Person', ('who', 'id'))
+    assert len(joined.Get(['what'])) == 2
+
+    # a partition made on another connection is picked up, even by a statement the join already has
+    other = Database(str(cfg))
+    other.Event.Add({'at': datetime.date(2024, 2, 5), 'what': 'c', 'who': 1})
+    other.Close()
+    assert sorted([r.what for r in joined.Get(['what'])]) == ['a', 'b', 'c']
+
+    # the writes go to each partition, the join just picks the rows
+    joined.UpdateValue('what', 'x', 'fname', ComparisonOps.EQUALS, 'June')
+    joined.Filter('fname', ComparisonOps.EQUALS, 'Joe')
+    joined.Delete()
+    joined.ClearFilters()
+    assert joined.Get(['what', 'fname']) == [('x', 'June')]
+    db.Close()
+
+
+shard_ini = """
+[global]
+file = {0}
+
+[Reading]
+id = integer, key
+sensor = text, index
+value = real
+shards = {1}, {2}, {3}
+"""
+
+
+def test_Shards(tmp_path):
+    cfg = tmp_path / 'shard.ini'
+    cfg.write_text(shard_ini.format(*[tmp_path / f'shard{n}.db' for n in ['', 0, 1, 2]]))
+    db = Database(str(cfg))
+    assert db.Reading.Partitions == ['Reading_shard0.Reading', 'Reading_shard1.Reading', 'Reading_shard2.Reading']
+
+    # the rows go to the shard for their key, round robin for integers
+    for i in range(6):
+        db.Reading.Add({'sensor': f's{i}', 'value': float(i)})
+    assert db.Reading.Load([{'sensor': 'bulk', 'value': float(i)} for i in range(300)]) == 300
+    for n in range(3):
+        shard = sqlite3.connect(tmp_path / f'shard{n}.db')
+        assert shard.execute('Select count(*) From Reading Where id % 3 = ?', [n]).fetchone()[0] == 102
+        assert shard.execute('Select count(*) From Reading').fetchone()[0] == 102
+        assert 'Reading_sensor_idx' in [r[1] for r in shard.execute('PRAGMA index_list(Reading)')]
+        shard.close()
+
+    # the scans are merged from all of them, and the keys carry on
+    assert len(db.Reading.GetAll()) == 306
+    db.Reading.Filter('sensor', ComparisonOps.LIKE, 's%')
+    assert sorted([(r.id, r.value) for r in db.Reading.GetAll()]) == [(i + 1, float(i)) for i in range(6)]
+    db.Reading.ClearFilters()
+
+    db.Reading.UpdateValue('value', -1.0, 'id', ComparisonOps.IN, [1, 2, 3])
+    db.Reading.Delete('sensor', ComparisonOps.EQUALS, 'bulk')
+    assert sorted([r.value for r in db.Reading.GetAll()]) == [-1.0, -1.0, -1.0, 3.0, 4.0, 5.0]
+    db.Close()
+
+    db = Database(str(cfg))
+    db.Reading.Add({'sensor': 'later'})
+    assert max([r.id for r in db.Reading.GetAll()]) == 307
+    db.Close()
+
+    # a read-only snapshot can't write to the shards either, even around the orm
+    db = Database(str(cfg), readonly=True)
+    assert len(db.Reading.GetAll()) == 7
+    with pytest.raises(sqlite3.OperationalError):
+        db._client.execute('Delete From Reading_shard0.Reading')
+    db.Close()
+
+# endregion
@@ -0,0 +1,74 @@
+import configparser
+import sqlite3
+
+import pytest
+
+from Tables import Table
+from Definitions import ComparisonOps
+import Parallel
+
+ini = """
+[Reading]
+id = integer, key
+sensor = integer, required
+value = real
+parallel_workers = 3
+parallel_min_rows = {0}
+"""
+
+
+def buildTable(tmp_path, min_rows: int) -> Table:
+    con = sqlite3.connect(tmp_path / 'scan.db')
+    con.execute('Create Table Reading (id integer primary key, sensor integer not null, value real)')
+    con.executemany('Insert into Reading (sensor, value) values (?, ?)', [(i % 7, i * 0.5) for i in range(5000)])
+    con.commit()
+
+    cp = configparser.ConfigParser()
+    cp.read_string(ini.format(min_rows))
+    return Table(cp['Reading'], con)
+
+
+def test_Ranges():
+    assert Parallel.Ranges(1, 10, 3) == [(1, 5), (5, 9), (9, 11)]
+    assert Parallel.Ranges(5, 5, 4) == [(5, 6)]
+
+
+def test_ParallelGet_MatchesSerial(tmp_path):
+    t = buildTable(tmp_path, 1000)
+    t.Filter('sensor', ComparisonOps.EQUALS, 3)
+
+    assert len(t._parallelPlan(None)[1]) == 12
+    data = t.ParallelGet(['id', 'value'])
+
+    assert data == t.Get(['id', 'value'])
+    assert len(data) == 714
+    assert data[0].id == 4
+
+
+def test_ParallelAggregate(tmp_path):
+    t = buildTable(tmp_path, 1000)
+    t.Filter('sensor', ComparisonOps.LESSER, 2)
+
+    assert t._parallelPlan(None) is not None
+    assert t.ParallelAggregate('count', 'value') == 1430
+    assert t.ParallelAggregate('min', 'value') == 0.0
+    assert t.ParallelAggregate('max', 'value') == 2499.5
+    assert t.ParallelAggregate('sum', 'value') == pytest.approx(sum(r.value for r in t.Get(['value'])))
+    assert t.ParallelAggregate('AVG', 'value') == pytest.approx(t.ParallelAggregate('sum', 'value') / 1430)
+
+
+def test_SmallTable_Serial(tmp_path):
+    t = buildTable(tmp_path, 1000000)
+
+    assert t._parallelPlan(None) is None
+    assert t.ParallelAggregate('count', 'id') == 5000
+
+
+def test_StatEstimate(tmp_path):
+    t = buildTable(tmp_path, 1000)
+    t._client.execute('Analyze')
+    t._client.execute("Update sqlite_stat1 Set stat = '10' Where tbl = 'Reading'")
+    t._client.commit()
+
+    # the stats claim the table is tiny, so it stays serial
+    assert t._parallelPlan(None) is None
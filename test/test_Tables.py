@@ -1,4 +1,8 @@
 
+import datetime
+import gzip
+import io
+
 # grab the setup for the DB from here
 from Fixtures import *
 
@@ -95,6 +99,20 @@ def test_Get_DNE_Column(config, buildDBFile):
         data = t.Get(["id, name, lname"])
 
 
+def test_Get_RowAttributes(config, buildDBFile):
+    t = Table(config["Person"], buildDBFile)
+    data = t.GetAll()
+
+    assert data[0].fname == "Joe"
+    assert data[0].lname == "Smith"
+    assert data[0].birthday == data[0][4]
+
+    data = t.Get(["lname", "id"])
+    assert data[1].lname == "Smith"
+    assert data[1].id == 2
+    assert data[1] == ("Smith", 2)
+
+
 # endregion
 
 # region Filter Tests
@@ -716,4 +734,343 @@ def test_BuildSQL(config, buildDBFile):
 
     assert tsql.lower() == actual.lower()
 
-# endregion
\ No newline at end of file
+# endregion
+# region Full Text Tests
+
+fts_ini = """
+[Note]
+id = integer, key
+title = text, required, fulltext
+body = text, fulltext
+author = text
+"""
+
+
+def noteTable(con, ini=fts_ini, toks=None):
+    cp = configparser.ConfigParser()
+    cp.read_string(ini)
+    return Table(cp['Note'], con, toks if toks is not None else {})
+
+
+def test_Search_Ranked(tmp_path):
+    con = sqlite3.connect(tmp_path / 'fts.db')
+    t = noteTable(con)
+    t.Create()
+
+    t.Add({'title': 'sqlite tips', 'body': 'indexes make sqlite fast, sqlite sqlite', 'author': 'ann'})
+    t.Add({'title': 'gardening', 'body': 'tomatoes like sun', 'author': 'bob'})
+    t.Add({'title': 'more sqlite', 'body': 'fts5 is built in', 'author': 'bob'})
+
+    assert [r.id for r in t.Search('sqlite')] == [1, 3]
+    assert [r.title for r in t.Search('sqlite', ['title'], limit=1)] == ['sqlite tips']
+
+    t.Filter('author', ComparisonOps.EQUALS, 'bob')
+    assert [r.id for r in t.Search('sqlite')] == [3]
+    t.ClearFilters()
+
+    # the triggers keep the index in step with the table
+    t.UpdateValue('body', 'tomatoes and sqlite', 'id', ComparisonOps.EQUALS, 2)
+    t.Delete('id', ComparisonOps.EQUALS, 1)
+    assert sorted(r.id for r in t.Search('sqlite')) == [2, 3]
+
+
+def test_Filter_Match(tmp_path):
+    con = sqlite3.connect(tmp_path / 'fts.db')
+    t = noteTable(con)
+    t.Create()
+    t.Add({'title': 'tomato soup', 'body': 'with basil'})
+    t.Add({'title': 'basil pesto', 'body': 'with pine nuts'})
+
+    t.Filter('title', ComparisonOps.MATCH, 'basil')
+    assert [r.id for r in t.GetAll()] == [2]
+    t.ClearFilters()
+
+    with pytest.raises(Errors.InvalidOperation):
+        t.Filter('author', ComparisonOps.MATCH, 'ann')
+
+
+def test_FullText_Sync(tmp_path):
+    con = sqlite3.connect(tmp_path / 'fts.db')
+    con.execute('Create Table Note (id integer primary key, title text not null, body text, author text)')
+    con.execute("Insert into Note (title, body) values ('old note', 'written before the index')")
+    con.commit()
+
+    def toks():
+        # the table uses up the tokens as it checks them
+        return {'id': ['integer', 'primarykey'], 'title': ['text', 'not null'], 'body': ['text'], 'author': ['text']}
+    t = noteTable(con, toks=toks())
+    assert not t.IsValid
+
+    # building the index picks up the rows already there
+    t.Sync()
+    assert t.IsValid
+    assert [r.id for r in t.Search('index')] == [1]
+    assert noteTable(con, toks=toks()).IsValid
+
+# endregion
+
+# region In List Tests
+
+def test_Filter_InList(config, buildDBFile):
+    t = Table(config["Person"], buildDBFile)
+
+    t.Filter('fname', ComparisonOps.IN, ['Joe', 'Jack', 'Nobody'])
+    assert sorted(r.fname for r in t.Get(['fname'])) == ['Jack', 'Joe']
+    t.ClearFilters()
+
+    # lists are padded out to a power of two, so these share a statement
+    q3, p3 = t._hook_InLineFilter('Select id From Person', [], 'id', ComparisonOps.IN, [1, 2, 3])
+    q4, p4 = t._hook_InLineFilter('Select id From Person', [], 'id', ComparisonOps.IN, [1, 2, 3, 4])
+    assert q3 == q4
+    assert p3 == [1, 2, 3, 3]
+
+    t.Filter('id', ComparisonOps.IN, [])
+    assert t.GetAll() == []
+    t.ClearFilters()
+
+    with pytest.raises(Errors.InvalidColumnValue):
+        t.Filter('id', ComparisonOps.IN, [1, 'two'])
+
+
+def test_Filter_LargeInList(tmp_path):
+    con = sqlite3.connect(tmp_path / 'devices.db')
+    cp = configparser.ConfigParser()
+    cp.read_string("[Device]\nid = integer, key\nserial = text\n")
+    t = Table(cp['Device'], con)
+    t.Create()
+    con.executemany('Insert into Device (serial) values (?)', [(f'sn{i}',) for i in range(100000)])
+
+    # well past sqlite's variable limit, goes in as one json parameter
+    wanted = list(range(2, 100001, 2))
+    t.Filter('id', ComparisonOps.IN, wanted)
+    query, params = t._hook_ApplyFilters('Select id From Device', [])
+    assert len(params) == 1
+
+    assert [r.id for r in t.Get(['id'])] == wanted
+
+
+def test_Filter_LargeBlobInList(tmp_path):
+    t = sampleTable(sqlite3.connect(tmp_path / 'source.db'))
+    t.Load([{'label': f's{i}', 'raw': i.to_bytes(2, 'big')} for i in range(1000)])
+
+    # json can't hold the blobs, so the list is padded out to a multiple of the placeholder limit instead
+    wanted = [i.to_bytes(2, 'big') for i in range(0, 1000, 3)]
+    t.Filter('raw', ComparisonOps.IN, wanted)
+    query, params = t._hook_ApplyFilters('Select id From Sample', [])
+    assert len(params) == 512
+    assert [r.raw for r in t.Get(['raw'])] == wanted
+    t.ClearFilters()
+
+    # more than sqlite can take is refused up front
+    t._client.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 1000)
+    with pytest.raises(Errors.InvalidColumnValue):
+        t.Filter('raw', ComparisonOps.IN, wanted * 4)
+
+# endregion
+
+# region Table Option Tests
+
+options_ini = """
+[Reading]
+device = integer, key
+taken = datetime, key
+value = real, required
+strict = true
+without_rowid = true
+"""
+
+
+def test_BuildSQL_Options():
+    cp = configparser.ConfigParser()
+    cp.read_string(options_ini)
+    t = Table(cp['Reading'], sqlite3.connect(':memory:'))
+
+    assert t.Build_SQL() == 'Create Table Reading (device integer Not Null, taken integer Not Null, value real Not ' \
+                            'Null, Primary Key (device, taken)) Without Rowid, Strict;'
+
+
+def test_Strict_WithoutRowid(tmp_path):
+    con = sqlite3.connect(tmp_path / 'options.db')
+    cp = configparser.ConfigParser()
+    cp.read_string(options_ini)
+    t = Table(cp['Reading'], con)
+    t.Create()
+
+    t.Add({'device': 1, 'taken': datetime.datetime(2024, 1, 1), 'value': 1.5})
+    t.Add({'device': 1, 'taken': datetime.datetime(2024, 1, 2), 'value': 2.5})
+    assert [r.value for r in t.GetAll()] == [1.5, 2.5]
+    assert t.GetAll()[1].taken == datetime.datetime(2024, 1, 2)
+
+    # the types are left for sqlite to check
+    with pytest.raises(sqlite3.IntegrityError):
+        t.Add({'device': 'one', 'taken': datetime.datetime(2024, 1, 3), 'value': 1.0})
+
+    # except for the dates, which are converted before sqlite sees them
+    for taken in ['garbage', datetime.date(2024, 1, 3)]:
+        with pytest.raises(Errors.InvalidColumnValue):
+            t.Add({'device': 2, 'taken': taken, 'value': 1.0})
+
+    t.Filter('device', ComparisonOps.EQUALS, 1)
+    assert t.ParallelAggregate('sum', 'value') == 4.0
+    t.ClearFilters()
+# endregion
+
+# region Load Tests
+
+load_ini = """
+[Owner]
+id = integer, key
+name = text
+
+[Device]
+id = integer, key
+owner = integer, reference Owner.id
+serial = text, required
+installed = date
+"""
+
+
+def loadTables(tmp_path):
+    con = sqlite3.connect(tmp_path / 'load.db')
+    con.execute('PRAGMA foreign_keys = ON')
+    cp = configparser.ConfigParser()
+    cp.read_string(load_ini)
+    owner, device = Table(cp['Owner'], con), Table(cp['Device'], con)
+    owner.Create()
+    device.Create()
+    return con, owner, device
+
+
+def test_Load_Checked(tmp_path):
+    con, owner, device = loadTables(tmp_path)
+    owner.Add({'name': 'ann'})
+
+    rows = ({'owner': 1, 'serial': f'sn{i}', 'installed': datetime.date(2024, 1, 1 + i % 28)} for i in range(1000))
+    assert device.Load(rows) == 1000
+    assert len(device.GetAll()) == 1000
+    assert device.GetAll()[3].installed == datetime.date(2024, 1, 4)
+
+    # one bad value and none of the rows go in
+    with pytest.raises(Errors.InvalidColumnValue):
+        device.Load([{'owner': 1, 'serial': 'good'}, {'owner': 'one', 'serial': 'bad'}])
+    with pytest.raises(Errors.ImaginaryColumn):
+        device.Load([{'owner': 1, 'serail': 'typo'}])
+    assert len(device.GetAll()) == 1000
+
+
+def test_Load_Trusted(tmp_path):
+    con, owner, device = loadTables(tmp_path)
+    journal = con.execute('PRAGMA journal_mode').fetchone()[0]
+
+    # the owners aren't there yet, the foreign keys are off for the load
+    rows = ({'id': i, 'owner': i % 10, 'serial': f'sn{i}', 'installed': datetime.date(2024, 2, 1)}
+            for i in range(1, 10001))
+    assert device.Load(rows, trusted=True) == 10000
+    assert device.GetAll()[-1] == (10000, 0, 'sn10000', datetime.date(2024, 2, 1))
+
+    # the settings are back, the index rebuilt and the table analyzed
+    assert con.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+    assert con.execute('PRAGMA journal_mode').fetchone()[0] == journal
+    assert con.execute('PRAGMA synchronous').fetchone()[0] == 2
+    assert 'Device_owner_fk' in [r[1] for r in con.execute('PRAGMA index_list(Device)')]
+    assert con.execute("Select count(*) From sqlite_stat1 Where tbl = 'Device'").fetchone()[0] > 0
+
+    # a failed load leaves the indexes alone as well as the rows
+    with pytest.raises(sqlite3.IntegrityError):
+        device.Load([{'id': 1, 'owner': 1, 'serial': 'dup'}], trusted=True)
+    assert 'Device_owner_fk' in [r[1] for r in con.execute('PRAGMA index_list(Device)')]
+    assert len(device.GetAll()) == 10000
+
+# endregion
+
+# region Import and Export Tests
+
+transfer_ini = """
+[Sample]
+id = integer, key
+label = text
+weight = real
+taken = date
+raw = blob
+"""
+
+
+def sampleTable(con):
+    cp = configparser.ConfigParser()
+    cp.read_string(transfer_ini)
+    t = Table(cp['Sample'], con)
+    t.Create()
+    return t
+
+
+def test_CSV_RoundTrip(tmp_path):
+    source = sampleTable(sqlite3.connect(tmp_path / 'source.db'))
+    source.Load([{'label': f's{i}', 'weight': i / 4, 'taken': datetime.date(2024, 3, 1 + i % 30),
+                  'raw': bytes([i % 256])} for i in range(2500)])
+    source.Add({'label': '', 'weight': None, 'raw': b'\xff'})
+
+    stats = source.ExportCSV(tmp_path / 'samples.csv.gz', chunk_size=1000)
+    assert stats.rows == 2501
+    assert stats.RowsPerSecond > 0
+    with gzip.open(tmp_path / 'samples.csv.gz', 'rt') as f:
+        assert f.readline().strip() == 'id,label,weight,taken,raw'
+        assert f.readline().strip() == '1,s0,0.0,2024-03-01,00'
+
+    dest = sampleTable(sqlite3.connect(tmp_path / 'dest.db'))
+    assert dest.ImportCSV(tmp_path / 'samples.csv.gz', chunk_size=1000).rows == 2501
+    assert dest.GetAll() == source.GetAll()
+
+
+def test_JSONL_Streams(tmp_path):
+    source = sampleTable(sqlite3.connect(tmp_path / 'source.db'))
+    source.Load([{'label': f's{i}', 'weight': float(i), 'taken': datetime.date(2024, 1, 1)} for i in range(10)])
+
+    source.Filter('weight', ComparisonOps.GREATER, 6.0)
+    with gzip.open(tmp_path / 'samples.jsonl.gz', 'wb') as f:
+        assert source.ExportJSONL(f, ['label', 'taken']).rows == 3
+    with gzip.open(tmp_path / 'samples.jsonl.gz', 'rt') as f:
+        assert f.readline().strip() == '{"label": "s7", "taken": "2024-01-01"}'
+
+    dest = sampleTable(sqlite3.connect(tmp_path / 'dest.db'))
+    with gzip.open(tmp_path / 'samples.jsonl.gz', 'rb') as f:
+        dest.ImportJSONL(f)
+    assert [(r.label, r.taken) for r in dest.GetAll()] == [('s7', datetime.date(2024, 1, 1)),
+                                                            ('s8', datetime.date(2024, 1, 1)),
+                                                            ('s9', datetime.date(2024, 1, 1))]
+
+    with pytest.raises(Errors.ImaginaryColumn):
+        dest.ImportJSONL(io.StringIO('{"labl": "typo"}\n'))
+
+# endregion
+
+# region Arrow Tests
+
+def test_ToArrow(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    t = sampleTable(sqlite3.connect(tmp_path / 'source.db'))
+    t.Load([{'label': f's{i}', 'weight': i / 2, 'taken': datetime.date(2024, 5, 1 + i % 10)} for i in range(100)])
+
+    data = t.ToArrow(['id', 'label', 'taken'], [('weight', ComparisonOps.GRorEQ, 45.0)], chunk_size=4)
+    assert data.schema.field('taken').type == pa.date32()
+    assert data.num_rows == 10
+    assert data.column('taken').to_pylist()[:2] == [datetime.date(2024, 5, 1), datetime.date(2024, 5, 2)]
+
+    # the extra filters were only for the one read
+    assert t.ToArrow().num_rows == 100
+
+
+def test_Parquet_RoundTrip(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    source = sampleTable(sqlite3.connect(tmp_path / 'source.db'))
+    source.Load([{'label': f's{i}', 'weight': i / 2, 'taken': datetime.date(2024, 5, 1), 'raw': b'\x00\x01'}
+                 for i in range(1000)])
+    source.Add({'label': None})
+
+    assert source.ExportParquet(tmp_path / 'samples.parquet', chunk_size=256).rows == 1001
+    assert pq.ParquetFile(tmp_path / 'samples.parquet').num_row_groups == 4
+
+    dest = sampleTable(sqlite3.connect(tmp_path / 'dest.db'))
+    assert dest.FromArrow(pq.read_table(tmp_path / 'samples.parquet')).rows == 1001
+    assert dest.GetAll() == source.GetAll()
+
+# endregion
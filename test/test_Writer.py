@@ -0,0 +1,274 @@
+import multiprocessing
+import sqlite3
+import threading
+
+import pytest
+
+from Database import Database
+from Definitions import CheckpointModes
+from Writer import BatchWriter, WriteServer
+import Errors
+
+ini = """
+[global]
+file = {0}
+writer = {1}
+writer_address = {2}
+writer_key = {3}
+writer_latency_ms = 20
+
+[Event]
+id = integer, key
+source = integer, required
+code = text, unique
+"""
+
+
+def writeConfig(tmp_path, mode: str, key: str = 'secret') -> str:
+    cfg = tmp_path / f'{mode}.ini'
+    cfg.write_text(ini.format(tmp_path / 'writer.db', mode, tmp_path / 'writer.sock', key))
+    return str(cfg)
+
+
+def addEvents(cfg: str, source: int, count: int):
+    db = Database(cfg)
+    for i in range(count):
+        db.Event.Add({'source': source, 'code': f'{source}-{i}'})
+    db.Close()
+
+
+# region BatchWriter Tests
+
+def test_BatchWriter_Groups(tmp_path):
+    path = str(tmp_path / 'batch.db')
+    con = sqlite3.connect(path)
+    con.execute('Create Table Event (id integer primary key, source integer)')
+    con.commit()
+
+    bw = BatchWriter(path, max_batch=100, max_latency=0.05)
+
+    def work(source):
+        for _ in range(20):
+            bw.Write('Insert into Event (source) values (?)', [source])
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    bw.Close()
+
+    assert con.execute('Select count(*) From Event').fetchone()[0] == 160
+    assert bw.Writes == 160
+    assert bw.Batches < 160
+
+
+def test_BatchWriter_FailureIsolated(tmp_path):
+    path = str(tmp_path / 'batch.db')
+    con = sqlite3.connect(path)
+    con.execute('Create Table Event (id integer primary key, code text unique)')
+    con.commit()
+
+    bw = BatchWriter(path, max_latency=0.05)
+    bw.Write('Insert into Event (code) values (?)', ['a'], wait=False)
+    with pytest.raises(sqlite3.IntegrityError):
+        bw.Write('Insert into Event (code) values (?)', ['a'])
+    bw.Write('Insert into Event (code) values (?)', [['b'], ['c']], many=True)
+    bw.Close()
+
+    assert [r[0] for r in con.execute('Select code From Event Order By code')] == ['a', 'b', 'c']
+
+
+def test_BatchWriter_OtherErrors(tmp_path):
+    path = str(tmp_path / 'batch.db')
+    con = sqlite3.connect(path)
+    con.execute('Create Table Event (id integer primary key, code integer)')
+    con.commit()
+
+    # sqlite can't bind it, that only fails the one write and the thread carries on
+    bw = BatchWriter(path, max_latency=0.05)
+    with pytest.raises(OverflowError):
+        bw.Write('Insert into Event (code) values (?)', [2 ** 70])
+    bw.Write('Insert into Event (code) values (?)', [1])
+    bw.Close()
+    assert [r[0] for r in con.execute('Select code From Event')] == [1]
+
+    # a writer which can't open the file fails every write instead of leaving them waiting
+    bw = BatchWriter(str(tmp_path / 'missing' / 'batch.db'))
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            bw.Write('Insert into Event (code) values (?)', [1])
+    with pytest.raises(sqlite3.OperationalError):
+        bw.Flush()
+    bw.Close()
+
+# endregion
+
+# region Coordinated Database Tests
+
+def test_Server_ManyProcesses(tmp_path):
+    server = Database(writeConfig(tmp_path, 'server'))
+    client = writeConfig(tmp_path, 'client')
+
+    ctx = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=addEvents, args=(client, n, 25)) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+
+    # the server's own writes skip the socket
+    server.Event.Add({'source': 99, 'code': 'local'})
+
+    assert len(server.Event.GetAll()) == 101
+    assert server._writer.Writer.Batches < 101
+    server.Close()
+
+
+def test_Client_ErrorReturned(tmp_path):
+    server = Database(writeConfig(tmp_path, 'server'))
+    client = Database(writeConfig(tmp_path, 'client'))
+
+    client.Event.Add({'source': 1, 'code': 'dup'})
+    with pytest.raises(sqlite3.IntegrityError):
+        client.Event.Add({'source': 2, 'code': 'dup'})
+
+    assert [r.source for r in client.Event.GetAll()] == [1]
+
+    # errors from outside sqlite come back the same way, and the connection keeps working
+    with pytest.raises(OverflowError):
+        client._writer.Write('Insert into Event (source, code) values (?, ?)', [2 ** 70, 'big'])
+    client.Event.Add({'source': 3, 'code': 'after'})
+    assert [r.source for r in client.Event.GetAll()] == [1, 3]
+    client.Close()
+    server.Close()
+
+
+def test_Writer_RequiresKey(tmp_path):
+    with pytest.raises(ValueError):
+        Database(writeConfig(tmp_path, 'server', ''))
+    with pytest.raises(ValueError):
+        WriteServer(str(tmp_path / 'writer.db'), ('127.0.0.1', 0))
+
+    # a client with the wrong key is turned away before anything is read from it
+    server = Database(writeConfig(tmp_path, 'server'))
+    with pytest.raises(multiprocessing.AuthenticationError):
+        Database(writeConfig(tmp_path, 'client', 'guess'))
+    server.Close()
+
+# endregion
+
+# region Buffered Table Tests
+
+buffered_ini = """
+[global]
+file = {0}
+
+[Telemetry]
+id = integer, key
+sensor = integer, required
+reading = real
+buffered = true
+buffer_rows = {1}
+buffer_ms = {2}
+buffer_size = {3}
+durability = {4}
+"""
+
+
+def bufferedDB(tmp_path, rows=100, ms=20, size=1000, durability='commit', extra=''):
+    cfg = tmp_path / 'buffered.ini'
+    cfg.write_text(buffered_ini.format(tmp_path / 'buffered.db', rows, ms, size, durability)
+                   .replace('[Telemetry]', f'{extra}\n\n[Telemetry]'))
+    return Database(str(cfg))
+
+
+def test_Buffered_CommitDurability(tmp_path):
+    db = bufferedDB(tmp_path)
+
+    def work(sensor):
+        for i in range(50):
+            db.Telemetry.Add({'sensor': sensor, 'reading': float(i)})
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # every add returned after its commit, so nothing is left to flush
+    assert len(db.Telemetry.GetAll()) == 200
+    assert db.Telemetry._buffer.Batches < 200
+    db.Close()
+
+
+def test_Buffered_EnqueueAndFlush(tmp_path):
+    db = bufferedDB(tmp_path, rows=10000, ms=10000, durability='enqueue')
+
+    for i in range(500):
+        db.Telemetry.Add({'sensor': 1, 'reading': float(i)})
+    assert len(db.Telemetry.GetAll()) == 0
+
+    db.Telemetry.Flush()
+    assert len(db.Telemetry.GetAll()) == 500
+    assert db.Telemetry._buffer.Batches == 1
+    db.Close()
+
+
+def test_Buffered_FlushOnClose(tmp_path):
+    db = bufferedDB(tmp_path, rows=10000, ms=10000, size=10, durability='enqueue')
+
+    # the buffer holds 10, so this only finishes because the flusher keeps draining it
+    for i in range(100):
+        db.Telemetry.Add({'sensor': 2, 'reading': float(i)})
+    db.Close()
+
+    con = sqlite3.connect(tmp_path / 'buffered.db')
+    assert con.execute('Select count(*) From Telemetry').fetchone()[0] == 100
+
+
+def test_Buffered_ValidatesOnAdd(tmp_path):
+    db = bufferedDB(tmp_path)
+
+    with pytest.raises(Errors.InvalidColumnValue):
+        db.Telemetry.Add({'sensor': 'one'})
+    with pytest.raises(Errors.ImaginaryColumn):
+        db.Telemetry.Add({'sensr': 1})
+    db.Close()
+
+
+def test_Buffered_Checkpoint(tmp_path):
+    db = bufferedDB(tmp_path, extra='wal_autocheckpoint = 0')
+    db.Telemetry.Add({'sensor': 1, 'reading': 1.0})
+    assert db.Telemetry._buffer._autocheckpoint == 0
+
+    # a checkpoint holds the buffer's batches up until it's done
+    with db._writeLock():
+        assert db.Telemetry._buffer.Lock.locked()
+    assert not db.Telemetry._buffer.Lock.locked()
+
+    result = db.Checkpoint(CheckpointModes.TRUNCATE)
+    assert not result.busy and result.frames == 0
+    db.Close()
+
+
+def test_Buffered_WriterLost(tmp_path):
+    server = Database(writeConfig(tmp_path, 'server'))
+    cfg = writeConfig(tmp_path, 'client')
+    with open(cfg, 'a') as f:
+        f.write('buffered = true\n')
+    client = Database(cfg)
+    client.Event.Add({'source': 1, 'code': 'sent'})
+
+    # the connection to the writer drops, the adds fail rather than wait on the buffer forever
+    client._writer._conn.close()
+    for n in range(2):
+        with pytest.raises(OSError):
+            client.Event.Add({'source': 2, 'code': f'lost{n}'})
+    assert client.Event._buffer._thread.is_alive()
+
+    assert [r.code for r in server.Event.GetAll()] == ['sent']
+    server.Close()
+
+# endregion